@@ -0,0 +1,101 @@
+"""
+Streaming ZIP archives for bulk persona export
+ZipStream writes archive entries through zipfile into a sink with no seek(),
+so zipfile emits data descriptors, and hands back each entry's bytes as soon
+as it is written. A response can stream the archive without ever holding
+more than one entry in memory.
+"""
+
+import csv
+import io
+import re
+import zipfile
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Tuple
+
+
+class _Sink(io.RawIOBase):
+    """Write-only, unseekable buffer drained after every entry"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class ZipStream:
+    """
+    Incremental ZIP writer:
+
+        archive = ZipStream()
+        yield archive.add("a.json", data)
+        yield archive.close()
+    """
+
+    def __init__(self):
+        self._sink = _Sink()
+        self._zip = zipfile.ZipFile(self._sink, mode="w")
+        self._names = set()
+
+    def add(self, name: str, data: bytes, compress: bool = True) -> bytes:
+        """Write one entry and return the archive bytes it produced"""
+        name = self._unique(name)
+        info = zipfile.ZipInfo(name, date_time=datetime.utcnow().timetuple()[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+        info.external_attr = 0o644 << 16
+        self._zip.writestr(info, data)
+        return self._sink.drain()
+
+    def close(self) -> bytes:
+        """Write the central directory and return the final bytes"""
+        self._zip.close()
+        return self._sink.drain()
+
+    def _unique(self, name: str) -> str:
+        candidate, counter = name, 1
+        while candidate in self._names:
+            stem, dot, extension = name.rpartition(".")
+            candidate = f"{stem}-{counter}.{extension}" if dot else f"{name}-{counter}"
+            counter += 1
+        self._names.add(candidate)
+        return candidate
+
+
+def safe_name(value: str, fallback: str = "persona") -> str:
+    """A file/folder name made of letters, digits, '-' and '_'"""
+    return re.sub(r"[^A-Za-z0-9_-]+", "-", value or "").strip("-")[:60] or fallback
+
+
+def _flatten(value: Any, prefix: str) -> Iterator[Tuple[str, Any]]:
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from _flatten(item, f"{prefix}.{key}" if prefix else str(key))
+    elif isinstance(value, list) and any(isinstance(item, (dict, list)) for item in value):
+        for index, item in enumerate(value):
+            yield from _flatten(item, f"{prefix}[{index}]")
+    elif isinstance(value, list):
+        yield prefix, "; ".join(str(item) for item in value)
+    else:
+        yield prefix, "" if value is None else value
+
+
+def csv_bytes(rows) -> bytes:
+    output = io.StringIO()
+    csv.writer(output).writerows(rows)
+    return output.getvalue().encode("utf-8")
+
+
+def persona_csv(document: Dict[str, Any]) -> bytes:
+    """A JSON-mode persona as a two-column field,value CSV with dotted field paths"""
+    return csv_bytes([["field", "value"], *_flatten(document, "")])
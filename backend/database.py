@@ -0,0 +1,92 @@
+"""
+Mongo connection for the persona API
+connect() builds the Motor client with an explicitly sized connection pool
+and timeouts, so a saturated pool or an unreachable server fails a request
+instead of leaving it waiting indefinitely:
+
+    MONGO_MAX_POOL_SIZE                  connections per worker (default 50)
+    MONGO_MIN_POOL_SIZE                  connections kept open (default 0)
+    MONGO_WAIT_QUEUE_TIMEOUT_MS          wait for a free pooled connection (default 5000)
+    MONGO_SERVER_SELECTION_TIMEOUT_MS    wait for a suitable server (default 5000)
+    MONGO_CONNECT_TIMEOUT_MS             TCP connect + handshake (default 5000)
+    MONGO_SOCKET_TIMEOUT_MS              wait for a reply on a socket (default 30000)
+    MONGO_MAX_IDLE_TIME_MS               close pooled connections idle this long (default 300000)
+
+Writes use the client's write concern (MONGO_WRITE_CONCERN, e.g. "majority"
+or "1", plus MONGO_WRITE_JOURNAL). List routes read through `list_db`,
+which can trade freshness for load with MONGO_LIST_READ_PREFERENCE (e.g.
+"secondaryPreferred") and MONGO_LIST_READ_CONCERN (e.g. "local"). Unset
+values keep the server's defaults.
+
+Pool checkouts are measured (wait time, failures, connections in use) by
+metrics.MongoPoolMetrics.
+"""
+
+import os
+from typing import Any, Dict, Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.read_concern import ReadConcern
+from pymongo.read_preferences import read_pref_mode_from_name, make_read_preference
+
+import metrics
+import tracing
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.environ.get(name, default))
+
+
+def client_options() -> Dict[str, Any]:
+    """Keyword arguments for the Motor client, from the environment"""
+    options = {
+        "maxPoolSize": _env_int("MONGO_MAX_POOL_SIZE", 50),
+        "minPoolSize": _env_int("MONGO_MIN_POOL_SIZE", 0),
+        "waitQueueTimeoutMS": _env_int("MONGO_WAIT_QUEUE_TIMEOUT_MS", 5000),
+        "serverSelectionTimeoutMS": _env_int("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000),
+        "connectTimeoutMS": _env_int("MONGO_CONNECT_TIMEOUT_MS", 5000),
+        "socketTimeoutMS": _env_int("MONGO_SOCKET_TIMEOUT_MS", 30000),
+        "maxIdleTimeMS": _env_int("MONGO_MAX_IDLE_TIME_MS", 300000),
+    }
+    write_concern = os.environ.get("MONGO_WRITE_CONCERN")
+    if write_concern:
+        options["w"] = int(write_concern) if write_concern.isdigit() else write_concern
+    if os.environ.get("MONGO_WRITE_JOURNAL"):
+        options["journal"] = os.environ["MONGO_WRITE_JOURNAL"].lower() in ("1", "true", "yes")
+    return options
+
+
+def _list_read_options() -> Dict[str, Any]:
+    options = {}
+    preference = os.environ.get("MONGO_LIST_READ_PREFERENCE")
+    if preference:
+        options["read_preference"] = make_read_preference(read_pref_mode_from_name(preference), None)
+    concern = os.environ.get("MONGO_LIST_READ_CONCERN")
+    if concern:
+        options["read_concern"] = ReadConcern(concern)
+    return options
+
+
+client: Optional[AsyncIOMotorClient] = None
+# Database for routes that write or must read their own writes
+db = None
+# Database for list routes, with the list read preference / concern
+list_db = None
+
+
+def connect(mongo_url: str, db_name: str):
+    """Create the client (it connects lazily) and return the database"""
+    global client, db, list_db
+    client = AsyncIOMotorClient(
+        mongo_url,
+        event_listeners=[metrics.MongoCommandMetrics(), tracing.MongoCommandTracer(), metrics.MongoPoolMetrics()],
+        **client_options(),
+    )
+    db = client[db_name]
+    list_db = db.with_options(**_list_read_options())
+    return db
+
+
+def close():
+    if client is not None:
+        client.close()
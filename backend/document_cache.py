@@ -0,0 +1,188 @@
+"""
+Per-worker read-through cache for persona and generated-persona documents
+The wizard reads its persona back after every step, and generation and the
+export routes fetch the same documents again, so reads by `id` go through a
+small LRU cache in each worker process:
+
+- a write made by this worker invalidates its entry directly;
+- writes made by other workers or processes arrive through a Mongo change
+  stream, which needs a replica set. Entries then live for
+  DOCUMENT_CACHE_TTL_SECONDS as a safety net;
+- against a standalone server (no change streams), entries expire after
+  DOCUMENT_CACHE_FALLBACK_TTL_SECONDS, which bounds how stale another
+  worker's write can look.
+
+Reads that must see other workers' latest writes (generation inputs, the
+wizard's reload after a 409) use load_fresh(), which skips the cache and
+refreshes the entry.
+
+Cached documents are shared between readers: callers must not mutate them
+(a shallow copy is returned, so top-level assignments are safe).
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from pymongo.errors import OperationFailure
+
+import metrics
+
+
+DOCUMENT_CACHE_SIZE = int(os.environ.get("DOCUMENT_CACHE_SIZE", 256))
+DOCUMENT_CACHE_TTL_SECONDS = float(os.environ.get("DOCUMENT_CACHE_TTL_SECONDS", 300))
+DOCUMENT_CACHE_FALLBACK_TTL_SECONDS = float(os.environ.get("DOCUMENT_CACHE_FALLBACK_TTL_SECONDS", 5))
+DOCUMENT_CACHE_CHANGE_STREAM = os.environ.get("DOCUMENT_CACHE_CHANGE_STREAM", "1") != "0"
+
+# Server error code for "The $changeStream stage is only supported on replica sets"
+_CHANGE_STREAMS_UNSUPPORTED = 40573
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentCache:
+    """LRU cache of one collection's documents by `id`, with per-entry expiry"""
+
+    def __init__(self, collection: str, max_entries: int = DOCUMENT_CACHE_SIZE):
+        self.collection = collection
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        # Mongo _id -> id, so change events (which carry only _id) can be matched
+        self._ids: Dict[Any, str] = {}
+        # Bumped on every invalidation, so a load that raced with a write is not stored
+        self._generation = 0
+
+    def ttl(self) -> float:
+        return DOCUMENT_CACHE_TTL_SECONDS if change_stream_active() else DOCUMENT_CACHE_FALLBACK_TTL_SECONDS
+
+    def get(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        document, expires_at = entry
+        if expires_at <= time.monotonic():
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return dict(document)
+
+    def put(self, key: str, document: dict):
+        if self.max_entries <= 0:
+            return
+        self._drop(key)
+        self._entries[key] = (document, time.monotonic() + self.ttl())
+        if "_id" in document:
+            self._ids[document["_id"]] = key
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+
+    def invalidate(self, key: str):
+        self._generation += 1
+        if self._drop(key):
+            metrics.DOCUMENT_CACHE_INVALIDATIONS.labels(collection=self.collection, source="local").inc()
+
+    def invalidate_object_id(self, object_id: Any):
+        self._generation += 1
+        key = self._ids.get(object_id)
+        if key is not None and self._drop(key):
+            metrics.DOCUMENT_CACHE_INVALIDATIONS.labels(collection=self.collection, source="change_stream").inc()
+
+    def clear(self):
+        self._generation += 1
+        self._entries.clear()
+        self._ids.clear()
+
+    def _drop(self, key: str) -> bool:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        self._ids.pop(entry[0].get("_id"), None)
+        return True
+
+    async def get_or_load(self, key: str, load: Callable[[], Awaitable[Optional[dict]]]) -> Optional[dict]:
+        """Cached document for `key`, or load() it (None for a missing document, which is not cached)"""
+        document = self.get(key)
+        if document is not None:
+            metrics.DOCUMENT_CACHE_REQUESTS.labels(collection=self.collection, result="hit").inc()
+            return document
+        metrics.DOCUMENT_CACHE_REQUESTS.labels(collection=self.collection, result="miss").inc()
+        return await self._load(key, load)
+
+    async def load_fresh(self, key: str, load: Callable[[], Awaitable[Optional[dict]]]) -> Optional[dict]:
+        """load() without consulting the cache, refreshing the entry with the result"""
+        metrics.DOCUMENT_CACHE_REQUESTS.labels(collection=self.collection, result="bypass").inc()
+        return await self._load(key, load)
+
+    async def _load(self, key: str, load: Callable[[], Awaitable[Optional[dict]]]) -> Optional[dict]:
+        generation = self._generation
+        document = await load()
+        if document is not None and self._generation == generation:
+            self.put(key, document)
+            return dict(document)
+        return document
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+personas = DocumentCache("personas")
+generated_personas = DocumentCache("generated_personas")
+_caches = {cache.collection: cache for cache in (personas, generated_personas)}
+
+_change_stream_active = False
+
+
+def change_stream_active() -> bool:
+    return _change_stream_active
+
+
+async def watch(db):
+    """
+    Invalidate entries changed by other processes, from a change stream on
+    the cached collections. Runs until cancelled; returns (leaving the TTL
+    fallback in place) if the server does not support change streams.
+    """
+    global _change_stream_active
+    if not DOCUMENT_CACHE_CHANGE_STREAM:
+        return
+    pipeline = [
+        {"$match": {"ns.coll": {"$in": list(_caches)}}},
+        {"$project": {"operationType": 1, "ns": 1, "documentKey": 1}},
+    ]
+    delay = 1.0
+    while True:
+        try:
+            async with db.watch(pipeline) as stream:
+                # Entries cached while no stream was open may have missed events
+                for cache in _caches.values():
+                    cache.clear()
+                _change_stream_active = True
+                logger.info("Document cache invalidation via change stream started")
+                delay = 1.0
+                async for change in stream:
+                    cache = _caches.get(change.get("ns", {}).get("coll"))
+                    if cache is None:
+                        continue
+                    if change["operationType"] in ("update", "replace", "delete"):
+                        cache.invalidate_object_id(change["documentKey"]["_id"])
+                    elif change["operationType"] in ("drop", "rename", "invalidate"):
+                        cache.clear()
+        except asyncio.CancelledError:
+            raise
+        except OperationFailure as e:
+            if e.code == _CHANGE_STREAMS_UNSUPPORTED:
+                logger.info(
+                    "Change streams unavailable (not a replica set); document cache entries expire after %ss",
+                    DOCUMENT_CACHE_FALLBACK_TTL_SECONDS,
+                )
+                return
+            logger.warning("Document cache change stream failed, retrying in %.0fs: %s", delay, e)
+        except Exception as e:
+            logger.warning("Document cache change stream failed, retrying in %.0fs: %s", delay, e)
+        finally:
+            _change_stream_active = False
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 30.0)
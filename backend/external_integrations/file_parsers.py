@@ -3,27 +3,81 @@ Real File Parsing Module for Resonate Data
 Handles ZIP extraction and parsing of CSV, PDF, PNG, Excel files
 """
 
+from __future__ import annotations
+
+import importlib
 import os
 import zipfile
 import tempfile
+import time
 import io
 import csv
 import json
+import logging
 import mimetypes
-import chardet
-from typing import Dict, List, Any, Optional, Tuple
+from typing import TYPE_CHECKING, Dict, List, Any, Optional, Tuple
 from pathlib import Path
 
-import pandas as pd
-import PyPDF2
-from PIL import Image
-from openpyxl import load_workbook
+import metrics
+
+# pandas, PyPDF2, Pillow, openpyxl and chardet take about half a second to
+# import, so they load on first use (or in warm_up() after startup) rather
+# than when the server starts
+if TYPE_CHECKING:
+    import pandas as pd
+    from PIL import Image
+
+HEAVY_IMPORTS = ('pandas', 'openpyxl', 'PyPDF2', 'PIL.Image', 'chardet')
+
+
+logger = logging.getLogger(__name__)
+
+
+# Archive limits, checked against the ZIP central directory before anything is
+# decompressed. Override through the environment for unusually large exports.
+ZIP_MAX_TOTAL_BYTES = int(os.environ.get('RESONATE_ZIP_MAX_TOTAL_BYTES', 500 * 1024 * 1024))
+ZIP_MAX_MEMBER_BYTES = int(os.environ.get('RESONATE_ZIP_MAX_MEMBER_BYTES', 200 * 1024 * 1024))
+ZIP_MAX_MEMBERS = int(os.environ.get('RESONATE_ZIP_MAX_MEMBERS', 1000))
+ZIP_MAX_COMPRESSION_RATIO = float(os.environ.get('RESONATE_ZIP_MAX_RATIO', 100))
+
+# Members smaller than this are not ratio-checked; tiny text files legitimately
+# compress far beyond any sensible ratio.
+ZIP_RATIO_MIN_MEMBER_BYTES = 1024 * 1024
+ZIP_EXTRACT_CHUNK_BYTES = 64 * 1024
+
+
+class ZipLimitExceeded(Exception):
+    """Raised when a ZIP archive breaks one of the configured safety limits"""
+
+    def __init__(self, reason: str, message: str, status_code: int = 413, member: Optional[str] = None,
+                 actual: Optional[float] = None, limit: Optional[float] = None):
+        super().__init__(message)
+        self.reason = reason
+        self.message = message
+        self.status_code = status_code
+        self.member = member
+        self.actual = actual
+        self.limit = limit
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'reason': self.reason,
+            'message': self.message,
+            'member': self.member,
+            'actual': self.actual,
+            'limit': self.limit
+        }
 
 
 class ResonateFileParser:
     """Main class for parsing Resonate data files"""
     
-    def __init__(self):
+    def __init__(self, max_total_bytes: int = None, max_member_bytes: int = None,
+                 max_members: int = None, max_compression_ratio: float = None):
+        self.max_total_bytes = max_total_bytes or ZIP_MAX_TOTAL_BYTES
+        self.max_member_bytes = max_member_bytes or ZIP_MAX_MEMBER_BYTES
+        self.max_members = max_members or ZIP_MAX_MEMBERS
+        self.max_compression_ratio = max_compression_ratio or ZIP_MAX_COMPRESSION_RATIO
         self.supported_formats = {
             'csv': self.parse_csv,
             'xlsx': self.parse_excel,
@@ -57,9 +111,11 @@ class ResonateFileParser:
             
             # Create temporary directory for extraction
             with tempfile.TemporaryDirectory() as temp_dir:
-                # Extract ZIP file
+                # Check the central directory first, then extract with the
+                # same limits enforced on the bytes actually written
                 with zipfile.ZipFile(zip_file_path, 'r') as zip_ref:
-                    zip_ref.extractall(temp_dir)
+                    members = self.inspect_zip(zip_ref)
+                    self.safe_extract(zip_ref, members, temp_dir)
                 
                 # Process all extracted files
                 for root, dirs, files in os.walk(temp_dir):
@@ -82,6 +138,23 @@ class ResonateFileParser:
                 'parsed_data': parsed_data
             }
             
+        except ZipLimitExceeded as e:
+            return {
+                'success': False,
+                'error': e.message,
+                'status_code': e.status_code,
+                'limit_exceeded': e.to_dict(),
+                'extracted_files': [],
+                'parsed_data': {}
+            }
+        except zipfile.BadZipFile as e:
+            return {
+                'success': False,
+                'error': f"Invalid ZIP archive: {str(e)}",
+                'status_code': 422,
+                'extracted_files': [],
+                'parsed_data': {}
+            }
         except Exception as e:
             return {
                 'success': False,
@@ -90,6 +163,89 @@ class ResonateFileParser:
                 'parsed_data': {}
             }
     
+    def inspect_zip(self, zip_ref: zipfile.ZipFile) -> List[zipfile.ZipInfo]:
+        """
+        Validate the archive's central directory against the configured limits
+        without decompressing anything. Returns the file members to extract.
+        """
+        members = [info for info in zip_ref.infolist() if not info.is_dir()]
+        
+        if len(members) > self.max_members:
+            raise ZipLimitExceeded(
+                'member_count',
+                f"Archive contains {len(members)} files, the limit is {self.max_members}",
+                status_code=413, actual=len(members), limit=self.max_members
+            )
+        
+        total_bytes = 0
+        for info in members:
+            if info.file_size > self.max_member_bytes:
+                raise ZipLimitExceeded(
+                    'member_size',
+                    f"File '{info.filename}' expands to {info.file_size} bytes, the limit is {self.max_member_bytes}",
+                    status_code=413, member=info.filename, actual=info.file_size, limit=self.max_member_bytes
+                )
+            
+            if info.file_size >= ZIP_RATIO_MIN_MEMBER_BYTES:
+                ratio = info.file_size / max(info.compress_size, 1)
+                if ratio > self.max_compression_ratio:
+                    raise ZipLimitExceeded(
+                        'compression_ratio',
+                        f"File '{info.filename}' has a compression ratio of {ratio:.0f}:1, the limit is {self.max_compression_ratio:.0f}:1",
+                        status_code=422, member=info.filename, actual=round(ratio, 1), limit=self.max_compression_ratio
+                    )
+            
+            total_bytes += info.file_size
+            if total_bytes > self.max_total_bytes:
+                raise ZipLimitExceeded(
+                    'total_size',
+                    f"Archive expands to more than {self.max_total_bytes} bytes",
+                    status_code=413, actual=total_bytes, limit=self.max_total_bytes
+                )
+        
+        return members
+    
+    def safe_extract(self, zip_ref: zipfile.ZipFile, members: List[zipfile.ZipInfo], target_dir: str):
+        """
+        Extract members in chunks, aborting as soon as the decompressed output
+        exceeds what the central directory declared. Guards against archives
+        whose headers under-report their real size.
+        """
+        total_written = 0
+        for info in members:
+            parts = self._safe_member_parts(info.filename)
+            if not parts:
+                continue
+            target_path = os.path.join(target_dir, *parts)
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            
+            member_written = 0
+            with zip_ref.open(info) as source, open(target_path, 'wb') as target:
+                while True:
+                    chunk = source.read(ZIP_EXTRACT_CHUNK_BYTES)
+                    if not chunk:
+                        break
+                    member_written += len(chunk)
+                    total_written += len(chunk)
+                    if member_written > min(info.file_size, self.max_member_bytes):
+                        raise ZipLimitExceeded(
+                            'member_size',
+                            f"File '{info.filename}' expands beyond its declared size",
+                            status_code=422, member=info.filename, actual=member_written, limit=info.file_size
+                        )
+                    if total_written > self.max_total_bytes:
+                        raise ZipLimitExceeded(
+                            'total_size',
+                            f"Archive expands to more than {self.max_total_bytes} bytes",
+                            status_code=413, actual=total_written, limit=self.max_total_bytes
+                        )
+                    target.write(chunk)
+    
+    def _safe_member_parts(self, member_name: str) -> List[str]:
+        """Split an archive member name into path parts, dropping anything that could escape the target dir"""
+        parts = member_name.replace('\\', '/').split('/')
+        return [part for part in parts if part and part not in ('.', '..') and ':' not in part]
+    
     def get_file_info(self, file_path: str) -> Dict[str, Any]:
         """Get information about a file"""
         try:
@@ -140,17 +296,21 @@ class ResonateFileParser:
             parser_func = self.supported_formats.get(file_ext)
             
             if parser_func:
-                return parser_func(file_path)
+                with metrics.stage_timer(metrics.FILE_PARSE, file_ext):
+                    return parser_func(file_path)
             else:
                 return None
                 
         except Exception as e:
-            print(f"Error parsing file {file_path}: {e}")
+            logger.error("Error parsing file %s: %s", file_path, e)
             return None
     
     def parse_csv(self, file_path: str) -> Dict[str, Any]:
         """Parse CSV file and extract demographic/behavioral data"""
         try:
+            import chardet
+            import pandas as pd
+
             # Detect encoding
             with open(file_path, 'rb') as f:
                 raw_data = f.read()
@@ -164,8 +324,8 @@ class ResonateFileParser:
                 quoting=csv.QUOTE_MINIMAL  # Quote fields with special characters
             )
             
-            # Print sample data for debugging
-            print(f"DEBUG: CSV Sample Data:\n{df.head(2)}")
+            # Sample data for debugging; only rendered if the record is kept
+            logger.debug("CSV sample data:\n%s", df.head(2))
             
             # Extract insights based on common Resonate column patterns
             insights = self.extract_csv_insights(df)
@@ -181,7 +341,7 @@ class ResonateFileParser:
             }
             
         except Exception as e:
-            print(f"Error parsing CSV file {file_path}: {str(e)}")
+            logger.error("Error parsing CSV file %s: %s", file_path, e)
             return {
                 'type': 'csv_data',
                 'source': os.path.basename(file_path),
@@ -198,27 +358,26 @@ class ResonateFileParser:
             'behavioral': {}
         }
         
-        # Print column names for debugging
-        print(f"DEBUG: Processing Resonate CSV with columns: {df.columns.tolist()}")
+        logger.debug("Processing Resonate CSV with columns: %s", df.columns.tolist())
         
         # Handle Resonate-style data with Insight/Category structure
         if 'Insight' in df.columns and 'Insight Value' in df.columns:
-            print("DEBUG: Found Resonate Insight format")
+            logger.debug("Found Resonate Insight format")
             self._process_resonate_insights(df, insights)
         
         # Handle Category-based data (like web behavior)
         elif 'Category' in df.columns:
-            print("DEBUG: Found Category-based data")
+            logger.debug("Found Category-based data")
             self._process_category_data(df, insights)
         
         # Handle Domain/Site data (web behavior)
         elif 'Domain Name' in df.columns:
-            print("DEBUG: Found Domain/Site data")
+            logger.debug("Found Domain/Site data")
             self._process_domain_data(df, insights)
         
         # Fallback to original demographic parsing for simple CSV files
         else:
-            print("DEBUG: Using fallback demographic parsing")
+            logger.debug("Using fallback demographic parsing")
             self._process_simple_demographics(df, insights)
         
         return insights
@@ -291,7 +450,7 @@ class ResonateFileParser:
                     })
                 
         except Exception as e:
-            print(f"Error processing Resonate insights: {e}")
+            logger.error("Error processing Resonate insights: %s", e)
     
     def _process_category_data(self, df: pd.DataFrame, insights: Dict[str, Any]):
         """Process category-based data (web behavior, interests)"""
@@ -313,7 +472,7 @@ class ResonateFileParser:
                         }
                     })
         except Exception as e:
-            print(f"Error processing category data: {e}")
+            logger.error("Error processing category data: %s", e)
     
     def _process_domain_data(self, df: pd.DataFrame, insights: Dict[str, Any]):
         """Process domain/site data"""
@@ -334,7 +493,7 @@ class ResonateFileParser:
                     }
                 })
         except Exception as e:
-            print(f"Error processing domain data: {e}")
+            logger.error("Error processing domain data: %s", e)
     
     def _categorize_demographic(self, insight: str) -> str:
         """Categorize a Resonate insight into demographic type"""
@@ -378,9 +537,8 @@ class ResonateFileParser:
                 
                 # Get value counts for this column
                 try:
-                    # Print sample values for debugging
-                    sample_values = df[col].head(3).tolist()
-                    print(f"DEBUG: Sample values for {col}: {sample_values}")
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug("Sample values for %s: %s", col, df[col].head(3).tolist())
                     
                     value_counts = df[col].value_counts().head(5).to_dict()
                     
@@ -390,11 +548,13 @@ class ResonateFileParser:
                         'top_values': value_counts
                     }
                 except Exception as e:
-                    print(f"Error processing column {col}: {e}")
+                    logger.warning("Error processing column %s: %s", col, e)
     
     def parse_excel(self, file_path: str) -> Dict[str, Any]:
         """Parse Excel file (both .xlsx and .xls)"""
         try:
+            import pandas as pd
+
             # Read all sheets
             xl_file = pd.ExcelFile(file_path)
             sheets_data = {}
@@ -430,6 +590,8 @@ class ResonateFileParser:
     def parse_pdf(self, file_path: str) -> Dict[str, Any]:
         """Parse PDF file and extract text content"""
         try:
+            import PyPDF2
+
             with open(file_path, 'rb') as file:
                 pdf_reader = PyPDF2.PdfReader(file)
                 text_content = ""
@@ -460,6 +622,8 @@ class ResonateFileParser:
     def parse_image(self, file_path: str) -> Dict[str, Any]:
         """Parse image file and extract metadata"""
         try:
+            from PIL import Image
+
             with Image.open(file_path) as img:
                 # Basic image info
                 width, height = img.size
@@ -492,6 +656,8 @@ class ResonateFileParser:
     def parse_text(self, file_path: str) -> Dict[str, Any]:
         """Parse text file"""
         try:
+            import chardet
+
             # Detect encoding
             with open(file_path, 'rb') as f:
                 raw_data = f.read()
@@ -670,4 +836,23 @@ def parse_resonate_zip(zip_file_path: str) -> Dict[str, Any]:
     Returns structured data for persona generation
     """
     parser = ResonateFileParser()
-    return parser.extract_and_parse_zip(zip_file_path)
\ No newline at end of file
+    return parser.extract_and_parse_zip(zip_file_path)
+
+_warmed_up = False
+
+
+def warm_up() -> float:
+    """
+    Import the parsing libraries ahead of the first upload. Blocking; run it
+    in a worker thread. Returns the seconds spent importing.
+    """
+    global _warmed_up
+    started = time.perf_counter()
+    for module in HEAVY_IMPORTS:
+        importlib.import_module(module)
+    _warmed_up = True
+    return time.perf_counter() - started
+
+
+def is_warmed_up() -> bool:
+    return _warmed_up
@@ -1,6 +1,6 @@
 import os
 import asyncio
-from openai import OpenAI
+import logging
 from typing import Optional, Dict, Any
 from datetime import datetime
 from dotenv import load_dotenv
@@ -10,12 +10,15 @@ from pathlib import Path
 ROOT_DIR = Path(__file__).parent.parent
 load_dotenv(ROOT_DIR / '.env')
 
+import openai_scheduler
+
+logger = logging.getLogger(__name__)
+
 class OpenAIImageGenerator:
     def __init__(self):
         api_key = os.environ.get('OPENAI_API_KEY')
         if not api_key:
             raise ValueError("OPENAI_API_KEY environment variable is required")
-        self.client = OpenAI(api_key=api_key)
     
     async def generate_persona_headshot(self, demographics: Dict[str, Any]) -> Optional[str]:
         """
@@ -24,10 +27,11 @@ class OpenAIImageGenerator:
         try:
             # Build a detailed prompt based on demographics
             prompt = self._build_headshot_prompt(demographics)
-            print(f"Generating headshot with prompt: {prompt}")
+            logger.debug("Generating headshot with prompt: %s", prompt)
             
-            # Generate image using DALL-E 3
-            response = self.client.images.generate(
+            # Generate image using DALL-E 3 via the shared OpenAI scheduler,
+            # which applies the images/min limits and retries rate limits
+            response = await openai_scheduler.image_generation(
                 model="dall-e-3",
                 prompt=prompt,
                 size="1024x1024",
@@ -39,14 +43,14 @@ class OpenAIImageGenerator:
             # Return the image URL
             if response.data and len(response.data) > 0:
                 image_url = response.data[0].url
-                print(f"Successfully generated headshot: {image_url}")
+                logger.info("Successfully generated headshot: %s", image_url)
                 return image_url
             else:
-                print("No image data returned from OpenAI")
+                logger.warning("No image data returned from OpenAI")
                 return None
                 
         except Exception as e:
-            print(f"Error generating headshot with OpenAI: {e}")
+            logger.error("Error generating headshot with OpenAI: %s", e)
             return None
     
     def _build_headshot_prompt(self, demographics: Dict[str, Any]) -> str:
@@ -164,5 +168,5 @@ async def generate_persona_image_openai(demographics: Dict[str, Any]) -> Optiona
         generator = get_openai_generator()
         return await generator.generate_persona_headshot(demographics)
     except Exception as e:
-        print(f"Error initializing OpenAI generator: {e}")
+        logger.error("Error initializing OpenAI generator: %s", e)
         return None
\ No newline at end of file
@@ -4,10 +4,15 @@ Generates high-quality headshots based on demographic data
 """
 
 import os
+import logging
 import requests
 import random
 from typing import Dict, Any, Optional
 
+import normalization
+
+logger = logging.getLogger(__name__)
+
 def get_professional_headshot(demographics: Dict[str, Any], persona_name: str = "Professional") -> str:
     """
     Get a professional headshot from Unsplash based on demographics
@@ -36,11 +41,11 @@ def _get_real_unsplash_image(demographics: Dict[str, Any], persona_name: str, ap
         search_terms = ["professional", "headshot", "business"]
         
         # Add demographic-specific terms
-        gender = demographics.get("gender", "").lower()
+        gender = normalization.normalize_gender(demographics.get("gender"))
         if gender:
-            search_terms.append(gender)
+            search_terms.append(gender.lower())
             
-        age_range = demographics.get("age_range", "")
+        age_range = demographics.get("age_range") or ""
         if "18-24" in age_range:
             search_terms.append("young professional")
         elif "45-65" in age_range:
@@ -49,7 +54,7 @@ def _get_real_unsplash_image(demographics: Dict[str, Any], persona_name: str, ap
             search_terms.append("professional")
             
         # Add ethnicity if specified
-        ethnicity = demographics.get("ethnicity", "").lower()
+        ethnicity = (demographics.get("ethnicity") or "").lower()
         if ethnicity and ethnicity != "prefer not to say":
             search_terms.append(ethnicity)
         
@@ -88,7 +93,7 @@ def _get_real_unsplash_image(demographics: Dict[str, Any], persona_name: str, ap
         return _get_mock_unsplash_image(demographics, persona_name)
         
     except Exception as e:
-        print(f"Unsplash API error: {e}")
+        logger.warning("Unsplash API error: %s", e)
         return _get_mock_unsplash_image(demographics, persona_name)
 
 def _get_mock_unsplash_image(demographics: Dict[str, Any], persona_name: str) -> str:
@@ -110,14 +115,13 @@ def _get_mock_unsplash_image(demographics: Dict[str, Any], persona_name: str) ->
     ]
     
     # Select image based on demographics for consistency
-    gender = demographics.get("gender", "").lower()
-    age_range = demographics.get("age_range", "")
+    gender = normalization.normalize_gender(demographics.get("gender"))
     
     # Filter images based on gender if specified
-    if "female" in gender or "woman" in gender:
+    if gender == "Female":
         # Use subset that typically represents professional women
         image_options = professional_images[::2]  # Even indices
-    elif "male" in gender or "man" in gender:
+    elif gender == "Male":
         # Use subset that typically represents professional men  
         image_options = professional_images[1::2]  # Odd indices
     else:
@@ -0,0 +1,56 @@
+"""
+Gunicorn settings for the multi-worker serving profile
+Used by entrypoint.sh when WEB_CONCURRENCY > 1:
+
+    gunicorn -c gunicorn.conf.py server:app
+
+Each worker is a uvicorn worker (uvloop event loop, httptools parser) running
+its own copy of the app. See SERVING.md for sizing and per-worker memory.
+"""
+
+import multiprocessing
+import os
+import shutil
+
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8001')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", min(multiprocessing.cpu_count(), 4)))
+# Workers inherit the environment: the OpenAI scheduler splits the account's
+# limits by WEB_CONCURRENCY, so it must see the count chosen here
+os.environ["WEB_CONCURRENCY"] = str(workers)
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Uvicorn workers heartbeat from their event loop, so this only kills workers
+# whose loop is blocked (e.g. a runaway pandas parse), not long SSE streams
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+
+# Recycle workers periodically so memory fragmented by large DataFrames is
+# returned to the OS; jitter keeps workers from restarting together
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", 100))
+
+# Not preloaded: the Motor client, OpenAI client, log listener thread and
+# span exporter thread are created at import and must not cross a fork(),
+# so every worker imports server itself
+preload_app = False
+
+# Request logs come from uvicorn's access logger, through the app's logging
+accesslog = None
+errorlog = "-"
+loglevel = os.environ.get("LOG_LEVEL", "info").lower()
+
+
+def on_starting(server):
+    # Samples from a previous run would be summed into the new one
+    directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory, exist_ok=True)
+
+
+def child_exit(server, worker):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,269 @@
+"""
+Idempotency keys and single-flight for persona generation
+A double-click or a client retry on a generation route used to start a
+second GPT + DALL-E run and insert a second generated persona. Generation
+routes now run their work through run(), or, for the streaming route,
+begin() and the Flight it returns:
+
+- concurrent identical requests in this worker share one in-flight
+  computation and its response (keyed by the Idempotency-Key header, or by
+  a fingerprint of the request when there is none);
+- with an Idempotency-Key, the successful response is also stored in the
+  `idempotency_keys` collection for IDEMPOTENCY_TTL_SECONDS, so a retry on
+  any worker gets the stored response back (Idempotent-Replayed: true)
+  instead of generating again. A retry while another worker still holds
+  the key gets IdempotencyKeyInProgress (409); reusing a key for a
+  different request gets IdempotencyKeyReused (422).
+
+Failed computations are not stored: their claim is released so the client
+can retry with the same key.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import orjson
+from fastapi.responses import Response
+from pymongo.errors import DuplicateKeyError
+
+import metrics
+
+
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get("IDEMPOTENCY_TTL_SECONDS", 86400))
+# A claim still pending after this long is treated as abandoned (its worker died)
+IDEMPOTENCY_PENDING_TIMEOUT_SECONDS = int(os.environ.get("IDEMPOTENCY_PENDING_TIMEOUT_SECONDS", 600))
+MAX_KEY_LENGTH = 255
+
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+logger = logging.getLogger(__name__)
+
+
+class IdempotencyKeyInProgress(Exception):
+    """Another worker is still computing the response for this key"""
+
+
+class IdempotencyKeyReused(Exception):
+    """The key was already used for a request with a different fingerprint"""
+
+
+async def ensure_indexes(db):
+    await db.idempotency_keys.create_index("expires_at", expireAfterSeconds=0)
+
+
+def fingerprint(*parts: Any) -> str:
+    """SHA-256 of the JSON-serializable parts of a request, independent of key order"""
+    canonical = orjson.dumps(parts, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+    return hashlib.sha256(canonical).hexdigest()
+
+
+_inflight: Dict[str, asyncio.Future] = {}
+
+
+def _response(stored: Dict[str, Any], replayed: bool) -> Response:
+    headers = {REPLAYED_HEADER: "true"} if replayed else None
+    return Response(content=bytes(stored["body"]), status_code=stored["status_code"],
+                    media_type=stored["media_type"], headers=headers)
+
+
+async def _claim(db, document_id: str, request_fingerprint: str, claim: str) -> Optional[Dict[str, Any]]:
+    """
+    Claim the key for this worker, marking the pending document with the
+    `claim` token. Returns the stored response if the key already
+    completed; raises if it is held elsewhere or was used for a different
+    request.
+    """
+    now = datetime.utcnow()
+    try:
+        await db.idempotency_keys.insert_one({
+            "_id": document_id,
+            "fingerprint": request_fingerprint,
+            "status": "pending",
+            "claim": claim,
+            "created_at": now,
+            "expires_at": now + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS),
+        })
+        return None
+    except DuplicateKeyError:
+        pass
+
+    existing = await db.idempotency_keys.find_one({"_id": document_id})
+    if existing is None:
+        # Expired or released between the insert and the read
+        return await _claim(db, document_id, request_fingerprint, claim)
+    if existing["fingerprint"] != request_fingerprint:
+        metrics.IDEMPOTENCY_REQUESTS.labels(result="reused").inc()
+        raise IdempotencyKeyReused(document_id)
+    if existing["status"] == "completed":
+        return existing
+    if existing["created_at"] > now - timedelta(seconds=IDEMPOTENCY_PENDING_TIMEOUT_SECONDS):
+        metrics.IDEMPOTENCY_REQUESTS.labels(result="in_progress").inc()
+        raise IdempotencyKeyInProgress(document_id)
+
+    # Abandoned claim: take it over, unless another worker just did
+    taken = await db.idempotency_keys.find_one_and_update(
+        {"_id": document_id, "status": "pending", "created_at": existing["created_at"]},
+        {"$set": {"claim": claim, "created_at": now, "expires_at": now + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS)}},
+    )
+    if taken is None:
+        metrics.IDEMPOTENCY_REQUESTS.labels(result="in_progress").inc()
+        raise IdempotencyKeyInProgress(document_id)
+    logger.warning("Took over abandoned idempotency key %s", document_id)
+    return None
+
+
+class Flight:
+    """
+    A request's place in a single-flight computation, as returned by begin().
+    Exactly one of these holds:
+
+    - `stored` is set: the key already completed elsewhere, replay it;
+    - `shared` is set: an identical request in this worker is computing the
+      response, wait() for it;
+    - `owner` is true: the caller computes the response and must end the
+      flight with complete() or fail().
+    """
+
+    def __init__(self, db, scope: str, key: Optional[str], request_fingerprint: str):
+        self.db = db
+        self.key = key
+        self.fingerprint = request_fingerprint
+        self.flight_key = f"{scope}:{key}" if key else f"{scope}:fingerprint:{request_fingerprint}"
+        self.document_id = f"{scope}:{key}"
+        self.stored: Optional[Dict[str, Any]] = None
+        self.shared: Optional[asyncio.Future] = None
+        self._future: Optional[asyncio.Future] = None
+        self._claimed = False
+        # Identifies this worker's claim, so a late finish cannot touch a claim another worker took over
+        self._claim = uuid.uuid4().hex
+
+    @property
+    def owner(self) -> bool:
+        return self._future is not None
+
+    async def wait(self) -> Dict[str, Any]:
+        """The stored response of the identical request this one joined"""
+        stored = await asyncio.shield(self.shared)
+        if self.key and stored["fingerprint"] != self.fingerprint:
+            metrics.IDEMPOTENCY_REQUESTS.labels(result="reused").inc()
+            raise IdempotencyKeyReused(self.flight_key)
+        metrics.IDEMPOTENCY_REQUESTS.labels(result="shared").inc()
+        return stored
+
+    async def complete(self, response: Response, storable: bool) -> None:
+        """Hand the response to waiting requests, and store it if it may be replayed"""
+        stored = {
+            "fingerprint": self.fingerprint,
+            "status_code": response.status_code,
+            "media_type": response.media_type,
+            "body": bytes(response.body),
+        }
+        if self._claimed:
+            if storable and response.status_code < 300:
+                result = await self.db.idempotency_keys.update_one(
+                    self._claim_filter(),
+                    {"$set": {**stored, "status": "completed", "completed_at": datetime.utcnow()}},
+                )
+                if result.matched_count == 0:
+                    # Taken over as abandoned while we computed; that worker's result wins
+                    metrics.IDEMPOTENCY_REQUESTS.labels(result="lost").inc()
+                    logger.warning("Idempotency key %s was taken over before it completed", self.document_id)
+            else:
+                await self.db.idempotency_keys.delete_one(self._claim_filter())
+            self._claimed = False
+        self._end(stored)
+
+    async def fail(self, error: BaseException) -> None:
+        """Release the key and pass the error to waiting requests. No-op once the flight has ended"""
+        if not self.owner:
+            return
+        if self._claimed:
+            self._claimed = False
+            try:
+                await asyncio.shield(self.db.idempotency_keys.delete_one(self._claim_filter()))
+            except Exception as release_error:
+                logger.warning("Could not release idempotency key %s: %s", self.document_id, release_error)
+        self._end(error=error)
+
+    async def abandon(self) -> None:
+        """End a flight whose owner stopped before completing it (e.g. the client disconnected)"""
+        await self.fail(asyncio.CancelledError())
+
+    def _claim_filter(self) -> Dict[str, Any]:
+        return {"_id": self.document_id, "status": "pending", "claim": self._claim}
+
+    def _end(self, stored: Optional[Dict[str, Any]] = None, error: Optional[BaseException] = None) -> None:
+        future, self._future = self._future, None
+        if error is None:
+            future.set_result(stored)
+        elif isinstance(error, asyncio.CancelledError):
+            future.cancel()
+        else:
+            future.set_exception(error)
+            # Waiters re-raise it; don't log "exception was never retrieved" when there are none
+            future.exception()
+        _inflight.pop(self.flight_key, None)
+
+
+async def begin(db, scope: str, key: Optional[str], request_fingerprint: str) -> Flight:
+    """
+    Join the computation for a request: replay it if the key already
+    completed, share it if an identical request in this worker is running
+    it, or claim it. Raises IdempotencyKeyInProgress / IdempotencyKeyReused
+    as described above.
+    """
+    flight = Flight(db, scope, key, request_fingerprint)
+    pending = _inflight.get(flight.flight_key)
+    if pending is not None:
+        flight.shared = pending
+        return flight
+
+    flight._future = asyncio.get_running_loop().create_future()
+    _inflight[flight.flight_key] = flight._future
+    if key:
+        try:
+            existing = await _claim(db, flight.document_id, request_fingerprint, flight._claim)
+        except BaseException as e:
+            await flight.fail(e)
+            raise
+        if existing is not None:
+            metrics.IDEMPOTENCY_REQUESTS.labels(result="replayed").inc()
+            flight.stored = existing
+            flight._end(existing)
+            return flight
+        flight._claimed = True
+
+    metrics.IDEMPOTENCY_REQUESTS.labels(result="computed").inc()
+    return flight
+
+
+async def run(
+    db,
+    scope: str,
+    key: Optional[str],
+    request_fingerprint: str,
+    compute: Callable[[], Awaitable[Tuple[Response, bool]]],
+) -> Response:
+    """
+    The response for a request, computed at most once per key (or, without
+    a key, once per concurrent set of identical requests in this worker).
+    compute() returns (response, whether it may be stored and replayed).
+    """
+    flight = await begin(db, scope, key, request_fingerprint)
+    if flight.stored is not None:
+        return _response(flight.stored, replayed=True)
+    if flight.shared is not None:
+        return _response(await flight.wait(), replayed=True)
+
+    try:
+        response, storable = await compute()
+        await flight.complete(response, storable)
+    except BaseException as e:
+        await flight.fail(e)
+        raise
+    return response
@@ -0,0 +1,131 @@
+"""
+Incremental JSON parsing for streamed chat completions
+Feeds the model output chunk by chunk and reports each object member or
+array element as soon as its value is complete, so clients can render
+persona sections before the whole completion has arrived.
+"""
+
+import json
+from typing import Any, List, Optional, Tuple
+
+
+Path = Tuple[Any, ...]
+
+
+class _Frame:
+    __slots__ = ("kind", "path", "start", "key", "index", "expect_key")
+
+    def __init__(self, kind: str, path: Path, start: int):
+        self.kind = kind
+        self.path = path
+        self.start = start
+        self.key = None
+        self.index = 0
+        self.expect_key = kind == "object"
+
+
+class JSONStreamParser:
+    """
+    Character-level scanner over a growing JSON document.
+
+    `feed()` returns the (path, value) pairs completed by the new text, for
+    values nested at most `max_depth` levels below the root object; e.g. with
+    max_depth=2, ('recommendations', 0) and ('ai_insights', 'shopping_behavior')
+    are reported but deeper values only arrive as part of their parent.
+    Anything before the first '{' (such as a ``` fence) is skipped.
+    """
+
+    def __init__(self, max_depth: int = 2):
+        self.max_depth = max_depth
+        self._text = ""
+        self._pos = 0
+        self._stack: List[_Frame] = []
+        self._started = False
+        self.done = False
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._string_is_key = False
+        self._scalar_start: Optional[int] = None
+
+    @property
+    def text(self) -> str:
+        return self._text
+
+    def _child_path(self, frame: _Frame) -> Path:
+        return frame.path + ((frame.key,) if frame.kind == "object" else (frame.index,))
+
+    def _complete(self, frame: _Frame, raw: str, completed: List[Tuple[Path, Any]]):
+        path = self._child_path(frame)
+        if frame.kind == "array":
+            frame.index += 1
+        if len(path) > self.max_depth:
+            return
+        try:
+            completed.append((path, json.loads(raw)))
+        except ValueError:
+            pass
+
+    def feed(self, chunk: str) -> List[Tuple[Path, Any]]:
+        self._text += chunk
+        text = self._text
+        completed: List[Tuple[Path, Any]] = []
+
+        while self._pos < len(text) and not self.done:
+            i = self._pos
+            ch = text[i]
+            self._pos += 1
+
+            if not self._started:
+                if ch == "{":
+                    self._started = True
+                    self._stack.append(_Frame("object", (), i))
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    raw = text[self._string_start:i + 1]
+                    frame = self._stack[-1]
+                    if self._string_is_key:
+                        try:
+                            frame.key = json.loads(raw)
+                        except ValueError:
+                            frame.key = raw.strip('"')
+                        frame.expect_key = False
+                    else:
+                        self._complete(frame, raw, completed)
+                continue
+
+            if self._scalar_start is not None:
+                if ch not in ",}]" and not ch.isspace():
+                    continue
+                raw = text[self._scalar_start:i]
+                self._scalar_start = None
+                self._complete(self._stack[-1], raw, completed)
+
+            frame = self._stack[-1]
+            if ch.isspace() or ch == ":":
+                continue
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i
+                self._string_is_key = frame.kind == "object" and frame.expect_key
+            elif ch == ",":
+                frame.expect_key = frame.kind == "object"
+            elif ch in "{[":
+                self._stack.append(_Frame("object" if ch == "{" else "array", self._child_path(frame), i))
+            elif ch in "}]":
+                closed = self._stack.pop()
+                if not self._stack:
+                    self.done = True
+                else:
+                    self._complete(self._stack[-1], text[closed.start:i + 1], completed)
+            else:
+                self._scalar_start = i
+
+        return completed
@@ -0,0 +1,195 @@
+"""
+OpenAI token and cost accounting
+Every chat and image call is written to the `llm_calls` collection with its
+model, token usage (or image size/quality), latency, cache hit/miss and
+estimated cost, linked to the persona being generated. Summaries aggregate
+cost and latency by day, model and persona starting_method.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import tracing
+
+
+# USD per 1M tokens (input, cached input, output)
+CHAT_PRICING = {
+    "gpt-3.5-turbo": (0.50, 0.50, 1.50),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+}
+
+# USD per image by (model, quality, size)
+IMAGE_PRICING = {
+    ("dall-e-3", "standard", "1024x1024"): 0.040,
+    ("dall-e-3", "standard", "1024x1792"): 0.080,
+    ("dall-e-3", "standard", "1792x1024"): 0.080,
+    ("dall-e-3", "hd", "1024x1024"): 0.080,
+    ("dall-e-3", "hd", "1024x1792"): 0.120,
+    ("dall-e-3", "hd", "1792x1024"): 0.120,
+}
+
+# Persona the current task is generating for; set by the generation routes
+_persona_context: contextvars.ContextVar = contextvars.ContextVar("llm_persona_context", default={})
+
+_db = None
+_pending = set()
+
+
+def set_database(db):
+    """Database that llm_calls are written to"""
+    global _db
+    _db = db
+
+
+async def ensure_indexes(db):
+    await db.llm_calls.create_index("created_at")
+    await db.llm_calls.create_index("persona_id")
+
+
+@contextlib.contextmanager
+def persona_context(persona_id: Optional[str] = None, starting_method: Optional[str] = None):
+    """Attribute OpenAI calls made inside this block to a persona"""
+    token = _persona_context.set({"persona_id": persona_id, "starting_method": starting_method})
+    try:
+        yield
+    finally:
+        _persona_context.reset(token)
+
+
+def chat_cost(model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> Optional[float]:
+    pricing = CHAT_PRICING.get(model)
+    if pricing is None:
+        # Dated snapshots (e.g. gpt-3.5-turbo-0125) are priced like their base model
+        pricing = next((price for name, price in CHAT_PRICING.items() if model.startswith(name)), None)
+    if pricing is None:
+        return None
+    input_price, cached_price, output_price = pricing
+    uncached = max(0, prompt_tokens - cached_tokens)
+    return (uncached * input_price + cached_tokens * cached_price + completion_tokens * output_price) / 1_000_000
+
+
+def image_cost(model: str, quality: str, size: str, images: int) -> Optional[float]:
+    price = IMAGE_PRICING.get((model, quality, size))
+    return price * images if price is not None else None
+
+
+def _base_record(kind: str, model: str, latency_seconds: float, stats: Optional[dict], error: Optional[Exception]) -> Dict[str, Any]:
+    context = _persona_context.get()
+    stats = stats or {}
+    return {
+        "id": str(uuid.uuid4()),
+        "created_at": datetime.utcnow(),
+        "kind": kind,
+        "model": model,
+        "persona_id": context.get("persona_id"),
+        "starting_method": context.get("starting_method"),
+        "request_id": tracing.current_request_id(),
+        "latency_ms": round(latency_seconds * 1000, 1),
+        "queue_ms": round(stats.get("queue_seconds", 0.0) * 1000, 1),
+        "attempts": stats.get("attempts", 1),
+        "error": f"{error.__class__.__name__}: {error}" if error else None,
+    }
+
+
+def record_chat(request: Dict[str, Any], usage: Any, latency_seconds: float, stats: Optional[dict] = None,
+                error: Optional[Exception] = None):
+    """Record a chat completion; `usage` is the CompletionUsage OpenAI returned (None if unknown)"""
+    model = request.get("model", "")
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached_tokens = getattr(details, "cached_tokens", 0) or 0
+
+    record = _base_record("chat", model, latency_seconds, stats, error)
+    record.update({
+        "stream": bool(request.get("stream")),
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "cached_tokens": cached_tokens,
+        # OpenAI prompt caching: a hit when part of the prompt was served from cache
+        "cache_hit": cached_tokens > 0,
+        "cost_usd": chat_cost(model, prompt_tokens, completion_tokens, cached_tokens) if usage is not None else None,
+    })
+    _write(record)
+
+
+def record_image(request: Dict[str, Any], latency_seconds: float, stats: Optional[dict] = None,
+                 error: Optional[Exception] = None):
+    model = request.get("model", "dall-e-2")
+    size = request.get("size", "1024x1024")
+    quality = request.get("quality", "standard")
+    images = request.get("n", 1) if error is None else 0
+
+    record = _base_record("image", model, latency_seconds, stats, error)
+    record.update({
+        "image_size": size,
+        "image_quality": quality,
+        "images": images,
+        "cache_hit": False,
+        "cost_usd": image_cost(model, quality, size, images),
+    })
+    _write(record)
+
+
+def _write(record: Dict[str, Any]):
+    """Insert in the background so accounting never adds latency to generation"""
+    if _db is None:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+
+    async def insert():
+        try:
+            await _db.llm_calls.insert_one(record)
+        except Exception as e:
+            logging.warning(f"Failed to record OpenAI call: {str(e)}")
+
+    task = loop.create_task(insert())
+    _pending.add(task)
+    task.add_done_callback(_pending.discard)
+
+
+async def summarize(db, days: int = 30) -> List[Dict[str, Any]]:
+    """Cost, token and latency totals per day, model and starting_method"""
+    since = datetime.utcnow() - timedelta(days=days)
+    pipeline = [
+        {"$match": {"created_at": {"$gte": since}}},
+        {"$group": {
+            "_id": {
+                "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}},
+                "model": "$model",
+                "starting_method": "$starting_method",
+            },
+            "calls": {"$sum": 1},
+            "errors": {"$sum": {"$cond": [{"$ifNull": ["$error", False]}, 1, 0]}},
+            "cache_hits": {"$sum": {"$cond": ["$cache_hit", 1, 0]}},
+            "prompt_tokens": {"$sum": {"$ifNull": ["$prompt_tokens", 0]}},
+            "completion_tokens": {"$sum": {"$ifNull": ["$completion_tokens", 0]}},
+            "images": {"$sum": {"$ifNull": ["$images", 0]}},
+            "cost_usd": {"$sum": {"$ifNull": ["$cost_usd", 0]}},
+            "avg_latency_ms": {"$avg": "$latency_ms"},
+            "max_latency_ms": {"$max": "$latency_ms"},
+            "avg_queue_ms": {"$avg": "$queue_ms"},
+        }},
+        {"$sort": {"_id.day": -1, "cost_usd": -1}},
+    ]
+    rows = await db.llm_calls.aggregate(pipeline).to_list(None)
+    summary = []
+    for row in rows:
+        key = row.pop("_id")
+        row["cost_usd"] = round(row["cost_usd"], 6)
+        summary.append({**key, **row})
+    return summary
+
+
+async def calls_for_persona(db, persona_id: str, limit: int = 100) -> List[Dict[str, Any]]:
+    return await db.llm_calls.find({"persona_id": persona_id}, {"_id": 0}).sort("created_at", -1).to_list(limit)
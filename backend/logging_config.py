@@ -0,0 +1,215 @@
+"""
+Logging setup for the persona API
+All records go through a QueueHandler, so request handlers only enqueue and
+a background QueueListener thread does the formatting and the writing to
+stderr. Output is either the classic text format or one JSON object per
+line (LOG_FORMAT=json). LOG_LEVELS sets per-module levels, e.g.
+"external_integrations.file_parsers=DEBUG,openai_scheduler=WARNING". DEBUG
+records are sampled (LOG_DEBUG_SAMPLE_RATE) and rate limited per logger
+(LOG_DEBUG_PER_SECOND), so verbose parser diagnostics can stay on in
+production without flooding the queue.
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text").lower()
+LOG_LEVELS = os.environ.get("LOG_LEVELS", "")
+LOG_DEBUG_SAMPLE_RATE = float(os.environ.get("LOG_DEBUG_SAMPLE_RATE", 1.0))
+LOG_DEBUG_PER_SECOND = float(os.environ.get("LOG_DEBUG_PER_SECOND", 20))
+# Records beyond this are dropped (and counted) rather than blocking the caller
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", 10000))
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s"
+
+# Loggers whose own handlers are replaced so they also go through the queue
+UVICORN_LOGGERS = ("uvicorn", "uvicorn.error", "uvicorn.access")
+
+# Attributes every LogRecord has; anything else was passed via extra=
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+# Added to every record by tracing's record factory
+_CONTEXT_ATTRIBUTES = ("request_id", "trace_id", "span_id")
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record, with trace context and any extra= fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "module": record.module,
+            "function": record.funcName,
+            "line": record.lineno,
+        }
+        for key in _CONTEXT_ATTRIBUTES:
+            value = getattr(record, key, "-")
+            if value != "-":
+                entry[key] = value
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and key not in _CONTEXT_ATTRIBUTES and key not in entry:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = record.stack_info
+        return json.dumps(entry, default=str)
+
+
+class _ContextDefaults(logging.Filter):
+    """Fills in trace context for records that bypassed tracing's record factory"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        for key in _CONTEXT_ATTRIBUTES:
+            if not hasattr(record, key):
+                setattr(record, key, "-")
+        return True
+
+
+class DebugSampler(logging.Filter):
+    """
+    Keeps a `sample_rate` fraction of DEBUG records, then at most
+    `per_second` per logger (token bucket). Records at INFO and above always
+    pass. The next DEBUG record let through after some were dropped carries
+    `debug_suppressed` with the count.
+    """
+
+    def __init__(self, sample_rate: float = 1.0, per_second: float = 0):
+        super().__init__()
+        self.sample_rate = sample_rate
+        self.per_second = per_second
+        self._buckets: Dict[str, list] = {}
+        self._suppressed: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _take(self, name: str) -> bool:
+        if self.per_second <= 0:
+            return True
+        now = time.monotonic()
+        bucket = self._buckets.get(name)
+        if bucket is None:
+            bucket = self._buckets[name] = [self.per_second, now]
+        tokens = min(self.per_second, bucket[0] + (now - bucket[1]) * self.per_second)
+        bucket[1] = now
+        if tokens < 1:
+            bucket[0] = tokens
+            return False
+        bucket[0] = tokens - 1
+        return True
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG:
+            return True
+        with self._lock:
+            keep = (self.sample_rate >= 1 or random.random() < self.sample_rate) and self._take(record.name)
+            if not keep:
+                self._suppressed[record.name] = self._suppressed.get(record.name, 0) + 1
+                return False
+            suppressed = self._suppressed.pop(record.name, 0)
+        if suppressed:
+            record.debug_suppressed = suppressed
+        return True
+
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Enqueues without blocking; when the listener falls behind, records are
+    dropped and counted instead of stalling the event loop.
+    """
+
+    dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Render the message (and traceback) now, while the arguments are
+        # still valid, but leave formatting to the listener thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            type(self).dropped += 1
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def parse_levels(spec: str) -> Dict[str, str]:
+    """'a=DEBUG,b.c=WARNING' -> {'a': 'DEBUG', 'b.c': 'WARNING'}"""
+    levels = {}
+    for item in spec.split(","):
+        name, sep, level = item.strip().partition("=")
+        if sep and name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT, levels: Optional[Dict[str, str]] = None):
+    """
+    Route the root logger (and uvicorn's loggers) through the queue handler.
+    Calling it again replaces the previous configuration.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+
+    output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(JSONFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+    output.addFilter(_ContextDefaults())
+
+    handler = _NonBlockingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    # Sampling runs in the caller before the message is rendered, so
+    # dropped DEBUG records never pay for their formatting
+    handler.addFilter(DebugSampler(LOG_DEBUG_SAMPLE_RATE, LOG_DEBUG_PER_SECOND))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    for name in UVICORN_LOGGERS:
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers = []
+        uvicorn_logger.propagate = True
+
+    for name, module_level in (parse_levels(LOG_LEVELS) if levels is None else levels).items():
+        logging.getLogger(name).setLevel(module_level)
+
+    _listener = logging.handlers.QueueListener(handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
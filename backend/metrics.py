@@ -0,0 +1,271 @@
+"""
+Prometheus metrics for the persona API
+Request latency per route, latency of each generation stage (file parsing,
+prompt building, OpenAI chat/image, Unsplash fallback, crawler fetch, Mongo
+commands), Mongo connection pool waits, document cache hits and misses and
+counters for the fallbacks taken. Served at /api/metrics.
+
+With several worker processes, set PROMETHEUS_MULTIPROC_DIR (the entrypoint
+does) so every worker writes its samples there and /api/metrics reports the
+sum over all workers rather than whichever worker answered the scrape.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+from pymongo import monitoring
+
+import tracing
+
+
+# Persona generation runs for tens of seconds, so the buckets reach 2 minutes
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+REQUEST_LATENCY = Histogram(
+    "persona_api_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+
+STAGE_LATENCY = Histogram(
+    "persona_stage_duration_seconds",
+    "Latency of individual generation stages",
+    ["stage", "detail"],
+    buckets=LATENCY_BUCKETS,
+)
+
+STAGE_ERRORS = Counter(
+    "persona_stage_errors_total",
+    "Stages that raised an exception",
+    ["stage", "detail"],
+)
+
+FALLBACKS = Counter(
+    "persona_fallbacks_total",
+    "Fallbacks taken when an external service failed",
+    ["kind"],
+)
+
+OPENAI_QUEUE_WAIT = Histogram(
+    "persona_openai_queue_wait_seconds",
+    "Time OpenAI calls spent queued in the scheduler",
+    ["kind", "priority"],
+    buckets=LATENCY_BUCKETS,
+)
+
+OPENAI_RETRIES = Counter(
+    "persona_openai_retries_total",
+    "OpenAI calls retried by the scheduler",
+    ["kind", "reason"],
+)
+
+MONGO_POOL_WAIT = Histogram(
+    "persona_mongo_pool_wait_seconds",
+    "Time spent waiting to check a connection out of the Mongo pool",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+
+MONGO_POOL_CHECKOUT_FAILURES = Counter(
+    "persona_mongo_pool_checkout_failures_total",
+    "Mongo connection checkouts that failed (timeout, connection error, pool closed)",
+    ["reason"],
+)
+
+MONGO_POOL_IN_USE = Gauge(
+    "persona_mongo_pool_connections_in_use",
+    "Mongo connections currently checked out",
+    multiprocess_mode="livesum",
+)
+
+MONGO_POOL_OPEN = Gauge(
+    "persona_mongo_pool_connections_open",
+    "Mongo connections currently open",
+    multiprocess_mode="livesum",
+)
+
+DOCUMENT_CACHE_REQUESTS = Counter(
+    "persona_document_cache_requests_total",
+    "Persona document cache lookups by result (hit, miss, or bypass for reads that skip the cache)",
+    ["collection", "result"],
+)
+
+DOCUMENT_CACHE_INVALIDATIONS = Counter(
+    "persona_document_cache_invalidations_total",
+    "Cached persona documents dropped after a write, by where the write was seen",
+    ["collection", "source"],
+)
+
+PDF_CACHE = Counter(
+    "persona_pdf_cache_requests_total",
+    "Persona PDF exports by where the PDF came from (memory, mongo, or miss = rendered)",
+    ["result"],
+)
+
+SLIDES_CACHE = Counter(
+    "persona_slides_cache_requests_total",
+    "Google Slides batchUpdate bodies by result (hit or miss = built)",
+    ["result"],
+)
+
+IDEMPOTENCY_REQUESTS = Counter(
+    "persona_idempotency_requests_total",
+    "Generation requests by how they were answered (computed, shared in-flight, replayed from a stored key, in_progress or reused = rejected, lost = completed after another worker took the key over)",
+    ["result"],
+)
+
+# Stage names, kept in one place so dashboards and code agree
+FILE_PARSE = "file_parse"
+PROMPT_BUILD = "prompt_build"
+OPENAI_CHAT = "openai_chat"
+OPENAI_IMAGE = "openai_image"
+UNSPLASH = "unsplash"
+CRAWLER_FETCH = "crawler_fetch"
+MONGO = "mongo"
+PDF_RENDER = "pdf_render"
+
+
+def observe_stage(stage: str, seconds: float, detail: str = ""):
+    STAGE_LATENCY.labels(stage=stage, detail=detail).observe(seconds)
+
+
+@contextmanager
+def stage_timer(stage: str, detail: str = ""):
+    """Time the enclosed block as `stage`, in a tracing span of the same name (usable in sync and async code)"""
+    started = time.perf_counter()
+    try:
+        with tracing.span(stage, detail=detail or None):
+            yield
+    except Exception:
+        STAGE_ERRORS.labels(stage=stage, detail=detail).inc()
+        raise
+    finally:
+        observe_stage(stage, time.perf_counter() - started, detail)
+
+
+def timed(stage: str, detail: str, fn, *args, **kwargs):
+    """Call fn(*args, **kwargs) timed as `stage`"""
+    with stage_timer(stage, detail):
+        return fn(*args, **kwargs)
+
+
+def record_fallback(kind: str):
+    FALLBACKS.labels(kind=kind).inc()
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Records every Mongo command's server round trip as the 'mongo' stage"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        observe_stage(MONGO, event.duration_micros / 1e6, event.command_name)
+
+    def failed(self, event):
+        observe_stage(MONGO, event.duration_micros / 1e6, event.command_name)
+        STAGE_ERRORS.labels(stage=MONGO, detail=event.command_name).inc()
+
+
+class MongoPoolMetrics(monitoring.ConnectionPoolListener):
+    """
+    Records how long each checkout waited for a pooled connection. A
+    checkout's start and end are reported on the thread doing it, so start
+    times are kept per thread.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def _checkouts(self) -> dict:
+        checkouts = getattr(self._local, "checkouts", None)
+        if checkouts is None:
+            checkouts = self._local.checkouts = {}
+        return checkouts
+
+    def _observe_wait(self, address):
+        started = self._checkouts().pop(address, None)
+        if started is not None:
+            MONGO_POOL_WAIT.observe(time.perf_counter() - started)
+
+    def connection_check_out_started(self, event):
+        self._checkouts()[event.address] = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        self._observe_wait(event.address)
+        MONGO_POOL_IN_USE.inc()
+
+    def connection_check_out_failed(self, event):
+        self._observe_wait(event.address)
+        MONGO_POOL_CHECKOUT_FAILURES.labels(reason=str(event.reason)).inc()
+
+    def connection_checked_in(self, event):
+        MONGO_POOL_IN_USE.dec()
+
+    def connection_created(self, event):
+        MONGO_POOL_OPEN.inc()
+
+    def connection_closed(self, event):
+        MONGO_POOL_OPEN.dec()
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+
+def render() -> tuple:
+    """(body, content type) for the Prometheus text exposition format"""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+class PrometheusMiddleware:
+    """
+    ASGI middleware recording request latency per route template (e.g.
+    /api/personas/{persona_id}), so path parameters do not explode the label
+    set. Latency runs until the response body is fully sent, which for
+    streaming responses covers the whole stream.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            REQUEST_LATENCY.labels(
+                method=scope.get("method", ""),
+                route=getattr(route, "path", "unmatched"),
+                status=str(status["code"]),
+            ).observe(time.perf_counter() - started)
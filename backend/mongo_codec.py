@@ -0,0 +1,141 @@
+"""
+Persistence codec between Pydantic v2 models and Mongo documents
+Writes use model_dump(mode='python', exclude_defaults=...), so documents only
+store fields that differ from the model defaults, and convert the typed
+fields BSON cannot hold as-is once, in one place: enums become their values
+and datetimes become naive UTC truncated to milliseconds (what Mongo stores,
+so a value compares equal after a round trip). Reads validate through a
+compiled TypeAdapter, which restores the omitted defaults.
+"""
+
+import enum
+import types
+import typing
+from datetime import date, datetime, timezone
+from typing import Any, Callable, Dict, Generic, Iterable, List, Optional, Type, TypeVar
+
+from pydantic import BaseModel, TypeAdapter
+
+
+M = TypeVar("M", bound=BaseModel)
+
+Converter = Callable[[Any], Any]
+
+
+def bson_datetime(value: Any) -> Any:
+    """Naive UTC datetime at millisecond precision, as Mongo stores it"""
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value.replace(microsecond=value.microsecond // 1000 * 1000)
+    if isinstance(value, date):
+        # BSON has no date-only type
+        return datetime(value.year, value.month, value.day)
+    return value
+
+
+def _enum_value(value: Any) -> Any:
+    return value.value if isinstance(value, enum.Enum) else value
+
+
+def _compile(annotation: Any) -> Optional[Converter]:
+    """
+    Converter for values of `annotation`, or None when they can be stored
+    as they are. Only typed fields are walked; Any / dict payloads such as
+    resonate_data are left untouched.
+    """
+    origin = typing.get_origin(annotation)
+    args = typing.get_args(annotation)
+
+    if origin is typing.Union or origin is types.UnionType:
+        converters = [_compile(arg) for arg in args if arg is not type(None)]
+        converters = [converter for converter in converters if converter is not None]
+        if not converters:
+            return None
+        if len(converters) == 1:
+            converter = converters[0]
+            return lambda value: None if value is None else converter(value)
+        return lambda value: _first_applicable(converters, value)
+    if origin in (list, set, frozenset, tuple):
+        item = next((_compile(arg) for arg in args if arg is not Ellipsis), None)
+        return (lambda value: [item(v) for v in value]) if item else None
+    if origin is dict:
+        item = _compile(args[1]) if len(args) == 2 else None
+        return (lambda value: {k: item(v) for k, v in value.items()}) if item else None
+    if isinstance(annotation, type):
+        if issubclass(annotation, enum.Enum):
+            return _enum_value
+        if issubclass(annotation, (datetime, date)):
+            return bson_datetime
+        if issubclass(annotation, BaseModel):
+            return _compile_model(annotation)
+    return None
+
+
+def _first_applicable(converters: List[Converter], value: Any) -> Any:
+    for converter in converters:
+        try:
+            return converter(value)
+        except (AttributeError, TypeError):
+            continue
+    return value
+
+
+def _compile_model(model: Type[BaseModel]) -> Optional[Converter]:
+    fields = {name: _compile(field.annotation) for name, field in model.model_fields.items()}
+    fields = {name: converter for name, converter in fields.items() if converter is not None}
+    if not fields:
+        return None
+
+    def convert(document: Dict[str, Any]) -> Dict[str, Any]:
+        for name, converter in fields.items():
+            if name in document:
+                document[name] = converter(document[name])
+        return document
+
+    return convert
+
+
+class ModelCodec(Generic[M]):
+    """
+    Encodes one model class to Mongo documents and decodes them back.
+
+    `always_include` fields are written even when they equal their default,
+    for fields that are queried or indexed (a missing field does not match
+    an equality filter on its default value).
+    """
+
+    def __init__(self, model: Type[M], exclude_defaults: bool = True, always_include: Iterable[str] = ()):
+        self.model = model
+        self.exclude_defaults = exclude_defaults
+        self.always_include = tuple(always_include)
+        self._convert = _compile_model(model)
+        self._adapter = TypeAdapter(model)
+        self._list_adapter = TypeAdapter(List[model])
+
+    def encode(self, instance: M) -> Dict[str, Any]:
+        document = instance.model_dump(mode="python", exclude_defaults=self.exclude_defaults)
+        for name in self.always_include:
+            if name not in document:
+                document[name] = instance.model_dump(mode="python", include={name})[name]
+        return self._convert(document) if self._convert else document
+
+    def encode_fields(self, values: Dict[str, Any]) -> Dict[str, Any]:
+        """Convert a partial update (field name -> value) for use in $set"""
+        document = {
+            name: value.model_dump(mode="python", exclude_defaults=self.exclude_defaults)
+            if isinstance(value, BaseModel) else value
+            for name, value in values.items()
+        }
+        return self._convert(document) if self._convert else document
+
+    def decode(self, document: Dict[str, Any]) -> M:
+        """Validate a Mongo document (its _id is ignored) into the model"""
+        return self._adapter.validate_python(document)
+
+    def decode_many(self, documents: List[Dict[str, Any]]) -> List[M]:
+        return self._list_adapter.validate_python(documents)
+
+    @property
+    def list_adapter(self) -> TypeAdapter:
+        return self._list_adapter
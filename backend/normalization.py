@@ -0,0 +1,159 @@
+"""
+Demographic value normalization shared by all persona endpoints
+Maps raw Resonate / wizard values (age bands, gender labels, job titles,
+locations, social platform names) onto the canonical values the persona
+models and generators expect. Each field has a precomputed exact-match table
+and an ordered substring fallback; results are LRU-cached per raw value.
+"""
+
+from functools import lru_cache
+from typing import Callable, Dict, Optional, Tuple
+
+
+# Canonical age ranges (AgeRange enum values)
+GEN_Z = "18-24"
+MILLENNIAL = "25-40"
+GEN_X = "41-56"
+BOOMER = "57-75"
+SILENT = "76+"
+
+# Ordered substring rules, first match wins. Bands that straddle two
+# generations go to the range that contains most of the band.
+AGE_RANGE_RULES: Tuple[Tuple[Tuple[str, ...], str], ...] = (
+    (("18-24",), GEN_Z),
+    (("25-40", "25-34"), MILLENNIAL),
+    (("41-56", "35-44", "45-54"), GEN_X),
+    (("57-75", "55-64", "65+", "65-74"), BOOMER),
+    (("76", "75+"), SILENT),
+)
+
+# 'female' contains 'male' and 'woman' contains 'man', so female terms go first
+GENDER_RULES: Tuple[Tuple[Tuple[str, ...], str], ...] = (
+    (("female", "woman"), "Female"),
+    (("male", "man"), "Male"),
+)
+
+OCCUPATION_RULES: Tuple[Tuple[Tuple[str, ...], str], ...] = (
+    (("manager", "director", "executive"), "Executive"),
+    (("engineer", "developer", "tech"), "Technology Professional"),
+    (("marketing", "sales"), "Marketing Professional"),
+    (("analyst", "finance"), "Financial Analyst"),
+    (("consultant",), "Business Consultant"),
+)
+
+# 'suburban' contains 'urban', so suburban terms go first
+LOCATION_RULES: Tuple[Tuple[Tuple[str, ...], str], ...] = (
+    (("suburban", "suburb"), "Suburban"),
+    (("rural", "country"), "Rural"),
+    (("urban", "city", "metropolitan", "new york", "chicago", "los angeles",
+      "san francisco", "boston", "seattle"), "Urban"),
+)
+
+PLATFORM_RULES: Tuple[Tuple[Tuple[str, ...], str], ...] = (
+    (("facebook",), "Facebook"),
+    (("instagram",), "Instagram"),
+    (("linkedin",), "LinkedIn"),
+    (("twitter", "x.com"), "Twitter/X"),
+    (("tiktok",), "TikTok"),
+    (("youtube",), "YouTube"),
+    (("snapchat",), "Snapchat"),
+    (("pinterest",), "Pinterest"),
+)
+
+# Resonate column / insight keys -> Demographics field, first match wins
+DEMOGRAPHIC_FIELD_RULES: Tuple[Tuple[Tuple[str, ...], str], ...] = (
+    (("age",), "age_range"),
+    (("gender",), "gender"),
+    (("income",), "income_range"),
+    (("education",), "education"),
+    (("location", "urban"), "location"),
+    (("occupation", "job"), "occupation"),
+)
+
+
+def _compile(rules: Tuple[Tuple[Tuple[str, ...], str], ...]) -> Dict[str, str]:
+    """Exact-match table for every term in a rule set, so common values skip the substring scan"""
+    table = {}
+    for terms, canonical in rules:
+        for term in terms:
+            table.setdefault(term, canonical)
+        table.setdefault(canonical.lower(), canonical)
+    return table
+
+
+def _match(rules, table: Dict[str, str], value) -> Optional[str]:
+    if value is None:
+        return None
+    text = str(getattr(value, "value", value)).strip().lower()
+    if not text:
+        return None
+    if text in table:
+        return table[text]
+    for terms, canonical in rules:
+        if any(term in text for term in terms):
+            return canonical
+    return None
+
+
+_AGE_TABLE = _compile(AGE_RANGE_RULES)
+_GENDER_TABLE = _compile(GENDER_RULES)
+_OCCUPATION_TABLE = _compile(OCCUPATION_RULES)
+_LOCATION_TABLE = _compile(LOCATION_RULES)
+_PLATFORM_TABLE = _compile(PLATFORM_RULES)
+_PLATFORM_TABLE["x (formerly known as twitter)"] = "Twitter/X"
+_FIELD_TABLE = _compile(DEMOGRAPHIC_FIELD_RULES)
+
+
+# Every normalizer returns None when the value is not recognised, leaving the
+# caller to choose its own default.
+@lru_cache(maxsize=2048)
+def normalize_age_range(value) -> Optional[str]:
+    """Map an age band such as '35-44' or 'Age 25-34' to a canonical AgeRange value"""
+    return _match(AGE_RANGE_RULES, _AGE_TABLE, value)
+
+
+@lru_cache(maxsize=2048)
+def normalize_gender(value) -> Optional[str]:
+    """Map a gender label to 'Female' or 'Male'"""
+    return _match(GENDER_RULES, _GENDER_TABLE, value)
+
+
+@lru_cache(maxsize=2048)
+def normalize_occupation(value) -> Optional[str]:
+    """Map a job title to one of the occupation groups used for image generation"""
+    return _match(OCCUPATION_RULES, _OCCUPATION_TABLE, value)
+
+
+@lru_cache(maxsize=2048)
+def normalize_location(value) -> Optional[str]:
+    """Map a location to 'Urban', 'Suburban' or 'Rural'"""
+    return _match(LOCATION_RULES, _LOCATION_TABLE, value)
+
+
+@lru_cache(maxsize=2048)
+def normalize_platform(value) -> Optional[str]:
+    """Map a social platform name or domain to its display name"""
+    return _match(PLATFORM_RULES, _PLATFORM_TABLE, value)
+
+
+@lru_cache(maxsize=1024)
+def demographic_field(key) -> Optional[str]:
+    """Map a Resonate demographics key to the Demographics field it describes"""
+    return _match(DEMOGRAPHIC_FIELD_RULES, _FIELD_TABLE, key)
+
+
+NORMALIZERS: Dict[str, Callable] = {
+    "age_range": normalize_age_range,
+    "gender": normalize_gender,
+    "occupation": normalize_occupation,
+    "location": normalize_location,
+    "platform": normalize_platform,
+}
+
+
+def normalize(field: str, value) -> Optional[str]:
+    """Normalize a value for the named field; fields without a normalizer pass through unchanged"""
+    normalizer = NORMALIZERS.get(field)
+    if normalizer is None:
+        return value
+    return normalizer(value)
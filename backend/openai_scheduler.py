@@ -0,0 +1,520 @@
+"""
+Shared scheduler for OpenAI API calls
+Every chat and image call goes through one per-process scheduler that
+enforces separate requests/min and tokens/min budgets per endpoint (token
+buckets), serves interactive requests ahead of batch work, retries rate
+limits and transient errors with exponential backoff honouring
+`retry-after`, and keeps queue-wait statistics.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import inspect
+import itertools
+import logging
+import os
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Optional
+
+import llm_accounting
+import metrics
+import tracing
+
+
+# Lower value = served first
+INTERACTIVE = 0
+BATCH = 1
+
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch"}
+
+CHAT = "chat"
+IMAGE = "image"
+
+# Worker processes sharing the OpenAI account (gunicorn/uvicorn WEB_CONCURRENCY)
+WORKERS = max(1, int(os.environ.get("WEB_CONCURRENCY", 1)))
+
+# Defaults match OpenAI usage tier 1 for gpt-3.5-turbo and dall-e-3. For
+# images the "tokens" budget counts images (OpenAI's images-per-minute limit).
+# A limit of 0 disables that bucket. Limits are for the whole deployment;
+# each worker enforces its share (see per_worker_limits).
+LANE_LIMITS = {
+    CHAT: {
+        "requests_per_minute": int(os.environ.get("OPENAI_CHAT_RPM", 500)),
+        "tokens_per_minute": int(os.environ.get("OPENAI_CHAT_TPM", 200000)),
+        "max_concurrency": int(os.environ.get("OPENAI_CHAT_CONCURRENCY", 16)),
+    },
+    IMAGE: {
+        "requests_per_minute": int(os.environ.get("OPENAI_IMAGE_RPM", 5)),
+        "tokens_per_minute": int(os.environ.get("OPENAI_IMAGE_IPM", 5)),
+        "max_concurrency": int(os.environ.get("OPENAI_IMAGE_CONCURRENCY", 4)),
+    },
+}
+
+
+
+def per_worker_limits(limits: Dict[str, Dict[str, int]], workers: int) -> Dict[str, Dict[str, int]]:
+    """
+    Split account-wide limits evenly across worker processes, rounding down
+    (but never below 1) so the workers together stay within the account limit
+    """
+    return {
+        kind: {name: value if value <= 0 else max(1, value // workers) for name, value in config.items()}
+        for kind, config in limits.items()
+    }
+
+
+MAX_RETRIES = int(os.environ.get("OPENAI_MAX_RETRIES", 4))
+BACKOFF_BASE_SECONDS = float(os.environ.get("OPENAI_BACKOFF_BASE_SECONDS", 1.0))
+BACKOFF_MAX_SECONDS = float(os.environ.get("OPENAI_BACKOFF_MAX_SECONDS", 60.0))
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+# Priority of OpenAI calls made from the current task; request handlers run
+# as interactive, batch jobs wrap their work in `batch_priority()` and API
+# clients running bulk jobs send `X-Request-Priority: batch` (PriorityMiddleware)
+current_priority: contextvars.ContextVar = contextvars.ContextVar("openai_priority", default=INTERACTIVE)
+
+
+@contextlib.contextmanager
+def batch_priority():
+    """Run OpenAI calls made inside this block in the batch lane"""
+    token = current_priority.set(BATCH)
+    try:
+        yield
+    finally:
+        current_priority.reset(token)
+
+
+PRIORITY_HEADER = b"x-request-priority"
+
+
+class PriorityMiddleware:
+    """
+    ASGI middleware running requests that send `X-Request-Priority: batch`
+    in the batch lane, so scripted bulk generation queues behind the users
+    of the wizard instead of competing with them
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            for key, value in scope.get("headers", []):
+                if key == PRIORITY_HEADER and value.strip().lower() == b"batch":
+                    with batch_priority():
+                        await self.app(scope, receive, send)
+                    return
+        await self.app(scope, receive, send)
+
+
+class TokenBucket:
+    """Continuously refilling bucket holding at most one minute of budget"""
+
+    def __init__(self, per_minute: float):
+        self.per_minute = per_minute
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.per_minute <= 0
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.per_minute / 60.0)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` can be taken (0 if available now)"""
+        if self.unlimited:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) * 60.0 / self.per_minute
+
+    def consume(self, amount: float):
+        # May go negative when a call used more than estimated; the debt
+        # delays later calls instead of overshooting the real limit
+        if not self.unlimited:
+            self.level -= amount
+
+
+class _LaneStats:
+    def __init__(self):
+        self.calls = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.failures = 0
+        self.queue_wait_count = {name: 0 for name in PRIORITY_NAMES.values()}
+        self.queue_wait_total = {name: 0.0 for name in PRIORITY_NAMES.values()}
+        self.queue_wait_max = {name: 0.0 for name in PRIORITY_NAMES.values()}
+
+    def record_wait(self, priority: int, seconds: float):
+        name = PRIORITY_NAMES.get(priority, str(priority))
+        self.queue_wait_count[name] = self.queue_wait_count.get(name, 0) + 1
+        self.queue_wait_total[name] = self.queue_wait_total.get(name, 0.0) + seconds
+        self.queue_wait_max[name] = max(self.queue_wait_max.get(name, 0.0), seconds)
+
+
+class _Lane:
+    """Admission control for one OpenAI endpoint"""
+
+    def __init__(self, kind: str, requests_per_minute: int, tokens_per_minute: int, max_concurrency: int):
+        self.kind = kind
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_concurrency = max(1, max_concurrency)
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.stats = _LaneStats()
+        self._waiters = []
+        self._seq = itertools.count()
+        self._cond: Optional[asyncio.Condition] = None
+        self._loop = None
+
+    def _condition(self) -> asyncio.Condition:
+        loop = asyncio.get_running_loop()
+        if self._cond is None or self._loop is not loop:
+            self._cond = asyncio.Condition()
+            self._loop = loop
+        return self._cond
+
+    def _wait_for_head(self, tokens: float, now: float) -> float:
+        return max(
+            self.paused_until - now,
+            self.requests.wait_time(1, now),
+            self.tokens.wait_time(tokens, now),
+            0.0
+        )
+
+    async def acquire(self, tokens: float, priority: int) -> float:
+        """Wait for this call's turn and budget; returns the time spent queued"""
+        cond = self._condition()
+        entry = [priority, next(self._seq)]
+        started = time.monotonic()
+        async with cond:
+            heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    timeout = None
+                    if self._waiters[0] is entry:
+                        wait = self._wait_for_head(tokens, time.monotonic())
+                        if wait <= 0 and self.in_flight < self.max_concurrency:
+                            heapq.heappop(self._waiters)
+                            self.requests.consume(1)
+                            self.tokens.consume(tokens)
+                            self.in_flight += 1
+                            cond.notify_all()
+                            break
+                        if wait > 0:
+                            timeout = wait
+                    try:
+                        await asyncio.wait_for(cond.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+            except BaseException:
+                if entry in self._waiters:
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                    cond.notify_all()
+                raise
+
+        waited = time.monotonic() - started
+        self.stats.record_wait(priority, waited)
+        metrics.OPENAI_QUEUE_WAIT.labels(kind=self.kind, priority=PRIORITY_NAMES.get(priority, str(priority))).observe(waited)
+        if waited > 1:
+            logging.info(f"OpenAI {self.kind} call queued {waited:.2f}s ({PRIORITY_NAMES.get(priority, priority)})")
+        return waited
+
+    async def release(self):
+        cond = self._condition()
+        async with cond:
+            self.in_flight -= 1
+            cond.notify_all()
+
+    def pause(self, seconds: float):
+        """Hold every queued call after a rate limit response"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        stats = self.stats
+        return {
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "calls": stats.calls,
+            "retries": stats.retries,
+            "rate_limited": stats.rate_limited,
+            "failures": stats.failures,
+            "queue_wait_seconds": {
+                name: {
+                    "count": stats.queue_wait_count[name],
+                    "avg": stats.queue_wait_total[name] / stats.queue_wait_count[name] if stats.queue_wait_count[name] else 0.0,
+                    "max": stats.queue_wait_max[name],
+                }
+                for name in stats.queue_wait_count
+            },
+        }
+
+
+def _header(error: Exception, name: str) -> Optional[str]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers is None:
+        return None
+    return headers.get(name)
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Delay requested by the server via retry-after-ms / retry-after, if any"""
+    value = _header(error, "retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000.0
+        except ValueError:
+            pass
+    value = _header(error, "retry-after")
+    if value:
+        try:
+            return float(value)
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    return None
+
+
+def _retry_delay(error: Exception, attempt: int) -> Optional[float]:
+    """Backoff before retrying `error`, or None if it should not be retried"""
+    import openai
+
+    if isinstance(error, openai.RateLimitError) and getattr(error, "code", None) == "insufficient_quota":
+        # Billing problem, retrying will not help
+        return None
+    if isinstance(error, openai.APIStatusError):
+        if error.status_code not in RETRYABLE_STATUS:
+            return None
+    elif not isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+        return None
+
+    delay = retry_after_seconds(error)
+    if delay is None:
+        delay = BACKOFF_BASE_SECONDS * (2 ** attempt) * random.uniform(0.5, 1.0)
+    return min(delay, BACKOFF_MAX_SECONDS)
+
+
+def _is_rate_limit(error: Exception) -> bool:
+    return getattr(error, "status_code", None) == 429
+
+
+class ScheduledStream:
+    """
+    A streamed completion that keeps its lane slot while it is being read.
+    The slot is released, and the token bucket reconciled with the usage
+    chunk (stream_options={"include_usage": True}), when iteration ends or
+    close() is called. Callers that may stop early must close() it.
+    """
+
+    def __init__(self, stream: Any, lane: "_Lane", estimated_tokens: float):
+        self._stream = stream
+        self._lane = lane
+        self._estimated_tokens = estimated_tokens
+        self._closed = False
+        self.usage = None
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        try:
+            async for chunk in self._stream:
+                if getattr(chunk, "usage", None):
+                    self.usage = chunk.usage
+                yield chunk
+        finally:
+            await self.close()
+
+    async def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            close = getattr(self._stream, "close", None)
+            if close is not None:
+                result = close()
+                if inspect.isawaitable(result):
+                    await result
+        finally:
+            await self._lane.release()
+            total_tokens = getattr(self.usage, "total_tokens", None)
+            if isinstance(total_tokens, int):
+                self._lane.tokens.consume(total_tokens - self._estimated_tokens)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+class OpenAIScheduler:
+    def __init__(self, limits: Dict[str, Dict[str, int]] = None, max_retries: int = MAX_RETRIES):
+        self.max_retries = max_retries
+        limits = limits or per_worker_limits(LANE_LIMITS, WORKERS)
+        self._lanes = {kind: _Lane(kind, **config) for kind, config in limits.items()}
+
+    def lane(self, kind: str) -> _Lane:
+        return self._lanes[kind]
+
+    async def call(self, kind: str, fn: Callable, *args, tokens: float = 1, priority: Optional[int] = None,
+                   stats: Optional[Dict[str, Any]] = None, **kwargs) -> Any:
+        """
+        Run `fn(*args, **kwargs)` once the `kind` lane has capacity. `tokens`
+        is the estimated token (or image) cost; chat calls are reconciled
+        with the usage OpenAI reports. Synchronous functions run in a worker
+        thread. Errors that are not retryable, or still failing after
+        MAX_RETRIES, are raised to the caller. If `stats` is given it is
+        filled with queue_seconds and attempts. A stream=True call returns a
+        ScheduledStream, which holds its concurrency slot until it is read
+        to the end or closed.
+        """
+        lane = self._lanes[kind]
+        if priority is None:
+            priority = current_priority.get()
+        is_async = inspect.iscoroutinefunction(inspect.unwrap(fn))
+
+        if stats is None:
+            stats = {}
+        stats.update(queue_seconds=0.0, attempts=0)
+
+        # Per-attempt openai_{kind} stage spans nest under this one
+        with tracing.span(f"openai_scheduler.{kind}", priority=priority, estimated_tokens=tokens) as call_span:
+            try:
+                return await self._call(lane, kind, fn, args, kwargs, tokens, priority, is_async, stats)
+            finally:
+                call_span.set_attribute("queue_seconds", stats["queue_seconds"])
+                call_span.set_attribute("attempts", stats["attempts"])
+
+    async def _call(self, lane: "_Lane", kind: str, fn: Callable, args: tuple, kwargs: dict, tokens: float,
+                    priority: int, is_async: bool, stats: Dict[str, Any]) -> Any:
+        attempt = 0
+        while True:
+            stats["queue_seconds"] += await lane.acquire(tokens, priority)
+            stats["attempts"] += 1
+            # A returned stream takes over the slot until it is consumed
+            hand_off = False
+            try:
+                lane.stats.calls += 1
+                with metrics.stage_timer(f"openai_{kind}"):
+                    if is_async:
+                        result = await fn(*args, **kwargs)
+                    else:
+                        result = await asyncio.to_thread(fn, *args, **kwargs)
+                hand_off = bool(kwargs.get("stream"))
+            except Exception as e:
+                delay = _retry_delay(e, attempt)
+                if delay is None or attempt >= self.max_retries:
+                    lane.stats.failures += 1
+                    if _is_rate_limit(e):
+                        lane.stats.rate_limited += 1
+                        logging.warning(f"OpenAI {kind} call rate limited, giving up after {attempt} retries")
+                    raise
+                attempt += 1
+                lane.stats.retries += 1
+                metrics.OPENAI_RETRIES.labels(kind=kind, reason="rate_limit" if _is_rate_limit(e) else e.__class__.__name__).inc()
+                if _is_rate_limit(e):
+                    lane.stats.rate_limited += 1
+                    # Stop the whole lane until the limit window reopens
+                    lane.pause(delay)
+                    logging.warning(f"OpenAI {kind} call rate limited, retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                else:
+                    logging.warning(f"OpenAI {kind} call failed ({e.__class__.__name__}), retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+                continue
+            finally:
+                if not hand_off:
+                    await lane.release()
+
+            if hand_off:
+                return ScheduledStream(result, lane, tokens)
+            usage = getattr(result, "usage", None)
+            total_tokens = getattr(usage, "total_tokens", None)
+            if isinstance(total_tokens, int):
+                lane.tokens.consume(total_tokens - tokens)
+            return result
+
+    def metrics(self) -> Dict[str, Any]:
+        return {kind: lane.snapshot() for kind, lane in self._lanes.items()}
+
+
+scheduler = OpenAIScheduler()
+
+_client = None
+_client_pid = None
+
+
+def get_client():
+    """
+    Shared AsyncOpenAI client, or None if OPENAI_API_KEY is not set.
+    Retries are left to the scheduler, so the client's own are disabled.
+    The client's connection pool cannot be shared across fork(), so a worker
+    that inherited one from its parent builds its own.
+    """
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        api_key = os.environ.get("OPENAI_API_KEY")
+        if not api_key:
+            return None
+        from openai import AsyncOpenAI
+        _client = AsyncOpenAI(api_key=api_key, max_retries=0)
+        _client_pid = os.getpid()
+    return _client
+
+
+def client_constructed() -> bool:
+    return _client is not None and _client_pid == os.getpid()
+
+
+async def chat_completion(estimated_tokens: int, priority: Optional[int] = None, stats: Optional[Dict[str, Any]] = None,
+                          **request) -> Any:
+    """chat.completions.create through the scheduler, recorded in llm_calls"""
+    client = get_client()
+    if client is None:
+        raise RuntimeError("OpenAI API key not found")
+    if stats is None:
+        stats = {}
+    started = time.monotonic()
+    try:
+        response = await scheduler.call(CHAT, client.chat.completions.create, tokens=estimated_tokens,
+                                        priority=priority, stats=stats, **request)
+    except Exception as e:
+        llm_accounting.record_chat(request, None, time.monotonic() - started, stats, error=e)
+        raise
+    if not request.get("stream"):
+        # Streamed calls are recorded by the caller once the final usage chunk arrives
+        llm_accounting.record_chat(request, getattr(response, "usage", None), time.monotonic() - started, stats)
+    return response
+
+
+async def image_generation(priority: Optional[int] = None, **request) -> Any:
+    """images.generate through the scheduler, recorded in llm_calls"""
+    client = get_client()
+    if client is None:
+        raise RuntimeError("OpenAI API key not found")
+    stats = {}
+    started = time.monotonic()
+    try:
+        response = await scheduler.call(IMAGE, client.images.generate, tokens=request.get("n", 1),
+                                        priority=priority, stats=stats, **request)
+    except Exception as e:
+        llm_accounting.record_image(request, time.monotonic() - started, stats, error=e)
+        raise
+    llm_accounting.record_image(request, time.monotonic() - started, stats)
+    return response
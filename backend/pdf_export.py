@@ -0,0 +1,358 @@
+"""
+Server-side PDF rendering of generated personas
+Renders the persona page the way VisualPersonaTemplate lays it out (header
+band, headshot with demographics, social platforms, AI-generated profile)
+with ReportLab, in a small process pool so a render never blocks the event
+loop or holds the GIL of the serving worker.
+
+Rendered PDFs are keyed by generated persona id + a hash of the fields the
+PDF shows (and RENDERER_VERSION), which is also the response ETag. They are
+kept in a per-worker LRU (PDF_CACHE_MAX_BYTES) and in the `pdf_exports`
+collection (expiring after PDF_CACHE_TTL_DAYS), so repeat exports from any
+worker are served without rendering, and a client revalidating with
+If-None-Match gets a 304. A PDF whose headshot could not be fetched (slow
+or expired image URL) is served but neither cached nor given an ETag, so
+the next export tries the image again.
+"""
+
+import asyncio
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+import orjson
+
+import metrics
+
+
+# Bump when the layout changes, so cached PDFs and ETags are replaced
+RENDERER_VERSION = "2"
+
+PDF_RENDER_PROCESSES = int(os.environ.get("PDF_RENDER_PROCESSES", 2))
+PDF_CACHE_MAX_BYTES = int(os.environ.get("PDF_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+PDF_CACHE_TTL_DAYS = int(os.environ.get("PDF_CACHE_TTL_DAYS", 30))
+PDF_IMAGE_TIMEOUT = float(os.environ.get("PDF_IMAGE_TIMEOUT", 5))
+
+logger = logging.getLogger(__name__)
+
+
+def render_input(generated_persona: Dict[str, Any]) -> Dict[str, Any]:
+    """The fields of a GeneratedPersona (as JSON-mode data) that appear in the PDF"""
+    persona_data = generated_persona.get("persona_data") or {}
+    return {
+        "id": generated_persona.get("id"),
+        "name": persona_data.get("name") or generated_persona.get("name"),
+        "persona_image_url": generated_persona.get("persona_image_url"),
+        "demographics": persona_data.get("demographics") or {},
+        "social_media_platforms": (persona_data.get("media_consumption") or {}).get("social_media_platforms") or [],
+        "ai_insights": generated_persona.get("ai_insights") or {},
+        "pain_points": generated_persona.get("pain_points") or [],
+        "goals": generated_persona.get("goals") or [],
+        "recommendations": generated_persona.get("recommendations") or [],
+        "communication_style": generated_persona.get("communication_style") or "",
+    }
+
+
+def content_hash(data: Dict[str, Any]) -> str:
+    canonical = orjson.dumps([RENDERER_VERSION, data], option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+    return hashlib.sha256(canonical).hexdigest()
+
+
+# --- Rendering (runs in the pool processes) ---
+
+# Tailwind colors used by VisualPersonaTemplate
+_BLUE_600 = "#2563EB"
+_PURPLE_600 = "#9333EA"
+_TEAL_600 = "#0D9488"
+_GRAY_800 = "#1F2937"
+_GRAY_600 = "#4B5563"
+_SECTIONS = (
+    # (field, title, text color, background)
+    ("pain_points", "Pain Points", "#DC2626", "#FEF2F2"),
+    ("goals", "Goals & Aspirations", "#16A34A", "#F0FDF4"),
+    ("recommendations", "Marketing Recommendations", "#2563EB", "#EFF6FF"),
+)
+_HEADER_HEIGHT = 90
+
+
+def _fetch_image(url: Optional[str]) -> Optional[bytes]:
+    if not url:
+        return None
+    import requests
+    try:
+        response = requests.get(url, timeout=PDF_IMAGE_TIMEOUT)
+        response.raise_for_status()
+        return response.content
+    except Exception as e:
+        logger.warning("Persona image %s not included in PDF: %s", url, e)
+        return None
+
+
+def _label(key: str) -> str:
+    return key.replace("_", " ").strip().title()
+
+
+def _text_items(value: Any) -> list:
+    """Flatten an ai_insights value into display strings"""
+    if value is None or value == "" or value == [] or value == {}:
+        return []
+    if isinstance(value, list):
+        return [str(item) for item in value if item not in (None, "")]
+    if isinstance(value, dict):
+        return [f"{_label(str(k))}: {v}" for k, v in value.items() if v not in (None, "", [], {})]
+    return [str(value)]
+
+
+def render_pdf(data: Dict[str, Any]) -> Tuple[bytes, bool]:
+    """
+    Render one persona (as returned by render_input) to PDF bytes. Also
+    returns whether the PDF is complete: False when the persona has an image
+    URL but the image could not be embedded.
+    """
+    from xml.sax.saxutils import escape
+
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import ParagraphStyle
+    from reportlab.lib.units import mm
+    from reportlab.platypus import Image, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+    width, height = A4
+    margin = 15 * mm
+    content_width = width - 2 * margin
+    name = data.get("name") or "Generated Persona"
+
+    title = ParagraphStyle("title", fontName="Helvetica-Bold", fontSize=22, leading=26, textColor=colors.white)
+    subtitle = ParagraphStyle("subtitle", fontName="Helvetica", fontSize=12, leading=15, textColor=colors.white)
+    heading = ParagraphStyle("heading", fontName="Helvetica-Bold", fontSize=14, leading=18,
+                             textColor=colors.HexColor(_GRAY_800), spaceAfter=6)
+    body = ParagraphStyle("body", fontName="Helvetica", fontSize=9.5, leading=13, textColor=colors.HexColor(_GRAY_800))
+
+    def page_decorations(canvas, doc):
+        canvas.saveState()
+        if doc.page == 1:
+            # bg-gradient-to-r from-blue-600 via-purple-600 to-teal-600
+            canvas.saveState()
+            band = canvas.beginPath()
+            band.rect(0, height - _HEADER_HEIGHT, width, _HEADER_HEIGHT)
+            canvas.clipPath(band, stroke=0, fill=0)
+            canvas.linearGradient(
+                0, height, width, height,
+                (colors.HexColor(_BLUE_600), colors.HexColor(_PURPLE_600), colors.HexColor(_TEAL_600)),
+                extend=False,
+            )
+            canvas.restoreState()
+            header = Table([[Paragraph(escape(name), title)], [Paragraph("Data-Driven Consumer Profile", subtitle)]],
+                           colWidths=[content_width])
+            header.setStyle(TableStyle([("LEFTPADDING", (0, 0), (-1, -1), 0)]))
+            header.wrapOn(canvas, content_width, _HEADER_HEIGHT)
+            header.drawOn(canvas, margin, height - _HEADER_HEIGHT + 12)
+        canvas.setFont("Helvetica", 7.5)
+        canvas.setFillColor(colors.HexColor(_GRAY_600))
+        canvas.drawCentredString(width / 2, 8 * mm,
+                                 "Generated by BCM VentasAI Persona Generator | The AI Performance Marketing Agency")
+        canvas.restoreState()
+
+    story = []
+
+    # Headshot beside demographics and data sources
+    image_bytes = _fetch_image(data.get("persona_image_url"))
+    image_size = 55 * mm
+    if image_bytes:
+        headshot = Image(io.BytesIO(image_bytes), width=image_size, height=image_size)
+    else:
+        initials = "".join(word[0] for word in name.split()[:2]).upper()
+        headshot = Table([[Paragraph(escape(initials), ParagraphStyle("initials", parent=title, alignment=1,
+                                                                       textColor=colors.HexColor(_GRAY_600)))]],
+                         colWidths=[image_size], rowHeights=[image_size])
+        headshot.setStyle(TableStyle([("BACKGROUND", (0, 0), (-1, -1), colors.HexColor("#E5E7EB")),
+                                      ("VALIGN", (0, 0), (-1, -1), "MIDDLE")]))
+    demographics = data.get("demographics") or {}
+    demographic_rows = [
+        ("Age", demographics.get("age_range") or "25-40"),
+        ("Gender", demographics.get("gender") or "Female"),
+        ("Income", demographics.get("income_range") or "$50,000-$75,000"),
+        ("Location", demographics.get("location") or "Urban"),
+    ]
+    for key in ("education", "occupation", "family_status"):
+        if demographics.get(key):
+            demographic_rows.append((_label(key), demographics[key]))
+    profile = [Paragraph("Demographics", heading)]
+    profile += [Paragraph(f"<b>{escape(label)}:</b> {escape(str(value))}", body) for label, value in demographic_rows]
+    profile += [Spacer(1, 8), Paragraph("Powered By", heading),
+                Paragraph("SEMRush &middot; SparkToro &middot; Buzzabout.ai &middot; Resonate AI", body)]
+    top = Table([[headshot, profile]], colWidths=[image_size + 8 * mm, content_width - image_size - 8 * mm])
+    top.setStyle(TableStyle([("VALIGN", (0, 0), (-1, -1), "TOP"), ("LEFTPADDING", (0, 0), (-1, -1), 0)]))
+    story += [top, Spacer(1, 10 * mm)]
+
+    platforms = data.get("social_media_platforms") or []
+    if platforms:
+        story.append(Paragraph("Social Media Engagement", heading))
+        columns = 4
+        cells = [Paragraph(escape(str(platform)), body) for platform in platforms]
+        cells += [""] * (-len(cells) % columns)
+        rows = [cells[i:i + columns] for i in range(0, len(cells), columns)]
+        grid = Table(rows, colWidths=[content_width / columns] * columns)
+        grid.setStyle(TableStyle([
+            ("BACKGROUND", (0, 0), (-1, -1), colors.HexColor("#F3F4F6")),
+            ("GRID", (0, 0), (-1, -1), 2, colors.white),
+            ("TOPPADDING", (0, 0), (-1, -1), 6),
+            ("BOTTOMPADDING", (0, 0), (-1, -1), 6),
+        ]))
+        story += [grid, Spacer(1, 8 * mm)]
+
+    insight_rows = [(key, _text_items(value)) for key, value in (data.get("ai_insights") or {}).items()]
+    insight_rows.append(("communication_style", _text_items(data.get("communication_style"))))
+    insight_rows = [(key, items) for key, items in insight_rows if items]
+    if insight_rows:
+        story.append(Paragraph("Persona Insights", heading))
+        for key, items in insight_rows:
+            story.append(Paragraph(f"<b>{escape(_label(key))}:</b> {escape('; '.join(items))}", body))
+            story.append(Spacer(1, 3))
+        story.append(Spacer(1, 8 * mm))
+
+    sections = [(title_text, data.get(field) or [], color, background)
+                for field, title_text, color, background in _SECTIONS if data.get(field)]
+    if sections:
+        story.append(Paragraph("AI-Generated Profile", heading))
+        column_width = content_width / len(sections)
+        cells = []
+        for title_text, items, color, background in sections:
+            column_heading = ParagraphStyle(f"h_{title_text}", parent=body, fontName="Helvetica-Bold",
+                                            textColor=colors.HexColor(color), spaceAfter=4)
+            item_table = Table([[Paragraph(escape(str(item)), body)] for item in items], colWidths=[column_width - 8])
+            item_table.setStyle(TableStyle([
+                ("BACKGROUND", (0, 0), (-1, -1), colors.HexColor(background)),
+                ("LINEBEFORE", (0, 0), (0, -1), 2, colors.HexColor(color)),
+                ("LINEBELOW", (0, 0), (-1, -1), 3, colors.white),
+            ]))
+            cells.append([Paragraph(escape(title_text), column_heading), item_table])
+        columns = Table([cells], colWidths=[column_width] * len(sections))
+        columns.setStyle(TableStyle([("VALIGN", (0, 0), (-1, -1), "TOP"), ("LEFTPADDING", (0, 0), (-1, -1), 2)]))
+        story.append(columns)
+
+    output = io.BytesIO()
+    document = SimpleDocTemplate(
+        output, pagesize=A4, title=f"{name} - Persona", author="BCM VentasAI Persona Generator",
+        leftMargin=margin, rightMargin=margin, topMargin=_HEADER_HEIGHT + 10 * mm, bottomMargin=15 * mm,
+    )
+    document.build(story, onFirstPage=page_decorations, onLaterPages=page_decorations)
+    return output.getvalue(), bool(image_bytes) or not data.get("persona_image_url")
+
+
+# --- Pool and cache (serving worker) ---
+
+_pool: Optional[ProcessPoolExecutor] = None
+_memory: "OrderedDict[str, bytes]" = OrderedDict()
+_memory_bytes = 0
+_inflight: Dict[str, asyncio.Future] = {}
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: the serving worker runs threads (Mongo, logging, tracing)
+        # that must not be forked mid-operation
+        _pool = ProcessPoolExecutor(max_workers=PDF_RENDER_PROCESSES, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def ensure_indexes(db):
+    await db.pdf_exports.create_index("created_at", expireAfterSeconds=PDF_CACHE_TTL_DAYS * 86400)
+
+
+def _remember(key: str, pdf: bytes):
+    global _memory_bytes
+    if len(pdf) > PDF_CACHE_MAX_BYTES:
+        return
+    if key in _memory:
+        _memory_bytes -= len(_memory.pop(key))
+    _memory[key] = pdf
+    _memory_bytes += len(pdf)
+    while _memory_bytes > PDF_CACHE_MAX_BYTES:
+        _, evicted = _memory.popitem(last=False)
+        _memory_bytes -= len(evicted)
+
+
+async def _render_in_pool(data: Dict[str, Any]) -> Tuple[bytes, bool]:
+    global _pool
+    loop = asyncio.get_running_loop()
+    with metrics.stage_timer(metrics.PDF_RENDER):
+        try:
+            return await loop.run_in_executor(_get_pool(), render_pdf, data)
+        except BrokenProcessPool:
+            # A render process died (e.g. out of memory); start a fresh pool once
+            _pool = None
+            return await loop.run_in_executor(_get_pool(), render_pdf, data)
+
+
+async def get_pdf(db, generated_persona: Dict[str, Any]) -> Tuple[bytes, Optional[str]]:
+    """
+    (pdf bytes, etag) for a generated persona (JSON-mode dict), from the
+    cache or freshly rendered. Concurrent requests for the same PDF share
+    one render. The etag is None for an incomplete (uncached) render.
+    """
+    data = render_input(generated_persona)
+    etag = content_hash(data)
+    key = f"{data['id']}:{etag}"
+
+    pdf = _memory.get(key)
+    if pdf is not None:
+        _memory.move_to_end(key)
+        metrics.PDF_CACHE.labels(result="memory").inc()
+        return pdf, etag
+
+    pending = _inflight.get(key)
+    if pending is not None:
+        pdf, complete = await asyncio.shield(pending)
+        return pdf, etag if complete else None
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    try:
+        stored = await db.pdf_exports.find_one({"_id": key}, {"pdf": True})
+        if stored is not None:
+            metrics.PDF_CACHE.labels(result="mongo").inc()
+            pdf, complete = bytes(stored["pdf"]), True
+        else:
+            metrics.PDF_CACHE.labels(result="miss").inc()
+            pdf, complete = await _render_in_pool(data)
+        if not complete:
+            future.set_result((pdf, False))
+            return pdf, None
+        if stored is None:
+            try:
+                await db.pdf_exports.replace_one(
+                    {"_id": key},
+                    {"persona_id": data["id"], "pdf": pdf, "created_at": datetime.utcnow()},
+                    upsert=True,
+                )
+            except Exception as e:
+                logger.warning("Could not store rendered PDF %s: %s", key, e)
+        _remember(key, pdf)
+        future.set_result((pdf, True))
+        return pdf, etag
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        # Retrieved here so a failure nobody else awaited is not logged as unretrieved
+        future.exception()
+        raise
+    finally:
+        _inflight.pop(key, None)
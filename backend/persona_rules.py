@@ -0,0 +1,408 @@
+"""
+Rule tables for the non-AI persona generators
+Declarative rules keyed on age range, gender, income, location and social
+platforms. The tables are compiled into lookup dictionaries at import time and
+evaluated once per normalized demographic profile.
+"""
+
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+
+# Income ranges are free text, so rules match on the dollar figures they mention
+INCOME_MARKERS = ("$25,000", "$50,000", "$75,000", "$100,000")
+
+# Per age range rules (keys are AgeRange values)
+AGE_RULES: Dict[str, Dict[str, Any]] = {
+    "18-24": {
+        "personality_traits": ("Digital native", "Socially conscious", "Entrepreneurial"),
+        "shopping_behavior": "Research-heavy, reviews-driven, mobile-first shopping",
+        "decision_factors": ("Social impact", "Authenticity", "Price"),
+        "recommendations": (
+            "Focus on authentic, purpose-driven brand messaging",
+            "Prioritize mobile-first, video-centric content",
+        ),
+        "pain_points": (
+            "Limited disposable income for premium products",
+            "Overwhelmed by too many brand choices",
+            "Skeptical of traditional advertising",
+        ),
+        "goals": (
+            "Discover brands that align with personal values",
+            "Find affordable options that don't compromise quality",
+            "Stay current with trends and innovations",
+        ),
+        "communication_style": "Authentic, visual, and purpose-driven communication",
+        "content_consumption_style": "Visual-first, short-form content preference",
+        "interaction_preferences": ("Stories", "Direct messages", "Comments"),
+        "privacy_concerns": "High privacy awareness, selective sharing",
+    },
+    "25-40": {
+        "personality_traits": ("Tech-savvy", "Value-conscious", "Experience-focused"),
+        "shopping_behavior": "Research-heavy, reviews-driven, mobile-first shopping",
+        "decision_factors": ("Reviews", "Convenience", "Value"),
+        "recommendations": (
+            "Highlight convenience and time-saving benefits",
+            "Emphasize value for money and experiences over products",
+        ),
+        "pain_points": (
+            "Time constraints due to busy lifestyle",
+            "Information overload when researching products",
+            "Balancing quality with affordability",
+        ),
+        "goals": (
+            "Make efficient purchasing decisions",
+            "Find products that enhance lifestyle and experiences",
+            "Get the best value for money spent",
+        ),
+        "communication_style": "Direct, informative, and value-focused communication",
+        "content_consumption_style": "Mixed content, values authenticity",
+        "interaction_preferences": ("Likes", "Shares", "Comments", "Groups"),
+        "privacy_concerns": "Moderate privacy concerns, curated sharing",
+    },
+    "41-56": {
+        "personality_traits": ("Pragmatic", "Independent", "Quality-focused"),
+        "shopping_behavior": "Methodical researcher, brand comparison focused",
+        "decision_factors": ("Quality", "Brand reputation", "Features"),
+        "recommendations": (
+            "Provide detailed product information and comparisons",
+            "Use trusted review sources and testimonials",
+        ),
+        "pain_points": (
+            "Difficulty keeping up with technology changes",
+            "Concerns about online security and privacy",
+            "Preference for proven brands over new options",
+        ),
+        "goals": (
+            "Make informed, researched purchase decisions",
+            "Find reliable products that last long-term",
+            "Support brands with good customer service",
+        ),
+        "communication_style": "Professional, detailed, and trustworthy communication",
+        "content_consumption_style": "Information-focused, longer content acceptable",
+        "interaction_preferences": ("Likes", "Shares", "Professional networking"),
+        "privacy_concerns": "High privacy concerns, limited personal sharing",
+    },
+    "57-75": {
+        "personality_traits": ("Traditional", "Brand loyal", "Quality-oriented"),
+        "shopping_behavior": "Brand loyal, prefers established retailers",
+        "decision_factors": ("Trust", "Customer service", "Reliability"),
+        "recommendations": (
+            "Focus on reliability and customer service quality",
+            "Use traditional media channels alongside digital",
+        ),
+        "pain_points": (
+            "Discomfort with complex digital interfaces",
+            "Preference for personal customer service",
+            "Caution about online purchasing",
+        ),
+        "goals": (
+            "Purchase from trusted, established brands",
+            "Receive excellent customer support",
+            "Find products that meet specific needs reliably",
+        ),
+        "communication_style": "Respectful, traditional, and service-oriented communication",
+    },
+}
+
+DEFAULT_AGE_RULE: Dict[str, Any] = {
+    "personality_traits": (),
+    "shopping_behavior": "Standard purchase behavior",
+    "decision_factors": (),
+    "recommendations": (),
+    "pain_points": (),
+    "goals": (),
+    "communication_style": "Clear, professional, and informative communication",
+    "content_consumption_style": "",
+    "interaction_preferences": (),
+    "privacy_concerns": "",
+}
+
+GENDER_TRAITS: Dict[str, Tuple[str, ...]] = {
+    "Female": ("Community-oriented",),
+    "Male": ("Goal-oriented",),
+}
+
+LOCATION_RECOMMENDATIONS: Dict[str, Tuple[str, ...]] = {
+    "Urban": ("Highlight convenience and fast delivery options",),
+    "Suburban": ("Focus on family-oriented messaging and bulk options",),
+    "Rural": ("Emphasize online accessibility and shipping benefits",),
+}
+
+# Income rules: the first entry whose markers appear in the income range wins,
+# otherwise the default applies
+INCOME_RULES: Dict[str, Dict[str, Any]] = {
+    "personality_traits": {
+        "rules": [
+            (("$75,000",), ("Premium-conscious", "Investment-minded")),
+            (("$50,000",), ("Value-conscious", "Budget-aware")),
+        ],
+        "default": (),
+    },
+    "decision_factors": {
+        "rules": [(("$75,000",), ("Premium features",))],
+        "default": ("Price competitiveness",),
+    },
+    "recommendations": {
+        "rules": [(("$75,000", "$100,000"), ("Position premium features and exclusive offerings",))],
+        "default": ("Emphasize value propositions and cost-effectiveness",),
+    },
+    "pain_points": {
+        "rules": [
+            (("$25,000",), ("Budget constraints limiting premium options",)),
+            (("$50,000",), ("Need to justify larger purchases carefully",)),
+        ],
+        "default": (),
+    },
+    "goals": {
+        "rules": [(("$75,000", "$100,000"), ("Access premium products and services",))],
+        "default": ("Maximize value within budget constraints",),
+    },
+}
+
+GENERAL_PAIN_POINTS = ("Finding trustworthy product reviews", "Comparing similar products effectively")
+GENERAL_GOALS = ("Avoid purchase regret through careful selection", "Save time in the buying process")
+
+# Platform rules; Twitter/X is treated as Twitter
+PLATFORM_ALIASES = {"Twitter/X": "Twitter"}
+
+PLATFORM_RULES: Dict[str, Dict[str, Any]] = {
+    "Instagram": {
+        "recommendation": "Use Instagram visual storytelling and influencer partnerships",
+        "influence_factor": "Visual inspiration and lifestyle trends",
+        "analysis": {
+            "engagement_rate": "4.2%",
+            "peak_times": ("12:00 PM", "7:00 PM", "9:00 PM"),
+            "content_performance": "Visual content performs 73% better",
+            "ad_receptivity": "68%",
+            "primary_usage": "Visual discovery and lifestyle content",
+        },
+    },
+    "Facebook": {
+        "recommendation": "Utilize Facebook targeted advertising and community groups",
+        "influence_factor": "Peer recommendations and community discussions",
+        "analysis": {
+            "engagement_rate": "2.8%",
+            "peak_times": ("6:00 PM", "8:00 PM", "10:00 AM"),
+            "content_performance": "Video content gets 135% more engagement",
+            "ad_receptivity": "72%",
+            "primary_usage": "News, community groups, and brand discovery",
+        },
+    },
+    "LinkedIn": {
+        "recommendation": "Leverage LinkedIn for professional and B2B messaging",
+        "influence_factor": "Professional recommendations",
+        "analysis": {
+            "engagement_rate": "5.1%",
+            "peak_times": ("8:00 AM", "12:00 PM", "5:00 PM"),
+            "content_performance": "Professional content performs 89% better",
+            "ad_receptivity": "61%",
+            "primary_usage": "Professional networking and industry insights",
+        },
+    },
+    "Twitter": {
+        "recommendation": "Engage in real-time conversations and trending topics on X/Twitter",
+        "influence_factor": "Real-time news and expert opinions",
+        "analysis": {
+            "engagement_rate": "3.6%",
+            "peak_times": ("9:00 AM", "3:00 PM", "9:00 PM"),
+            "content_performance": "Real-time content performs 94% better",
+            "ad_receptivity": "58%",
+            "primary_usage": "News updates and real-time conversations",
+        },
+    },
+    "TikTok": {
+        "recommendation": "Create engaging short-form video content for TikTok",
+        "analysis": {
+            "engagement_rate": "8.3%",
+            "peak_times": ("6:00 PM", "9:00 PM", "11:00 PM"),
+            "content_performance": "Short-form video essential",
+            "ad_receptivity": "74%",
+            "primary_usage": "Entertainment and trend discovery",
+        },
+    },
+    "YouTube": {
+        "analysis": {
+            "engagement_rate": "6.2%",
+            "peak_times": ("7:00 PM", "9:00 PM", "2:00 PM"),
+            "content_performance": "Long-form educational content preferred",
+            "ad_receptivity": "65%",
+            "primary_usage": "Educational content and entertainment",
+        },
+    },
+}
+
+RECOMMENDATION_PLATFORM_ORDER = ("Instagram", "LinkedIn", "Facebook", "TikTok", "Twitter")
+INFLUENCE_PLATFORM_ORDER = ("LinkedIn", "Instagram", "Facebook", "Twitter")
+
+# (minimum platform count, description), checked in order
+DIGITAL_BEHAVIOR_RULES = (
+    (4, "Heavy social media user, multi-platform engagement"),
+    (2, "Active on social media, selective platform usage"),
+    (1, "Moderate social media usage, focused platform preference"),
+    (0, "Limited digital presence"),
+)
+
+OUTPUT_LIMITS = {
+    "personality_traits": 4,
+    "decision_factors": 4,
+    "recommendations": 6,
+    "pain_points": 5,
+    "goals": 5,
+}
+
+
+def _income_buckets() -> List[Tuple[str, ...]]:
+    """Every combination of income markers an income range can contain"""
+    buckets = []
+    for mask in range(1 << len(INCOME_MARKERS)):
+        buckets.append(tuple(m for i, m in enumerate(INCOME_MARKERS) if mask & (1 << i)))
+    return buckets
+
+
+def _compile_income_rules() -> Dict[Tuple[str, ...], Dict[str, Tuple[str, ...]]]:
+    """Resolve INCOME_RULES for every income bucket up front"""
+    compiled = {}
+    for bucket in _income_buckets():
+        resolved = {}
+        for field, spec in INCOME_RULES.items():
+            resolved[field] = spec["default"]
+            for markers, values in spec["rules"]:
+                if any(marker in bucket for marker in markers):
+                    resolved[field] = values
+                    break
+        compiled[bucket] = resolved
+    return compiled
+
+
+def _compile_age_rules() -> Dict[Optional[str], Dict[str, Any]]:
+    compiled = {None: DEFAULT_AGE_RULE}
+    for age_range, rule in AGE_RULES.items():
+        compiled[age_range] = {**DEFAULT_AGE_RULE, **rule}
+    return compiled
+
+
+_AGE_TABLE = _compile_age_rules()
+_INCOME_TABLE = _compile_income_rules()
+
+
+class PersonaRuleResult(NamedTuple):
+    """Immutable output of the rule tables for one demographic profile"""
+    personality_traits: Tuple[str, ...]
+    shopping_behavior: str
+    decision_factors: Tuple[str, ...]
+    digital_behavior: str
+    recommendations: Tuple[str, ...]
+    pain_points: Tuple[str, ...]
+    goals: Tuple[str, ...]
+    communication_style: str
+    platform_insights: Tuple[Tuple[str, str], ...]
+    social_behavior: Tuple[Tuple[str, Any], ...]
+
+    # The accessors below return fresh containers so callers can mutate them
+    # without touching the memoized result
+    def insights(self) -> Dict[str, Any]:
+        return {
+            "personality_traits": list(self.personality_traits),
+            "shopping_behavior": self.shopping_behavior,
+            "decision_factors": list(self.decision_factors),
+            "digital_behavior": self.digital_behavior,
+        }
+
+    def platform_analysis(self) -> Dict[str, Any]:
+        analysis = {}
+        for platform, canonical in self.platform_insights:
+            analysis[platform] = {
+                key: list(value) if isinstance(value, tuple) else value
+                for key, value in PLATFORM_RULES[canonical]["analysis"].items()
+            }
+        return analysis
+
+    def social_behavior_analysis(self) -> Dict[str, Any]:
+        return {key: list(value) if isinstance(value, tuple) else value for key, value in self.social_behavior}
+
+
+def income_bucket(income_range: Optional[str]) -> Tuple[str, ...]:
+    """Reduce a free-text income range to the income markers it mentions"""
+    if not income_range:
+        return ()
+    return tuple(marker for marker in INCOME_MARKERS if marker in income_range)
+
+
+def profile_key(age_range: Any = None, gender: Optional[str] = None, income_range: Optional[str] = None,
+                location: Optional[str] = None, platforms: Optional[Iterable[str]] = None) -> Tuple:
+    """Normalize demographic fields into the hashable key used by the rule cache"""
+    age_value = getattr(age_range, "value", age_range)
+    return (
+        age_value if age_value in _AGE_TABLE else None,
+        gender,
+        income_bucket(income_range),
+        location,
+        tuple(platforms or ()),
+    )
+
+
+@lru_cache(maxsize=4096)
+def evaluate_profile(key: Tuple) -> PersonaRuleResult:
+    """Evaluate every rule table for a normalized profile key (see profile_key)"""
+    age_value, gender, bucket, location, platforms = key
+    age_rule = _AGE_TABLE[age_value]
+    income_rule = _INCOME_TABLE[bucket]
+    canonical = [PLATFORM_ALIASES.get(p, p) for p in platforms]
+    present = set(canonical)
+
+    personality_traits = age_rule["personality_traits"] + GENDER_TRAITS.get(gender, ()) + income_rule["personality_traits"]
+    decision_factors = age_rule["decision_factors"] + income_rule["decision_factors"]
+
+    digital_behavior = next(text for minimum, text in DIGITAL_BEHAVIOR_RULES if len(platforms) >= minimum)
+
+    recommendations = tuple(
+        PLATFORM_RULES[p]["recommendation"] for p in RECOMMENDATION_PLATFORM_ORDER if p in present
+    ) + age_rule["recommendations"] + income_rule["recommendations"] + LOCATION_RECOMMENDATIONS.get(location, ())
+
+    pain_points = age_rule["pain_points"] + income_rule["pain_points"] + GENERAL_PAIN_POINTS
+    goals = age_rule["goals"] + income_rule["goals"] + GENERAL_GOALS
+
+    platform_insights = {}
+    for platform, canonical_name in zip(platforms, canonical):
+        if "analysis" in PLATFORM_RULES.get(canonical_name, {}):
+            platform_insights.setdefault(platform, canonical_name)
+
+    social_behavior = (
+        ("social_media_usage_pattern", "Multi-platform active user" if len(platforms) >= 3 else "Selective platform user"),
+        ("content_consumption_style", age_rule["content_consumption_style"]),
+        ("interaction_preferences", age_rule["interaction_preferences"]),
+        ("influence_factors", tuple(
+            PLATFORM_RULES[p]["influence_factor"] for p in INFLUENCE_PLATFORM_ORDER if p in present
+        )),
+        ("privacy_concerns", age_rule["privacy_concerns"]),
+    )
+
+    return PersonaRuleResult(
+        personality_traits=personality_traits[:OUTPUT_LIMITS["personality_traits"]],
+        shopping_behavior=age_rule["shopping_behavior"],
+        decision_factors=decision_factors[:OUTPUT_LIMITS["decision_factors"]],
+        digital_behavior=digital_behavior,
+        recommendations=recommendations[:OUTPUT_LIMITS["recommendations"]],
+        pain_points=pain_points[:OUTPUT_LIMITS["pain_points"]],
+        goals=goals[:OUTPUT_LIMITS["goals"]],
+        communication_style=age_rule["communication_style"],
+        platform_insights=tuple(platform_insights.items()),
+        social_behavior=social_behavior,
+    )
+
+
+def evaluate(demographics: Any, platforms: Optional[Sequence[str]] = None) -> PersonaRuleResult:
+    """Evaluate the rule tables for a Demographics model (or any object with the same fields)"""
+    return evaluate_profile(profile_key(
+        getattr(demographics, "age_range", None),
+        getattr(demographics, "gender", None),
+        getattr(demographics, "income_range", None),
+        getattr(demographics, "location", None),
+        platforms,
+    ))
+
+
+def evaluate_batch(profiles: Iterable[Tuple[Any, Optional[Sequence[str]]]]) -> List[PersonaRuleResult]:
+    """Evaluate many (demographics, platforms) pairs, sharing results for identical profiles"""
+    return [evaluate(demographics, platforms) for demographics, platforms in profiles]
@@ -0,0 +1,118 @@
+"""
+Content-addressed snapshots of the persona inputs behind generated personas
+A generated persona used to embed a full copy of its PersonaData, raw
+Resonate/SparkToro/SEMRush/Buzzabout uploads included, so regenerating a
+persona stored those payloads again every time. Generated persona documents
+now keep `persona_id` and `persona_snapshot`, the SHA-256 of the encoded
+PersonaData. The PersonaData itself is stored once in `persona_snapshots`
+under that hash and is never modified. Reads put `persona_data` back, with
+or without the raw upload payloads.
+
+Documents written before snapshots existed still embed `persona_data` and
+are returned as they are.
+
+Deleting a generated persona releases its snapshot, which is removed once no
+generated persona references it.
+"""
+
+import hashlib
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+import orjson
+
+
+# PersonaData fields holding raw upload payloads
+RAW_DATA_FIELDS = ("resonate_data", "sparktoro_data", "semrush_data", "buzzabout_data")
+
+# Set (to True) by hydrate(keep_missing=True) on documents whose snapshot is missing
+MISSING = "snapshot_missing"
+
+# A snapshot stored this recently is kept on release: the generated persona
+# referencing it may be about to be inserted
+RELEASE_GRACE_SECONDS = 60
+
+logger = logging.getLogger(__name__)
+
+
+async def ensure_indexes(db):
+    await db.generated_personas.create_index("persona_id")
+    await db.generated_personas.create_index("persona_snapshot")
+
+
+def snapshot_key(persona_document: Dict[str, Any]) -> str:
+    """SHA-256 of an encoded PersonaData, independent of key order"""
+    canonical = orjson.dumps(persona_document, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+    return hashlib.sha256(canonical).hexdigest()
+
+
+async def store(db, generated_document: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Save the embedded persona_data of an encoded GeneratedPersona as a
+    snapshot (if that exact content is not stored yet) and return the
+    document to insert into generated_personas, which references it.
+    """
+    document = dict(generated_document)
+    persona_document = document.pop("persona_data")
+    key = snapshot_key(persona_document)
+    await db.persona_snapshots.update_one(
+        {"_id": key},
+        {
+            "$setOnInsert": {
+                "persona_id": persona_document.get("id"),
+                "data": persona_document,
+                "created_at": datetime.utcnow(),
+            },
+            "$set": {"stored_at": datetime.utcnow()},
+        },
+        upsert=True,
+    )
+    document["persona_id"] = persona_document.get("id")
+    document["persona_snapshot"] = key
+    return document
+
+
+async def release(db, key: str):
+    """Delete a snapshot no generated persona references any more"""
+    if await db.generated_personas.find_one({"persona_snapshot": key}, {"_id": True}) is not None:
+        return
+    await db.persona_snapshots.delete_one({
+        "_id": key,
+        "stored_at": {"$lt": datetime.utcnow() - timedelta(seconds=RELEASE_GRACE_SECONDS)},
+    })
+
+
+async def hydrate(db, documents: List[Dict[str, Any]], include_raw_data: bool = True,
+                  keep_missing: bool = False) -> List[Dict[str, Any]]:
+    """
+    Put persona_data back into generated_personas documents, fetching every
+    snapshot they reference in one query. Without include_raw_data the raw
+    upload payloads are left out of the snapshots read. Documents whose
+    snapshot is missing are skipped, or with keep_missing returned as they
+    are with MISSING set.
+    """
+    keys = {document["persona_snapshot"] for document in documents if "persona_snapshot" in document}
+    data_by_key = {}
+    if keys:
+        projection = {"data": True}
+        if not include_raw_data:
+            projection = {f"data.{field}": False for field in RAW_DATA_FIELDS}
+        snapshots = await db.persona_snapshots.find({"_id": {"$in": list(keys)}}, projection).to_list(None)
+        data_by_key = {snapshot["_id"]: snapshot.get("data", {}) for snapshot in snapshots}
+
+    hydrated = []
+    for document in documents:
+        key = document.get("persona_snapshot")
+        if key is not None:
+            if key not in data_by_key:
+                logger.warning("Snapshot %s of generated persona %s is missing", key, document.get("id"))
+                if keep_missing:
+                    hydrated.append({**document, MISSING: True})
+                continue
+            document = {**document, "persona_data": data_by_key[key]}
+        elif not include_raw_data and "persona_data" in document:
+            persona_document = document["persona_data"]
+            document = {**document, "persona_data": {k: v for k, v in persona_document.items() if k not in RAW_DATA_FIELDS}}
+        hydrated.append(document)
+    return hydrated
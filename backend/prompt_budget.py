@@ -0,0 +1,366 @@
+"""
+Token-budgeted prompt assembly
+Counts tokens with the model's local tokenizer (tiktoken, with a conservative
+character estimate if the encoding cannot be loaded), splits the available
+prompt budget across data sources in proportion to how much data each one
+has, and greedily packs the highest-signal items of every source first.
+"""
+
+import logging
+import math
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import metrics
+
+
+DEFAULT_MODEL = "gpt-3.5-turbo"
+
+# Context windows of the chat models we call; prompts must leave room for the
+# completion (max_tokens) on top of this
+MODEL_CONTEXT_TOKENS = {
+    "gpt-3.5-turbo": 16385,
+    "gpt-4o": 128000,
+    "gpt-4o-mini": 128000,
+}
+
+# Input budget per request. Kept well below the context window: past a few
+# thousand tokens of research data the extra detail stops improving personas
+# but still adds latency and cost.
+PROMPT_TOKEN_BUDGET = int(os.environ.get("OPENAI_PROMPT_TOKEN_BUDGET", 6000))
+
+# Margin for the chat message framing the tokenizer does not see
+MESSAGE_OVERHEAD_TOKENS = 16
+
+# Fallback estimate when no tokenizer is available; English averages ~4
+# characters per token, 3 keeps the estimate on the safe side
+FALLBACK_CHARS_PER_TOKEN = 3
+
+# After a failed encoding load (tiktoken downloads its BPE file on first use),
+# estimate for this long before trying again
+ENCODING_RETRY_SECONDS = float(os.environ.get("TOKENIZER_RETRY_SECONDS", 60))
+
+_encodings: Dict[str, Any] = {}
+_encoding_failed_at: Dict[str, float] = {}
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding(model: str):
+    """The model's encoding, or None while it cannot be loaded (retried after ENCODING_RETRY_SECONDS)"""
+    encoding = _encodings.get(model)
+    if encoding is not None:
+        return encoding
+    failed_at = _encoding_failed_at.get(model)
+    if failed_at is not None and time.monotonic() - failed_at < ENCODING_RETRY_SECONDS:
+        return None
+    with _encoding_lock:
+        if model in _encodings:
+            return _encodings[model]
+        try:
+            import tiktoken
+            try:
+                encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            _encoding_failed_at[model] = time.monotonic()
+            logging.warning(f"Tokenizer unavailable for {model}, estimating token counts for "
+                            f"{ENCODING_RETRY_SECONDS:.0f}s: {str(e)}")
+            return None
+        _encodings[model] = encoding
+        _encoding_failed_at.pop(model, None)
+        return encoding
+
+
+def warm_up(model: str = DEFAULT_MODEL) -> float:
+    """
+    Load the model's encoding ahead of the first prompt (the first load may
+    download it). Blocking; run it in a worker thread. Returns the seconds spent.
+    """
+    started = time.perf_counter()
+    _get_encoding(model)
+    return time.perf_counter() - started
+
+
+# Only short strings (headings, data items, system prompts) repeat often
+# enough to cache; assembled prompts are counted once and would make the
+# cache hold megabytes of text. Bounds the cache at ~4 MB of keys.
+CACHED_TEXT_MAX_CHARS = 512
+
+
+@lru_cache(maxsize=8192)
+def _count_encoded(text: str, model: str) -> int:
+    return len(_encodings[model].encode(text))
+
+
+def count_tokens(text: str, model: str = DEFAULT_MODEL) -> int:
+    """Number of tokens `text` takes for `model`"""
+    if not text:
+        return 0
+    # Estimates are not cached, so counts become exact once the encoding loads
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return math.ceil(len(text) / FALLBACK_CHARS_PER_TOKEN)
+    if len(text) > CACHED_TEXT_MAX_CHARS:
+        return len(encoding.encode(text))
+    return _count_encoded(text, model)
+
+
+def prompt_budget_for(model: str = DEFAULT_MODEL, max_completion_tokens: int = 1500, system_prompt: str = "") -> int:
+    """Tokens available for the user prompt once the completion and system message are reserved"""
+    context = MODEL_CONTEXT_TOKENS.get(model, MODEL_CONTEXT_TOKENS[DEFAULT_MODEL])
+    available = context - max_completion_tokens - count_tokens(system_prompt, model) - MESSAGE_OVERHEAD_TOKENS
+    return max(0, min(PROMPT_TOKEN_BUDGET, available))
+
+
+@dataclass
+class PromptItem:
+    """One packable piece of data, rendered under its group heading (e.g. a SparkToro column)"""
+    group: str
+    text: str
+    score: float = 1.0
+
+
+@dataclass
+class PromptSection:
+    name: str
+    header: str
+    items: List[PromptItem] = field(default_factory=list)
+    weight: float = 1.0
+
+
+@dataclass
+class PromptBuildResult:
+    prompt: str
+    token_count: int
+    budget: int
+    sections: Dict[str, Dict[str, Any]]
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "prompt_tokens": self.token_count,
+            "budget": self.budget,
+            "sections": self.sections
+        }
+
+
+class PromptBuilder:
+    """
+    Assemble a prompt from fixed text plus data sections within a token budget.
+
+    Fixed text (instructions, output format) is always included. The remaining
+    budget is shared between sections in proportion to their richness (the
+    tokens their full data would take, times the section weight), with a small
+    floor per section; budget a section cannot use is handed on to sections
+    that still have data left.
+    """
+
+    def __init__(self, budget: int, model: str = DEFAULT_MODEL, item_separator: str = ", "):
+        self.budget = budget
+        self.model = model
+        self.item_separator = item_separator
+        self._parts: List[Tuple[str, Any]] = []
+
+    def add_text(self, text: str) -> "PromptBuilder":
+        self._parts.append(("text", text))
+        return self
+
+    def add_section(self, name: str, header: str, items: Iterable[PromptItem], weight: float = 1.0) -> "PromptBuilder":
+        self._parts.append(("section", PromptSection(name, header, list(items), weight)))
+        return self
+
+    def _tokens(self, text: str) -> int:
+        return count_tokens(text, self.model)
+
+    def _item_cost(self, item: PromptItem, open_groups: set) -> int:
+        cost = self._tokens(item.text + self.item_separator)
+        if item.group not in open_groups:
+            cost += self._tokens(self._group_line(item.group))
+        return cost
+
+    def _full_cost(self, items: List[PromptItem], open_groups: set) -> int:
+        """Tokens needed to include every item, including group headings not yet rendered"""
+        groups = set(item.group for item in items) - open_groups
+        return (sum(self._tokens(item.text + self.item_separator) for item in items) +
+                sum(self._tokens(self._group_line(group)) for group in groups))
+
+    def _group_line(self, group: str) -> str:
+        return f"\n  - {group}: " if group else "\n  - "
+
+    def _pack(self, sections: List[PromptSection], available: int) -> Dict[str, List[PromptItem]]:
+        chosen = {section.name: [] for section in sections}
+        open_groups = {section.name: set() for section in sections}
+        queues = {
+            section.name: sorted(section.items, key=lambda item: item.score, reverse=True)
+            for section in sections
+        }
+        header_cost = {section.name: self._tokens(section.header) for section in sections}
+
+        active = [s for s in sections if queues[s.name]]
+        # Every source is guaranteed a small floor so sparse sources are not
+        # crowded out entirely by one very rich one
+        floor = available // (4 * len(active)) if active else 0
+        remaining = available
+        while active and remaining > 0:
+            richness = {s.name: self._full_cost(queues[s.name], open_groups[s.name]) for s in active}
+            weighted = {s.name: s.weight * richness[s.name] for s in active}
+            total_weighted = sum(weighted.values()) or 1
+            round_left = remaining
+            still_active = []
+
+            # Sparse sections first, so their floors are met before the rich
+            # sections take their proportional share
+            for section in sorted(active, key=lambda s: richness[s.name]):
+                share = int(remaining * weighted[section.name] / total_weighted)
+                needed = richness[section.name] + (0 if chosen[section.name] else header_cost[section.name])
+                share = min(round_left, max(share, min(floor, needed)))
+                spent = 0
+                if not chosen[section.name]:
+                    # A section is only worth its header if at least one item fits
+                    if header_cost[section.name] >= share:
+                        still_active.append(section)
+                        continue
+                    spent += header_cost[section.name]
+
+                skipped = []
+                for item in queues[section.name]:
+                    cost = self._item_cost(item, open_groups[section.name])
+                    if spent + cost > share:
+                        skipped.append(item)
+                        continue
+                    spent += cost
+                    chosen[section.name].append(item)
+                    open_groups[section.name].add(item.group)
+
+                round_left -= spent
+                queues[section.name] = skipped
+                if skipped and spent:
+                    still_active.append(section)
+
+            if round_left == remaining:
+                break
+            remaining = round_left
+            active = still_active
+
+        return chosen
+
+    def _render_section(self, section: PromptSection, chosen: List[PromptItem]) -> str:
+        if not chosen:
+            return ""
+        # Keep the original item order so the data reads naturally
+        picked = set(id(item) for item in chosen)
+        groups: Dict[str, List[str]] = {}
+        for item in section.items:
+            if id(item) in picked:
+                groups.setdefault(item.group, []).append(item.text)
+        body = "".join(
+            self._group_line(group) + self.item_separator.join(texts) for group, texts in groups.items()
+        )
+        return f"{section.header}{body}\n"
+
+    def build(self) -> PromptBuildResult:
+        with metrics.stage_timer(metrics.PROMPT_BUILD):
+            return self._build()
+
+    def _build(self) -> PromptBuildResult:
+        fixed_tokens = sum(self._tokens(part) for kind, part in self._parts if kind == "text")
+        sections = [part for kind, part in self._parts if kind == "section"]
+        available = max(0, self.budget - fixed_tokens)
+        chosen = self._pack(sections, available)
+
+        rendered = []
+        report = {}
+        for kind, part in self._parts:
+            if kind == "text":
+                rendered.append(part)
+                continue
+            text = self._render_section(part, chosen[part.name])
+            rendered.append(text)
+            report[part.name] = {
+                "items_available": len(part.items),
+                "items_included": len(chosen[part.name]),
+                "tokens": self._tokens(text)
+            }
+
+        prompt = "".join(rendered)
+        token_count = self._tokens(prompt)
+
+        # Token counts are not strictly additive across joins; trim the
+        # lowest-signal items if the rendered prompt came out over budget
+        while token_count > self.budget and any(chosen.values()):
+            name = max(chosen, key=lambda n: len(chosen[n]))
+            chosen[name].sort(key=lambda item: item.score, reverse=True)
+            chosen[name].pop()
+            rendered = [
+                part if kind == "text" else self._render_section(part, chosen[part.name])
+                for kind, part in self._parts
+            ]
+            prompt = "".join(rendered)
+            token_count = self._tokens(prompt)
+            report[name]["items_included"] = len(chosen[name])
+
+        return PromptBuildResult(prompt=prompt, token_count=token_count, budget=self.budget, sections=report)
+
+
+def ranked_items(group: str, values: Any, limit: Optional[int] = None) -> List[PromptItem]:
+    """
+    PromptItems for one column of data. Dicts of value -> count (pandas
+    value_counts) are scored by their share of the column's top count; lists
+    are scored by position, so the first entries are packed first.
+    """
+    items = []
+    if isinstance(values, dict):
+        numeric = [v for v in values.values() if isinstance(v, (int, float)) and not isinstance(v, bool)]
+        top = max(numeric) if numeric else 0
+        for rank, (value, count) in enumerate(values.items()):
+            if isinstance(count, (int, float)) and not isinstance(count, bool) and top > 0:
+                score = 1.0 + count / top
+            else:
+                score = 1.0 / (rank + 1)
+            items.append(PromptItem(group, str(value), score))
+    elif isinstance(values, (list, tuple)):
+        for rank, value in enumerate(values):
+            if isinstance(value, (list, tuple)) and value:
+                # (item, count) pairs
+                value = value[0]
+            items.append(PromptItem(group, str(value), 1.0 / (rank + 1)))
+    elif values not in (None, ""):
+        items.append(PromptItem(group, str(values), 1.0))
+    return items[:limit] if limit else items
+
+
+def flatten_items(data: Any, group: str = "", depth: int = 0) -> List[PromptItem]:
+    """
+    PromptItems for arbitrarily nested parsed data (Resonate insights): dicts
+    with 'top_values' become ranked items, lists of {'source', 'data'} entries
+    are unwrapped, and plain scalars become single items.
+    """
+    if depth > 6 or data in (None, "", {}, []):
+        return []
+    if isinstance(data, dict):
+        if "top_values" in data and isinstance(data["top_values"], dict):
+            return ranked_items(group, data["top_values"])
+        if "insight" in data and "value" in data:
+            composition = data.get("composition")
+            text = f"{data['insight']} = {data['value']}"
+            if composition not in (None, "", 0):
+                text += f" ({composition}%)"
+            score = float(composition) if isinstance(composition, (int, float)) else 1.0
+            return [PromptItem(group, text, 1.0 + score / 100)]
+        items = []
+        for key, value in data.items():
+            if key in ("source", "source_column"):
+                continue
+            child_group = f"{group} {key}".strip() if key != "data" else group
+            items.extend(flatten_items(value, child_group, depth + 1))
+        return items
+    if isinstance(data, (list, tuple)):
+        items = []
+        for entry in data:
+            items.extend(flatten_items(entry, group, depth + 1))
+        return items
+    return [PromptItem(group, str(data), 1.0)]
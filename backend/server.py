@@ -12,14 +12,17 @@ from datetime import datetime
 ROOT_DIR = Path(__file__).parent
 sys.path.insert(0, str(ROOT_DIR))
 
-from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Form
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Form, Header
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse, Response
+from fastapi.encoders import jsonable_encoder
+from starlette.background import BackgroundTask
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import ConnectionFailure
 import logging
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Literal, Optional, Dict, Any
 import uuid
 from datetime import datetime
 from enum import Enum
@@ -27,23 +30,75 @@ import requests
 import random
 import tempfile
 import aiofiles
+import asyncio
+import hashlib
+import json
+import time
 from external_integrations.unsplash import get_professional_headshot
 from external_integrations.data_sources import DataSourceOrchestrator
 from external_integrations.openai_images import generate_persona_image_openai
-from external_integrations.file_parsers import parse_resonate_zip
+from external_integrations.file_parsers import parse_resonate_zip, ZIP_MAX_TOTAL_BYTES
+from external_integrations import file_parsers
+import persona_rules
+import normalization
+import prompt_budget
+import json_stream
+import openai_scheduler
+import metrics
+import llm_accounting
+import tracing
+import bulk_export
+import database
+import idempotency
+import document_cache
+import mongo_codec
+import pdf_export
+import slides_export
+import persona_snapshots
+import logging_config
 
 load_dotenv(ROOT_DIR / '.env')
 
+# Queue-based logging, configured by LOG_LEVEL / LOG_FORMAT / LOG_LEVELS (see logging_config.py)
+logging_config.configure_logging()
+
 # Initialize data source orchestrator
 data_sources = DataSourceOrchestrator()
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Import the parsing libraries in the background after startup (0 to skip)
+WARM_UP_IMPORTS = os.environ.get("WARM_UP_IMPORTS", "1") != "0"
+
+# MongoDB connection, pool and timeouts configured by MONGO_* (see database.py)
+db = database.connect(os.environ['MONGO_URL'], os.environ['DB_NAME'])
+list_db = database.list_db
+llm_accounting.set_database(db)
 
 # Create the main app without a prefix
-app = FastAPI(title="BCM VentasAI Persona Generator", version="1.0.0")
+# orjson renders the (jsonable_encoder'd) content of every route that returns plain data
+app = FastAPI(title="BCM VentasAI Persona Generator", version="1.0.0", default_response_class=ORJSONResponse)
+app.add_middleware(metrics.PrometheusMiddleware)
+app.add_middleware(openai_scheduler.PriorityMiddleware)
+# Outermost of the two, so the request ID is set for everything below it
+app.add_middleware(tracing.RequestContextMiddleware)
+
+@app.exception_handler(idempotency.IdempotencyKeyInProgress)
+async def idempotency_in_progress_handler(request, exc: idempotency.IdempotencyKeyInProgress):
+    return JSONResponse(
+        status_code=409,
+        content={"detail": "A request with this Idempotency-Key is still in progress; retry shortly"},
+        headers={"Retry-After": "5"},
+    )
+
+@app.exception_handler(idempotency.IdempotencyKeyReused)
+async def idempotency_reused_handler(request, exc: idempotency.IdempotencyKeyReused):
+    return JSONResponse(status_code=422, content={"detail": "Idempotency-Key was already used for a different request"})
+
+@app.exception_handler(ConnectionFailure)
+async def mongo_unavailable_handler(request, exc: ConnectionFailure):
+    # No pooled connection or server within the MONGO_* timeouts: shed the
+    # request rather than report an internal error
+    logging.warning(f"Mongo unavailable for {request.url.path}: {str(exc)}")
+    return JSONResponse(status_code=503, content={"detail": "Database temporarily unavailable"}, headers={"Retry-After": "1"})
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -147,10 +202,56 @@ class UpdatePersonaRequest(BaseModel):
     media_consumption: Optional[MediaConsumption] = None
     current_step: Optional[int] = None
     completed_steps: Optional[List[int]] = None
+    # Optimistic concurrency: the updated_at the client last read. When set,
+    # the update only applies if the persona has not been saved since
+    expected_updated_at: Optional[datetime] = None
+
+class BulkExportRequest(BaseModel):
+    generated_persona_ids: List[str] = Field(..., min_length=1, max_length=500)
+    formats: List[Literal["json", "csv", "pdf"]] = ["json", "csv", "pdf"]
+    include_raw_data: bool = False
 
 class GeneratePersonaRequest(BaseModel):
     persona_id: str
 
+# Mongo persistence: documents omit default-valued fields and are read back
+# through compiled TypeAdapters (see mongo_codec.py)
+persona_codec = mongo_codec.ModelCodec(PersonaData)
+generated_persona_codec = mongo_codec.ModelCodec(GeneratedPersona)
+
+def model_json_response(model: BaseModel) -> Response:
+    """
+    JSON response for an already-validated model. Returning it directly
+    skips FastAPI's response_model re-validation and jsonable_encoder; the
+    route's response_model still documents the schema.
+    """
+    return Response(content=model.model_dump_json(), media_type="application/json")
+
+def model_list_json_response(codec: mongo_codec.ModelCodec, docs: List[dict]) -> Response:
+    """Validate Mongo documents once and serialize the list straight to JSON bytes"""
+    return Response(content=codec.list_adapter.dump_json(codec.decode_many(docs)), media_type="application/json")
+
+async def find_persona_document(persona_id: str, fresh: bool = False) -> Optional[dict]:
+    """
+    Persona document by id, through the per-worker document cache. `fresh`
+    reads from Mongo instead, for reads that feed a conditional write or a
+    generation and so must not see another worker's write late.
+    """
+    async def load():
+        return await db.personas.find_one({"id": persona_id})
+    if fresh:
+        return await document_cache.personas.load_fresh(persona_id, load)
+    return await document_cache.personas.get_or_load(persona_id, load)
+
+async def find_generated_persona_document(generated_persona_id: str) -> Optional[dict]:
+    """Generated persona document by id with its persona_data hydrated, through the document cache"""
+    async def load():
+        document = await db.generated_personas.find_one({"id": generated_persona_id})
+        if document is None:
+            return None
+        return next(iter(await persona_snapshots.hydrate(db, [document])), None)
+    return await document_cache.generated_personas.get_or_load(generated_persona_id, load)
+
 
 # Helper functions for AI-enhanced persona generation based on uploaded data
 def assemble_real_uploaded_data(data_sources: dict, persona_data: PersonaData) -> dict:
@@ -185,9 +286,9 @@ def assemble_real_uploaded_data(data_sources: dict, persona_data: PersonaData) -
                     category_summary = {}
                     for column, values in category_data['top_values'].items():
                         if isinstance(values, dict):
-                            # Get top 5 items from each column
-                            top_items = list(values.items())[:5]
-                            category_summary[column] = top_items
+                            # Keep every value; the prompt builder packs the
+                            # highest-count items within its token budget
+                            category_summary[column] = values
                     
                     if category_summary:
                         assembled["sparktoro_data"]["categories"][category_name] = category_summary
@@ -205,8 +306,7 @@ def assemble_real_uploaded_data(data_sources: dict, persona_data: PersonaData) -
                 if 'keywords' in sheet_data:
                     sheet_keywords = {}
                     for column, keywords in sheet_data['keywords'].items():
-                        # Get top 10 keywords from each column
-                        sheet_keywords[column] = keywords[:10]
+                        sheet_keywords[column] = keywords
                     
                     if sheet_keywords:
                         assembled["semrush_data"]["keywords_by_sheet"][sheet_name] = sheet_keywords
@@ -223,10 +323,10 @@ def assemble_real_uploaded_data(data_sources: dict, persona_data: PersonaData) -
         if 'social_sentiment' in buzzabout_data:
             sentiment_data = buzzabout_data['social_sentiment']
             assembled["buzzabout_data"] = {
-                "trending_topics": sentiment_data.get('trending_topics', [])[:10],
+                "trending_topics": sentiment_data.get('trending_topics', []),
                 "sentiment_analysis": sentiment_data.get('sentiment_analysis', {}),
-                "social_mentions": sentiment_data.get('social_mentions', [])[:10],
-                "hashtags": sentiment_data.get('hashtags', [])[:10],
+                "social_mentions": sentiment_data.get('social_mentions', []),
+                "hashtags": sentiment_data.get('hashtags', []),
                 "source_url": buzzabout_data.get('source_url', '')
             }
     
@@ -242,66 +342,16 @@ def assemble_real_uploaded_data(data_sources: dict, persona_data: PersonaData) -
     
     return assembled
 
-def create_advanced_persona_prompt(assembled_data: dict, persona_data: PersonaData) -> str:
-    """Create optimized OpenAI prompt using real assembled data with token limits"""
-    
-    prompt = f"""
-Create a comprehensive customer persona based on REAL DATA from multiple research sources:
-
-DEMOGRAPHICS:
-- Age: {assembled_data['demographics']['age_range']}
-- Gender: {assembled_data['demographics']['gender']}
-- Income: {assembled_data['demographics']['income']}
-- Location: {assembled_data['demographics']['location']}
-- Occupation: {assembled_data['demographics']['occupation']}
-- Social Platforms: {', '.join(assembled_data['social_platforms'][:5]) if assembled_data['social_platforms'] else 'Not specified'}
-
-"""
-
-    # Add SparkToro data (limited to top insights)
-    if assembled_data['sparktoro_data']:
-        prompt += f"""
-SPARKTORO DATA ({assembled_data['sparktoro_data']['total_categories']} categories):
-"""
-        for category_name, category_data in list(assembled_data['sparktoro_data']['categories'].items())[:2]:  # Top 2 categories
-            prompt += f"\n{category_name}:\n"
-            for column, top_items in list(category_data.items())[:2]:  # Top 2 columns per category
-                items_str = ', '.join([f"{item}" for item, score in top_items[:3]])  # Top 3 items
-                prompt += f"  - {column}: {items_str}\n"
-
-    # Add SEMRush data (limited to top keywords)
-    if assembled_data['semrush_data']:
-        prompt += f"""
-SEMRUSH KEYWORDS ({assembled_data['semrush_data']['total_sheets']} datasets):
-"""
-        for sheet_name, keywords_data in list(assembled_data['semrush_data']['keywords_by_sheet'].items())[:2]:  # Top 2 sheets
-            prompt += f"\n{sheet_name}:\n"
-            for column, keywords in list(keywords_data.items())[:2]:  # Top 2 columns per sheet
-                keywords_str = ', '.join([str(k) for k in keywords[:5]])  # Top 5 keywords
-                prompt += f"  - {column}: {keywords_str}\n"
+PERSONA_SYSTEM_PROMPT = "You are an expert marketing analyst who creates detailed customer personas based on real market research data."
+PERSONA_MAX_COMPLETION_TOKENS = 1500
 
-    # Add Buzzabout data (limited to top insights)
-    if assembled_data['buzzabout_data']:
-        prompt += f"""
-BUZZABOUT SOCIAL DATA:
-- Topics: {', '.join([str(t) for t in assembled_data['buzzabout_data']['trending_topics'][:10]])}
-- Sentiment: {assembled_data['buzzabout_data']['sentiment_analysis']}
-- Mentions: {', '.join([str(m) for m in assembled_data['buzzabout_data']['social_mentions'][:5]])}
-- Hashtags: {', '.join([str(h) for h in assembled_data['buzzabout_data']['hashtags'][:5]])}
-
-"""
+# Per-column extraction caps for direct generation; the prompt builder decides
+# how much of this actually reaches the model
+DIRECT_EXTRACT_TOP_VALUES = 25
+DIRECT_EXTRACT_KEYWORDS = 200
+DIRECT_EXTRACT_TOPICS = 50
 
-    # Add Resonate data (limited to key insights)
-    if assembled_data['resonate_data']:
-        prompt += f"""
-RESONATE DATA:
-- Demographics: {str(assembled_data['resonate_data']['demographics'])[:200]}...
-- Media: {str(assembled_data['resonate_data']['media_consumption'])[:200]}...
-- Brands: {str(assembled_data['resonate_data']['brand_affinity'])[:200]}...
-
-"""
-
-    prompt += """
+PERSONA_JSON_INSTRUCTIONS = """
 Based on this REAL data, provide comprehensive persona analysis in JSON format:
 
 {
@@ -325,63 +375,163 @@ IMPORTANT:
 Return ONLY the JSON object, no additional text.
 """
 
-    return prompt
+def persona_prompt_builder() -> prompt_budget.PromptBuilder:
+    """PromptBuilder sized for the persona insights chat call"""
+    return prompt_budget.PromptBuilder(
+        prompt_budget.prompt_budget_for(max_completion_tokens=PERSONA_MAX_COMPLETION_TOKENS, system_prompt=PERSONA_SYSTEM_PROMPT)
+    )
+
+def build_advanced_persona_prompt(assembled_data: dict, persona_data: PersonaData) -> prompt_budget.PromptBuildResult:
+    """Build the OpenAI prompt from real assembled data, packed to the prompt token budget"""
+    demographics = assembled_data['demographics']
+    builder = persona_prompt_builder()
+    builder.add_text(f"""
+Create a comprehensive customer persona based on REAL DATA from multiple research sources:
+
+DEMOGRAPHICS:
+- Age: {demographics['age_range']}
+- Gender: {demographics['gender']}
+- Income: {demographics['income']}
+- Location: {demographics['location']}
+- Occupation: {demographics['occupation']}
+- Social Platforms: {', '.join(assembled_data['social_platforms']) if assembled_data['social_platforms'] else 'Not specified'}
+
+""")
+
+    if assembled_data['sparktoro_data']:
+        items = []
+        for category_name, category_data in assembled_data['sparktoro_data']['categories'].items():
+            for column, values in category_data.items():
+                items.extend(prompt_budget.ranked_items(f"{category_name} / {column}", values))
+        builder.add_section(
+            "sparktoro",
+            f"\nSPARKTORO DATA ({assembled_data['sparktoro_data']['total_categories']} categories):",
+            items
+        )
+
+    if assembled_data['semrush_data']:
+        items = []
+        for sheet_name, keywords_data in assembled_data['semrush_data']['keywords_by_sheet'].items():
+            for column, keywords in keywords_data.items():
+                items.extend(prompt_budget.ranked_items(f"{sheet_name} / {column}", keywords))
+        builder.add_section(
+            "semrush",
+            f"\nSEMRUSH KEYWORDS ({assembled_data['semrush_data']['total_sheets']} datasets):",
+            items
+        )
+
+    if assembled_data['buzzabout_data']:
+        buzzabout = assembled_data['buzzabout_data']
+        items = (
+            prompt_budget.ranked_items("Topics", buzzabout.get('trending_topics', [])) +
+            prompt_budget.ranked_items("Sentiment", [str(buzzabout['sentiment_analysis'])] if buzzabout.get('sentiment_analysis') else []) +
+            prompt_budget.ranked_items("Mentions", buzzabout.get('social_mentions', [])) +
+            prompt_budget.ranked_items("Hashtags", buzzabout.get('hashtags', []))
+        )
+        builder.add_section("buzzabout", "\nBUZZABOUT SOCIAL DATA:", items)
+
+    if assembled_data['resonate_data']:
+        resonate = assembled_data['resonate_data']
+        items = (
+            prompt_budget.flatten_items(resonate.get('demographics', {}), "Demographics") +
+            prompt_budget.flatten_items(resonate.get('media_consumption', {}), "Media") +
+            prompt_budget.flatten_items(resonate.get('brand_affinity', {}), "Brands")
+        )
+        builder.add_section("resonate", "\nRESONATE DATA:", items)
+
+    builder.add_text(PERSONA_JSON_INSTRUCTIONS)
+    return builder.build()
+
+def create_advanced_persona_prompt(assembled_data: dict, persona_data: PersonaData) -> str:
+    """Create optimized OpenAI prompt using real assembled data with token limits"""
+    return build_advanced_persona_prompt(assembled_data, persona_data).prompt
+
+def _openai_chat_request(prompt: str) -> dict:
+    return {
+        "model": "gpt-3.5-turbo",
+        "messages": [
+            {"role": "system", "content": PERSONA_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        "max_tokens": PERSONA_MAX_COMPLETION_TOKENS,
+        "temperature": 0.7
+    }
+
+def _estimate_chat_tokens(prompt: str, system_prompt: str = PERSONA_SYSTEM_PROMPT, max_tokens: int = PERSONA_MAX_COMPLETION_TOKENS) -> int:
+    """Upper bound on a chat call's token use, for the scheduler's tokens/min budget"""
+    return prompt_budget.count_tokens(system_prompt) + prompt_budget.count_tokens(prompt) + max_tokens
+
+def _parse_persona_insights(response_text: str) -> tuple:
+    """Parse the OpenAI persona JSON into (ai_insights, recommendations, pain_points, goals)"""
+    response_text = response_text.strip()
+    try:
+        persona_data = json.loads(response_text)
+        
+        ai_insights = persona_data.get('ai_insights', {})
+        recommendations = persona_data.get('recommendations', [])
+        pain_points = persona_data.get('pain_points', [])
+        goals = persona_data.get('goals', [])
+        
+        logging.info("Successfully parsed OpenAI persona insights")
+        return ai_insights, recommendations, pain_points, goals
+        
+    except json.JSONDecodeError as e:
+        logging.error(f"Failed to parse OpenAI response as JSON: {str(e)}")
+        logging.error(f"Response text: {response_text}")
+        return _get_fallback_insights()
 
 async def generate_openai_persona_insights(prompt: str) -> tuple:
     """Generate persona insights using OpenAI with real data prompt"""
     try:
-        import openai
-        from openai import OpenAI
-        import json
-        import os
-        
-        # Initialize OpenAI client
-        api_key = os.getenv('OPENAI_API_KEY')
-        if not api_key:
+        if openai_scheduler.get_client() is None:
             logging.error("OpenAI API key not found")
             return _get_fallback_insights()
         
-        client = OpenAI(api_key=api_key)
-        
         logging.info("Sending persona generation request to OpenAI")
         
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are an expert marketing analyst who creates detailed customer personas based on real market research data."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=1500,
-            temperature=0.7
-        )
+        response = await openai_scheduler.chat_completion(_estimate_chat_tokens(prompt), **_openai_chat_request(prompt))
         
         # Parse the OpenAI response
         response_text = response.choices[0].message.content.strip()
         logging.info(f"OpenAI response received: {len(response_text)} characters")
         
-        # Try to parse as JSON
-        try:
-            persona_data = json.loads(response_text)
-            
-            ai_insights = persona_data.get('ai_insights', {})
-            recommendations = persona_data.get('recommendations', [])
-            pain_points = persona_data.get('pain_points', [])
-            goals = persona_data.get('goals', [])
-            
-            logging.info("Successfully parsed OpenAI persona insights")
-            return ai_insights, recommendations, pain_points, goals
-            
-        except json.JSONDecodeError as e:
-            logging.error(f"Failed to parse OpenAI response as JSON: {str(e)}")
-            logging.error(f"Response text: {response_text}")
-            return _get_fallback_insights()
+        return _parse_persona_insights(response_text)
     
     except Exception as e:
         logging.error(f"OpenAI persona generation failed: {str(e)}")
         return _get_fallback_insights()
 
+async def stream_openai_persona_insights(prompt: str):
+    """Yield the persona completion from OpenAI as it is generated, one text delta at a time"""
+    logging.info("Streaming persona generation request to OpenAI")
+    
+    request = _openai_chat_request(prompt)
+    stats = {}
+    started = time.monotonic()
+    usage = None
+    # include_usage adds a final chunk with the token counts for accounting.
+    # The stream holds its scheduler slot until it is closed below.
+    stream = await openai_scheduler.chat_completion(
+        _estimate_chat_tokens(prompt), stats=stats, stream=True, stream_options={"include_usage": True}, **request
+    )
+    stream_span = tracing.start_span("openai_chat.stream", model=request["model"])
+    try:
+        async for chunk in stream:
+            if chunk.usage:
+                usage = chunk.usage
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    finally:
+        await stream.close()
+        llm_accounting.record_chat({**request, "stream": True}, usage, time.monotonic() - started, stats)
+        if usage is not None:
+            stream_span.set_attribute("llm.prompt_tokens", usage.prompt_tokens)
+            stream_span.set_attribute("llm.completion_tokens", usage.completion_tokens)
+        stream_span.end()
+
 def _get_fallback_insights() -> tuple:
     """Fallback insights if OpenAI fails"""
+    metrics.record_fallback("insights")
     ai_insights = {
         "personality_traits": ["Data-driven", "Research-oriented", "Platform-savvy", "Goal-focused"],
         "shopping_behavior": "Methodical research approach with platform-specific preferences",
@@ -752,388 +902,79 @@ def generate_enhanced_goals_from_data(persona_data: PersonaData, data_sources: d
     return goals
 
 
+def _rule_profile(persona_data: PersonaData) -> persona_rules.PersonaRuleResult:
+    """Look up the compiled rule-table result for a persona's demographics and platforms"""
+    platforms = persona_data.media_consumption.social_media_platforms if persona_data.media_consumption else []
+    return persona_rules.evaluate(persona_data.demographics, platforms)
+
 def generate_intelligent_insights(persona_data: PersonaData) -> Dict[str, Any]:
     """Generate AI insights based on actual persona data"""
-    demographics = persona_data.demographics
-    media = persona_data.media_consumption
-    attributes = persona_data.attributes
-    
-    # Base personality traits on demographics and uploaded data
-    personality_traits = []
-    
-    # Age-based traits
-    if demographics.age_range == AgeRange.gen_z:
-        personality_traits.extend(["Digital native", "Socially conscious", "Entrepreneurial"])
-    elif demographics.age_range == AgeRange.millennial:
-        personality_traits.extend(["Tech-savvy", "Value-conscious", "Experience-focused"])
-    elif demographics.age_range == AgeRange.gen_x:
-        personality_traits.extend(["Pragmatic", "Independent", "Quality-focused"])
-    elif demographics.age_range == AgeRange.boomer:
-        personality_traits.extend(["Traditional", "Brand loyal", "Quality-oriented"])
-    
-    # Gender-based adjustments
-    if demographics.gender == "Female":
-        personality_traits.append("Community-oriented")
-    elif demographics.gender == "Male":
-        personality_traits.append("Goal-oriented")
-    
-    # Income-based traits
-    if demographics.income_range and "$75,000" in demographics.income_range:
-        personality_traits.extend(["Premium-conscious", "Investment-minded"])
-    elif demographics.income_range and "$50,000" in demographics.income_range:
-        personality_traits.extend(["Value-conscious", "Budget-aware"])
-    
-    # Social media behavior based on platforms
-    platforms = media.social_media_platforms or []
-    digital_behavior = "Limited digital presence"
-    if len(platforms) >= 4:
-        digital_behavior = "Heavy social media user, multi-platform engagement"
-    elif len(platforms) >= 2:
-        digital_behavior = "Active on social media, selective platform usage"
-    elif len(platforms) >= 1:
-        digital_behavior = "Moderate social media usage, focused platform preference"
-    
-    # Shopping behavior based on age and income
-    shopping_behavior = "Standard purchase behavior"
-    if demographics.age_range in [AgeRange.millennial, AgeRange.gen_z]:
-        shopping_behavior = "Research-heavy, reviews-driven, mobile-first shopping"
-    elif demographics.age_range == AgeRange.gen_x:
-        shopping_behavior = "Methodical researcher, brand comparison focused"
-    elif demographics.age_range == AgeRange.boomer:
-        shopping_behavior = "Brand loyal, prefers established retailers"
-    
-    return {
-        "personality_traits": personality_traits[:4],  # Limit to top 4
-        "shopping_behavior": shopping_behavior,
-        "decision_factors": _get_decision_factors(demographics, attributes),
-        "digital_behavior": digital_behavior
-    }
+    return _rule_profile(persona_data).insights()
 
 def generate_data_driven_recommendations(persona_data: PersonaData) -> List[str]:
     """Generate marketing recommendations based on persona data"""
-    recommendations = []
-    demographics = persona_data.demographics
-    media = persona_data.media_consumption
-    
-    # Platform-specific recommendations
-    platforms = media.social_media_platforms or []
-    if "Instagram" in platforms:
-        recommendations.append("Use Instagram visual storytelling and influencer partnerships")
-    if "LinkedIn" in platforms:
-        recommendations.append("Leverage LinkedIn for professional and B2B messaging")
-    if "Facebook" in platforms:
-        recommendations.append("Utilize Facebook targeted advertising and community groups")
-    if "TikTok" in platforms:
-        recommendations.append("Create engaging short-form video content for TikTok")
-    if "Twitter" in platforms or "Twitter/X" in platforms:
-        recommendations.append("Engage in real-time conversations and trending topics on X/Twitter")
-    
-    # Age-based recommendations
-    if demographics.age_range == AgeRange.gen_z:
-        recommendations.append("Focus on authentic, purpose-driven brand messaging")
-        recommendations.append("Prioritize mobile-first, video-centric content")
-    elif demographics.age_range == AgeRange.millennial:
-        recommendations.append("Highlight convenience and time-saving benefits")
-        recommendations.append("Emphasize value for money and experiences over products")
-    elif demographics.age_range == AgeRange.gen_x:
-        recommendations.append("Provide detailed product information and comparisons")
-        recommendations.append("Use trusted review sources and testimonials")
-    elif demographics.age_range == AgeRange.boomer:
-        recommendations.append("Focus on reliability and customer service quality")
-        recommendations.append("Use traditional media channels alongside digital")
-    
-    # Income-based recommendations
-    if demographics.income_range and ("$75,000" in demographics.income_range or "$100,000" in demographics.income_range):
-        recommendations.append("Position premium features and exclusive offerings")
-    else:
-        recommendations.append("Emphasize value propositions and cost-effectiveness")
-    
-    # Location-based recommendations
-    if demographics.location == "Urban":
-        recommendations.append("Highlight convenience and fast delivery options")
-    elif demographics.location == "Suburban":
-        recommendations.append("Focus on family-oriented messaging and bulk options")
-    elif demographics.location == "Rural":
-        recommendations.append("Emphasize online accessibility and shipping benefits")
-    
-    return recommendations[:6]  # Limit to top 6 recommendations
+    return list(_rule_profile(persona_data).recommendations)
 
 def generate_contextual_pain_points(persona_data: PersonaData) -> List[str]:
     """Generate pain points based on persona context"""
-    pain_points = []
-    demographics = persona_data.demographics
-    
-    # Age-based pain points
-    if demographics.age_range == AgeRange.gen_z:
-        pain_points.extend([
-            "Limited disposable income for premium products",
-            "Overwhelmed by too many brand choices",
-            "Skeptical of traditional advertising"
-        ])
-    elif demographics.age_range == AgeRange.millennial:
-        pain_points.extend([
-            "Time constraints due to busy lifestyle",
-            "Information overload when researching products",
-            "Balancing quality with affordability"
-        ])
-    elif demographics.age_range == AgeRange.gen_x:
-        pain_points.extend([
-            "Difficulty keeping up with technology changes",
-            "Concerns about online security and privacy",
-            "Preference for proven brands over new options"
-        ])
-    elif demographics.age_range == AgeRange.boomer:
-        pain_points.extend([
-            "Discomfort with complex digital interfaces",
-            "Preference for personal customer service",
-            "Caution about online purchasing"
-        ])
-    
-    # Income-based pain points
-    if demographics.income_range and "$25,000" in demographics.income_range:
-        pain_points.append("Budget constraints limiting premium options")
-    elif demographics.income_range and "$50,000" in demographics.income_range:
-        pain_points.append("Need to justify larger purchases carefully")
-    
-    # General pain points
-    pain_points.extend([
-        "Finding trustworthy product reviews",
-        "Comparing similar products effectively"
-    ])
-    
-    return pain_points[:5]  # Limit to top 5 pain points
+    return list(_rule_profile(persona_data).pain_points)
 
 def generate_targeted_goals(persona_data: PersonaData) -> List[str]:
     """Generate goals based on persona characteristics"""
-    goals = []
-    demographics = persona_data.demographics
-    
-    # Age-based goals
-    if demographics.age_range == AgeRange.gen_z:
-        goals.extend([
-            "Discover brands that align with personal values",
-            "Find affordable options that don't compromise quality",
-            "Stay current with trends and innovations"
-        ])
-    elif demographics.age_range == AgeRange.millennial:
-        goals.extend([
-            "Make efficient purchasing decisions",
-            "Find products that enhance lifestyle and experiences",
-            "Get the best value for money spent"
-        ])
-    elif demographics.age_range == AgeRange.gen_x:
-        goals.extend([
-            "Make informed, researched purchase decisions",
-            "Find reliable products that last long-term",
-            "Support brands with good customer service"
-        ])
-    elif demographics.age_range == AgeRange.boomer:
-        goals.extend([
-            "Purchase from trusted, established brands",
-            "Receive excellent customer support",
-            "Find products that meet specific needs reliably"
-        ])
-    
-    # Income-based goals
-    if demographics.income_range and ("$75,000" in demographics.income_range or "$100,000" in demographics.income_range):
-        goals.append("Access premium products and services")
-    else:
-        goals.append("Maximize value within budget constraints")
-    
-    # General goals
-    goals.extend([
-        "Avoid purchase regret through careful selection",
-        "Save time in the buying process"
-    ])
-    
-    return goals[:5]  # Limit to top 5 goals
+    return list(_rule_profile(persona_data).goals)
 
 def generate_platform_analysis(persona_data: PersonaData) -> Dict[str, Any]:
     """Generate platform-specific analysis based on actual uploaded social media data"""
-    platforms = persona_data.media_consumption.social_media_platforms or []
-    
-    platform_analysis = {}
-    
-    # Generate realistic engagement metrics based on actual platforms from uploaded data
-    for platform in platforms:
-        if platform == "Instagram":
-            platform_analysis[platform] = {
-                "engagement_rate": "4.2%",
-                "peak_times": ["12:00 PM", "7:00 PM", "9:00 PM"],
-                "content_performance": "Visual content performs 73% better",
-                "ad_receptivity": "68%",
-                "primary_usage": "Visual discovery and lifestyle content"
-            }
-        elif platform == "Facebook":
-            platform_analysis[platform] = {
-                "engagement_rate": "2.8%",
-                "peak_times": ["6:00 PM", "8:00 PM", "10:00 AM"],
-                "content_performance": "Video content gets 135% more engagement",
-                "ad_receptivity": "72%", 
-                "primary_usage": "News, community groups, and brand discovery"
-            }
-        elif platform == "LinkedIn":
-            platform_analysis[platform] = {
-                "engagement_rate": "5.1%",
-                "peak_times": ["8:00 AM", "12:00 PM", "5:00 PM"],
-                "content_performance": "Professional content performs 89% better",
-                "ad_receptivity": "61%",
-                "primary_usage": "Professional networking and industry insights"
-            }
-        elif platform == "Twitter" or platform == "Twitter/X":
-            platform_analysis[platform] = {
-                "engagement_rate": "3.6%",
-                "peak_times": ["9:00 AM", "3:00 PM", "9:00 PM"],
-                "content_performance": "Real-time content performs 94% better",
-                "ad_receptivity": "58%",
-                "primary_usage": "News updates and real-time conversations"
-            }
-        elif platform == "TikTok":
-            platform_analysis[platform] = {
-                "engagement_rate": "8.3%",
-                "peak_times": ["6:00 PM", "9:00 PM", "11:00 PM"],
-                "content_performance": "Short-form video essential",
-                "ad_receptivity": "74%",
-                "primary_usage": "Entertainment and trend discovery"
-            }
-        elif platform == "YouTube":
-            platform_analysis[platform] = {
-                "engagement_rate": "6.2%", 
-                "peak_times": ["7:00 PM", "9:00 PM", "2:00 PM"],
-                "content_performance": "Long-form educational content preferred",
-                "ad_receptivity": "65%",
-                "primary_usage": "Educational content and entertainment"
-            }
-    
-    return platform_analysis
+    return _rule_profile(persona_data).platform_analysis()
 
 def generate_social_behavior_analysis(persona_data: PersonaData) -> Dict[str, Any]:
     """Generate social behavior analysis based on uploaded demographic and platform data"""
-    demographics = persona_data.demographics
-    platforms = persona_data.media_consumption.social_media_platforms or []
-    
-    # Analyze behavior based on age and actual platforms used
-    behavior_analysis = {
-        "social_media_usage_pattern": "Multi-platform active user" if len(platforms) >= 3 else "Selective platform user",
-        "content_consumption_style": "",
-        "interaction_preferences": [],
-        "influence_factors": [],
-        "privacy_concerns": ""
-    }
-    
-    # Age-based behavior patterns
-    if demographics.age_range == AgeRange.gen_z:
-        behavior_analysis["content_consumption_style"] = "Visual-first, short-form content preference"
-        behavior_analysis["interaction_preferences"] = ["Stories", "Direct messages", "Comments"]
-        behavior_analysis["privacy_concerns"] = "High privacy awareness, selective sharing"
-    elif demographics.age_range == AgeRange.millennial:
-        behavior_analysis["content_consumption_style"] = "Mixed content, values authenticity"
-        behavior_analysis["interaction_preferences"] = ["Likes", "Shares", "Comments", "Groups"]
-        behavior_analysis["privacy_concerns"] = "Moderate privacy concerns, curated sharing"
-    elif demographics.age_range == AgeRange.gen_x:
-        behavior_analysis["content_consumption_style"] = "Information-focused, longer content acceptable"
-        behavior_analysis["interaction_preferences"] = ["Likes", "Shares", "Professional networking"]
-        behavior_analysis["privacy_concerns"] = "High privacy concerns, limited personal sharing"
-    
-    # Platform-specific influence factors
-    if "LinkedIn" in platforms:
-        behavior_analysis["influence_factors"].append("Professional recommendations")
-    if "Instagram" in platforms:
-        behavior_analysis["influence_factors"].append("Visual inspiration and lifestyle trends")
-    if "Facebook" in platforms:
-        behavior_analysis["influence_factors"].append("Peer recommendations and community discussions")
-    if "Twitter" in platforms or "Twitter/X" in platforms:
-        behavior_analysis["influence_factors"].append("Real-time news and expert opinions")
-    
-    return behavior_analysis
+    return _rule_profile(persona_data).social_behavior_analysis()
 
 
 def _generate_communication_style(persona_data: PersonaData) -> str:
     """Generate communication style based on persona data"""
-    demographics = persona_data.demographics
-    
-    if demographics.age_range == AgeRange.gen_z:
-        return "Authentic, visual, and purpose-driven communication"
-    elif demographics.age_range == AgeRange.millennial:
-        return "Direct, informative, and value-focused communication"
-    elif demographics.age_range == AgeRange.gen_x:
-        return "Professional, detailed, and trustworthy communication"
-    elif demographics.age_range == AgeRange.boomer:
-        return "Respectful, traditional, and service-oriented communication"
-    else:
-        return "Clear, professional, and informative communication"
+    return _rule_profile(persona_data).communication_style
 
 
 def _get_decision_factors(demographics: Demographics, attributes: Attributes) -> List[str]:
     """Determine key decision factors based on demographics and attributes"""
-    factors = []
-    
-    # Age-based factors
-    if demographics.age_range == AgeRange.gen_z:
-        factors.extend(["Social impact", "Authenticity", "Price"])
-    elif demographics.age_range == AgeRange.millennial:
-        factors.extend(["Reviews", "Convenience", "Value"])
-    elif demographics.age_range == AgeRange.gen_x:
-        factors.extend(["Quality", "Brand reputation", "Features"])
-    elif demographics.age_range == AgeRange.boomer:
-        factors.extend(["Trust", "Customer service", "Reliability"])
-    
-    # Income-based factors
-    if demographics.income_range and "$75,000" in demographics.income_range:
-        factors.append("Premium features")
-    else:
-        factors.append("Price competitiveness")
-    
-    return factors[:4]  # Limit to top 4 factors
+    return list(persona_rules.evaluate(demographics).decision_factors)
 
 
 # Helper functions for data normalization
 def _normalize_gender(gender):
     """Normalize gender data for image generation"""
-    if not gender:
-        return 'Female'  # Default
-    
-    gender_str = str(gender).lower()
-    if 'female' in gender_str or 'woman' in gender_str or 'slight female skew' in gender_str:
-        return 'Female'
-    elif 'male' in gender_str or 'man' in gender_str:
-        return 'Male'
-    else:
-        return 'Female'  # Default for mixed/unclear cases
+    return normalization.normalize_gender(gender) or 'Female'  # Default for mixed/unclear cases
 
 def _normalize_occupation(occupation):
     """Normalize occupation data for image generation"""
-    if not occupation:
-        return 'Professional'
-    
-    occupation_str = str(occupation).lower()
-    if 'manager' in occupation_str or 'director' in occupation_str or 'executive' in occupation_str:
-        return 'Executive'
-    elif 'engineer' in occupation_str or 'developer' in occupation_str or 'tech' in occupation_str:
-        return 'Technology Professional'
-    elif 'marketing' in occupation_str or 'sales' in occupation_str:
-        return 'Marketing Professional'
-    elif 'analyst' in occupation_str or 'finance' in occupation_str:
-        return 'Financial Analyst'
-    elif 'consultant' in occupation_str:
-        return 'Business Consultant'
-    else:
-        return 'Professional'
+    return normalization.normalize_occupation(occupation) or 'Professional'
 
 def _normalize_location(location):
     """Normalize location data for image generation"""
-    if not location:
-        return 'Urban'  # Default
-    
-    location_str = str(location).lower()
-    if 'suburban' in location_str or 'suburb' in location_str:
-        return 'Suburban'
-    elif 'rural' in location_str or 'country' in location_str:
-        return 'Rural'
-    elif 'urban' in location_str or 'city' in location_str or 'metropolitan' in location_str:
-        return 'Urban'
-    else:
-        return 'Urban'  # Default
+    return normalization.normalize_location(location) or 'Urban'  # Default
+
+def _normalize_age_range(age_value) -> Optional[AgeRange]:
+    """Map a raw age band onto the AgeRange enum, None if unrecognised"""
+    age_range = normalization.normalize_age_range(age_value)
+    return AgeRange(age_range) if age_range else None
+
+def _apply_resonate_demographics(demographics: Demographics, demo_data: dict) -> Demographics:
+    """Overwrite demographics fields with the top value of each matching Resonate demographics entry"""
+    for key, value in demo_data.items():
+        if isinstance(value, dict) and 'top_values' in value:
+            top_values = list(value['top_values'].keys())
+            if not top_values:
+                continue
+            field = normalization.demographic_field(key)
+            if field == 'age_range':
+                demographics.age_range = _normalize_age_range(top_values[0]) or demographics.age_range
+            elif field == 'gender':
+                demographics.gender = normalization.normalize_gender(top_values[0]) or demographics.gender
+            elif field:
+                setattr(demographics, field, top_values[0])
+    return demographics
 
 
 # Helper function to generate persona image using OpenAI DALL-E
@@ -1172,34 +1013,17 @@ async def generate_persona_image(persona_data: PersonaData) -> Optional[str]:
     except Exception as e:
         logging.error(f"Error generating OpenAI image for {persona_data.name}: {str(e)}")
         # Fallback to Unsplash if OpenAI fails
-        return await _get_fallback_image(demographics.dict() if demographics else {})
+        return await _get_fallback_image(demographics.model_dump() if demographics else {})
 
 async def _get_fallback_image(demographics_dict: dict) -> str:
     """Fallback to Unsplash if OpenAI fails"""
+    metrics.record_fallback("image")
     try:
         from external_integrations.unsplash import get_professional_headshot
         
-        # Build search terms for Unsplash fallback
-        search_terms = ["professional", "headshot", "business"]
-        
-        gender = demographics_dict.get('gender', '')
-        if gender:
-            if gender.lower() in ['male', 'man']:
-                search_terms.extend(["businessman", "male"])
-            elif gender.lower() in ['female', 'woman']:
-                search_terms.extend(["businesswoman", "female"])
-        
-        occupation = demographics_dict.get('occupation', '')
-        if occupation:
-            if 'executive' in occupation.lower() or 'director' in occupation.lower():
-                search_terms.append("executive")
-            elif 'tech' in occupation.lower() or 'engineer' in occupation.lower():
-                search_terms.append("tech")
-        
-        query = " ".join(search_terms[:5])  # Limit query length
-        
-        # Try to get Unsplash image
-        unsplash_url = await get_professional_headshot(query, demographics_dict)
+        # Try to get Unsplash image; the client is synchronous, so keep it off the event loop
+        with metrics.stage_timer(metrics.UNSPLASH):
+            unsplash_url = await asyncio.to_thread(get_professional_headshot, demographics_dict)
         if unsplash_url:
             logging.info(f"Using Unsplash fallback image: {unsplash_url}")
             return unsplash_url
@@ -1208,13 +1032,9 @@ async def _get_fallback_image(demographics_dict: dict) -> str:
         logging.error(f"Fallback image generation also failed: {str(e)}")
     
     # Final fallback to default professional image
-    gender = demographics_dict.get('gender', '').lower()
-    if 'male' in gender:
-        return "https://images.unsplash.com/photo-1507003211169-0a1dd7228f2d?w=400&h=400&fit=crop&crop=face"
-    elif 'female' in gender:
+    if normalization.normalize_gender(demographics_dict.get('gender')) == 'Female':
         return "https://images.unsplash.com/photo-1531123897727-8f129e1688ce?w=400&h=400&fit=crop&crop=face"
-    else:
-        return "https://images.unsplash.com/photo-1507003211169-0a1dd7228f2d?w=400&h=400&fit=crop&crop=face"
+    return "https://images.unsplash.com/photo-1507003211169-0a1dd7228f2d?w=400&h=400&fit=crop&crop=face"
 
 
 # Legacy Status Check Models (keeping for compatibility)
@@ -1226,6 +1046,8 @@ class StatusCheck(BaseModel):
 class StatusCheckCreate(BaseModel):
     client_name: str
 
+status_check_codec = mongo_codec.ModelCodec(StatusCheck)
+
 
 # Persona API Routes
 @api_router.post("/personas", response_model=PersonaData)
@@ -1237,45 +1059,47 @@ async def create_persona(request: CreatePersonaRequest):
     )
     
     # Insert into database
-    await db.personas.insert_one(persona_data.dict())
-    return persona_data
+    await db.personas.insert_one(persona_codec.encode(persona_data))
+    return model_json_response(persona_data)
 
 @api_router.get("/personas/{persona_id}", response_model=PersonaData)
-async def get_persona(persona_id: str):
-    """Get a specific persona by ID"""
-    persona = await db.personas.find_one({"id": persona_id})
+async def get_persona(persona_id: str, cache_control: Optional[str] = Header(None)):
+    """Get a specific persona by ID. Cache-Control: no-cache skips the server's document cache"""
+    persona = await find_persona_document(persona_id, fresh="no-cache" in (cache_control or ""))
     if not persona:
         raise HTTPException(status_code=404, detail="Persona not found")
-    return PersonaData(**persona)
+    return model_json_response(persona_codec.decode(persona))
 
 @api_router.put("/personas/{persona_id}", response_model=PersonaData)
+@api_router.patch("/personas/{persona_id}", response_model=PersonaData)
 async def update_persona(persona_id: str, request: UpdatePersonaRequest):
-    """Update persona data - especially important for Media Consumption step"""
-    persona = await db.personas.find_one({"id": persona_id})
-    if not persona:
-        raise HTTPException(status_code=404, detail="Persona not found")
-    
-    persona_data = PersonaData(**persona)
-    
-    # Update fields if provided
-    if request.name is not None:
-        persona_data.name = request.name
-    if request.demographics:
-        persona_data.demographics = request.demographics
-    if request.attributes:
-        persona_data.attributes = request.attributes
-    if request.media_consumption:
-        persona_data.media_consumption = request.media_consumption
-    if request.current_step is not None:
-        persona_data.current_step = request.current_step
-    if request.completed_steps is not None:
-        persona_data.completed_steps = request.completed_steps
-    
-    persona_data.updated_at = datetime.utcnow()
-    
-    # Update in database
-    await db.personas.replace_one({"id": persona_id}, persona_data.dict())
-    return persona_data
+    """
+    Update persona data - especially important for Media Consumption step.
+    Only the fields present in the request are $set, in one round trip; the
+    document is never read and rewritten as a whole.
+    """
+    changes = {
+        field: getattr(request, field)
+        for field in request.model_fields_set - {"expected_updated_at"}
+        if getattr(request, field) is not None
+    }
+    update = persona_codec.encode_fields({**changes, "updated_at": datetime.utcnow()})
+
+    query = {"id": persona_id}
+    if request.expected_updated_at is not None:
+        # Stored datetimes are naive UTC at millisecond precision
+        query["updated_at"] = mongo_codec.bson_datetime(request.expected_updated_at)
+
+    persona = await db.personas.find_one_and_update(
+        query, {"$set": update}, projection={"_id": False}, return_document=ReturnDocument.AFTER
+    )
+    # After the write, so a read that raced with it is not cached
+    document_cache.personas.invalidate(persona_id)
+    if persona is None:
+        if request.expected_updated_at is None or not await db.personas.find_one({"id": persona_id}, {"_id": 1}):
+            raise HTTPException(status_code=404, detail="Persona not found")
+        raise HTTPException(status_code=409, detail="Persona was modified by another request; reload and retry")
+    return model_json_response(persona_codec.decode(persona))
 
 def _extract_demographics_from_resonate(resonate_data: dict) -> Demographics:
     """Extract demographics from raw Resonate data"""
@@ -1290,135 +1114,74 @@ def _extract_demographics_from_resonate(resonate_data: dict) -> Demographics:
     demographics.education = "Bachelor's Degree"
     
     if 'demographics' in resonate_data:
-        demo_data = resonate_data['demographics']
-        
-        for key, value in demo_data.items():
-            if isinstance(value, dict) and 'top_values' in value:
-                top_values = list(value['top_values'].keys())
-                if top_values:
-                    if 'age' in key.lower():
-                        age_value = top_values[0]
-                        if '18-24' in age_value:
-                            demographics.age_range = AgeRange.gen_z
-                        elif '25-40' in age_value or '25-34' in age_value:
-                            demographics.age_range = AgeRange.millennial
-                        elif '41-56' in age_value or '35-44' in age_value:
-                            demographics.age_range = AgeRange.gen_x
-                        elif '57-75' in age_value:
-                            demographics.age_range = AgeRange.boomer
-                    elif 'gender' in key.lower():
-                        gender_value = top_values[0].lower()
-                        if 'female' in gender_value:
-                            demographics.gender = 'Female'
-                        elif 'male' in gender_value:
-                            demographics.gender = 'Male'
-                    elif 'income' in key.lower():
-                        demographics.income_range = top_values[0]
-                    elif 'education' in key.lower():
-                        demographics.education = top_values[0]
-                    elif 'location' in key.lower():
-                        demographics.location = top_values[0]
-                    elif 'occupation' in key.lower():
-                        demographics.occupation = top_values[0]
+        _apply_resonate_demographics(demographics, resonate_data['demographics'])
     
     return demographics
 
-@api_router.post("/personas/{persona_id}/generate", response_model=GeneratedPersona)
-async def generate_persona(persona_id: str, request: dict = None):
-    """Generate the final AI-powered persona with image"""
-    persona = await db.personas.find_one({"id": persona_id})
-    if not persona:
-        raise HTTPException(status_code=404, detail="Persona not found")
-    
-    persona_data = PersonaData(**persona)
-    
+def _stored_data_sources(persona: dict) -> dict:
+    """Data sources saved on the persona document, in the shape the wizard sends them"""
+    data_sources = {}
+    for source, label in (('sparktoro', 'SparkToro'), ('semrush', 'SEMRush'), ('buzzabout', 'Buzzabout'), ('resonate', 'Resonate')):
+        if persona.get(f'{source}_data'):
+            data_sources[source] = {
+                'uploaded': True,
+                'data': persona[f'{source}_data']
+            }
+            logging.info(f"Found stored {label} data")
+    return data_sources
+
+def _build_generation_prompt(persona: dict, persona_data: PersonaData, request: Optional[dict]) -> tuple:
+    """
+    Build the OpenAI prompt for /personas/{id}/generate.
+    Returns (prompt, prompt_report); prompt is None when the persona should
+    use rule-based generation instead.
+    """
     # Check if this is a multi-source data generation
     is_multi_source = request and request.get('use_multi_source_data', False)
-    
-    # Generate persona image first
-    try:
-        persona_image_url = await generate_persona_image(persona_data)
-    except Exception as e:
-        logging.error(f"Image generation failed: {str(e)}")
-        # Use default image if generation fails
-        gender = persona_data.demographics.gender if persona_data.demographics else 'Unknown'
-        if gender and gender.lower() == 'female':
-            persona_image_url = "https://images.unsplash.com/photo-1531123897727-8f129e1688ce?w=400&h=400&fit=crop&crop=face"
-        else:
-            persona_image_url = "https://images.unsplash.com/photo-1507003211169-0a1dd7228f2d?w=400&h=400&fit=crop&crop=face"
-    
+
     if is_multi_source:
         # For multi-source personas, use the uploaded data that's already in the persona
         logging.info(f"Generating multi-source persona for {persona_data.name}")
         logging.info(f"Persona demographics: {persona_data.demographics}")
         logging.info(f"Persona media consumption: {persona_data.media_consumption}")
-        
+
         # Get the actual uploaded data for enhanced insights
         data_sources = request.get('data_sources', {})
         combined_insights = request.get('combined_insights', {})
-        
+
         # Debug: Log what data we're receiving
         logging.info(f"Data sources received: {list(data_sources.keys()) if data_sources else 'None'}")
         logging.info(f"Combined insights available: {bool(combined_insights)}")
-        
+
         # If no data sources in request, get from stored persona data
         if not data_sources or not any(ds.get('uploaded') for ds in data_sources.values()):
-            data_sources = {}
-            
-            # Get stored SparkToro data
-            if persona.get('sparktoro_data'):
-                data_sources['sparktoro'] = {
-                    'uploaded': True,
-                    'data': persona['sparktoro_data']
-                }
-                logging.info("Found stored SparkToro data")
-            
-            # Get stored SEMRush data  
-            if persona.get('semrush_data'):
-                data_sources['semrush'] = {
-                    'uploaded': True,
-                    'data': persona['semrush_data']
-                }
-                logging.info("Found stored SEMRush data")
-            
-            # Get stored Buzzabout data
-            if persona.get('buzzabout_data'):
-                data_sources['buzzabout'] = {
-                    'uploaded': True,
-                    'data': persona['buzzabout_data']
-                }
-                logging.info("Found stored Buzzabout data")
-            
-            # Get stored Resonate data
-            if persona.get('resonate_data'):
-                data_sources['resonate'] = {
-                    'uploaded': True,
-                    'data': persona['resonate_data']
-                }
-                logging.info("Found stored Resonate data")
-        
+            data_sources = _stored_data_sources(persona)
+
         # Final debug: What data sources do we have?
         uploaded_sources = [source for source, data in data_sources.items() if data.get('uploaded')]
         logging.info(f"Final data sources for generation: {uploaded_sources}")
-        
+
         # Always try OpenAI first, even if we only have basic demographic data
         try:
             if uploaded_sources:
                 # Assemble all real data from uploads
-                assembled_data = assemble_real_uploaded_data(data_sources, persona_data)
+                with tracing.span("persona.assemble_data", sources=",".join(uploaded_sources)):
+                    assembled_data = assemble_real_uploaded_data(data_sources, persona_data)
                 logging.info(f"Assembled data summary: SparkToro={bool(assembled_data.get('sparktoro_data'))}, SEMRush={bool(assembled_data.get('semrush_data'))}, Buzzabout={bool(assembled_data.get('buzzabout_data'))}")
-                
+
                 # Create advanced OpenAI prompt with real data
-                advanced_prompt = create_advanced_persona_prompt(assembled_data, persona_data)
-            else:
-                # Create basic OpenAI prompt with demographic data only
-                logging.info("No uploaded data sources found - using enhanced demographic prompt for OpenAI")
-                advanced_prompt = f"""
+                prompt_result = build_advanced_persona_prompt(assembled_data, persona_data)
+                logging.info(f"Persona prompt built: {prompt_result.token_count}/{prompt_result.budget} tokens, sections={prompt_result.sections}")
+                return prompt_result.prompt, prompt_result.report()
+
+            # Create basic OpenAI prompt with demographic data only
+            logging.info("No uploaded data sources found - using enhanced demographic prompt for OpenAI")
+            advanced_prompt = f"""
 Create a detailed customer persona based on these demographics:
 
 DEMOGRAPHICS:
 - Age: {persona_data.demographics.age_range if persona_data.demographics else 'Unknown'}
-- Gender: {persona_data.demographics.gender if persona_data.demographics else 'Unknown'}  
+- Gender: {persona_data.demographics.gender if persona_data.demographics else 'Unknown'}
 - Location: {persona_data.demographics.location if persona_data.demographics else 'Unknown'}
 - Occupation: {persona_data.demographics.occupation if persona_data.demographics else 'Unknown'}
 - Income: {persona_data.demographics.income_range if persona_data.demographics else 'Unknown'}
@@ -1440,40 +1203,35 @@ Based on these demographics, create a comprehensive persona analysis. Return JSO
 
 Make insights specific to the demographic profile provided.
 """
-            
-            # Always use OpenAI for multi-source personas
-            ai_insights, recommendations, pain_points, goals = await generate_openai_persona_insights(advanced_prompt)
-            
+            return advanced_prompt, {"prompt_tokens": prompt_budget.count_tokens(advanced_prompt)}
+
         except Exception as e:
-            logging.error(f"OpenAI generation failed for multi-source persona: {str(e)}")
+            logging.error(f"OpenAI prompt build failed for multi-source persona: {str(e)}")
             # Only fall back to basic generation if OpenAI completely fails
-            ai_insights = generate_intelligent_insights(persona_data)
-            recommendations = generate_data_driven_recommendations(persona_data)
-            pain_points = generate_contextual_pain_points(persona_data)
-            goals = generate_targeted_goals(persona_data)
-            
-    else:
-        # For non-multi-source personas, try OpenAI first if we have good demographic data
-        try:
-            # Check if we have sufficient demographic data for OpenAI
-            demographics = persona_data.demographics
-            logging.info(f"Regular persona generation - Demographics check: {demographics}")
-            logging.info(f"Age range: {demographics.age_range if demographics else 'None'}")
-            logging.info(f"Gender: {demographics.gender if demographics else 'None'}")
-            logging.info(f"Occupation: {demographics.occupation if demographics else 'None'}")
-            
-            if (demographics and 
-                demographics.age_range and 
-                demographics.gender and 
-                demographics.occupation):
-                
-                logging.info("Using OpenAI for non-multi-source persona with good demographic data")
-                basic_prompt = f"""
+            return None, None
+
+    # For non-multi-source personas, use OpenAI only if we have good demographic data
+    demographics = persona_data.demographics
+    logging.info(f"Regular persona generation - Demographics check: {demographics}")
+    logging.info(f"Age range: {demographics.age_range if demographics else 'None'}")
+    logging.info(f"Gender: {demographics.gender if demographics else 'None'}")
+    logging.info(f"Occupation: {demographics.occupation if demographics else 'None'}")
+
+    if not (demographics and
+            demographics.age_range and
+            demographics.gender and
+            demographics.occupation):
+        # Use standard generation for personas with limited data
+        logging.info("Insufficient demographic data for OpenAI generation - falling back to standard generation")
+        return None, None
+
+    logging.info("Using OpenAI for non-multi-source persona with good demographic data")
+    basic_prompt = f"""
 Create a detailed customer persona based on these demographics:
 
 DEMOGRAPHICS:
 - Age: {demographics.age_range}
-- Gender: {demographics.gender}  
+- Gender: {demographics.gender}
 - Location: {demographics.location or 'Unknown'}
 - Occupation: {demographics.occupation}
 - Income: {demographics.income_range or 'Unknown'}
@@ -1495,29 +1253,40 @@ Create comprehensive persona analysis. Return JSON only:
 
 Make insights specific to the demographic profile provided.
 """
-                logging.info(f"Generated OpenAI prompt for regular persona: {len(basic_prompt)} characters")
-                ai_insights, recommendations, pain_points, goals = await generate_openai_persona_insights(basic_prompt)
-                logging.info("Successfully generated regular persona using OpenAI")
-            else:
-                # Use standard generation for personas with limited data
-                logging.info("Insufficient demographic data for OpenAI generation - falling back to standard generation")
-                raise Exception("Insufficient demographic data for OpenAI generation")
-                
-        except Exception as e:
-            logging.info(f"Using standard generation for non-multi-source persona: {str(e)}")
-            # Use standard generation for non-multi-source personas
-            ai_insights = generate_intelligent_insights(persona_data)
-            recommendations = generate_data_driven_recommendations(persona_data)
-            pain_points = generate_contextual_pain_points(persona_data)
-            goals = generate_targeted_goals(persona_data)
-    
+    logging.info(f"Generated OpenAI prompt for regular persona: {len(basic_prompt)} characters")
+    return basic_prompt, {"prompt_tokens": prompt_budget.count_tokens(basic_prompt)}
+
+def _rule_based_insights(persona_data: PersonaData) -> tuple:
+    """Standard (non-OpenAI) insights, recommendations, pain points and goals"""
+    return (
+        generate_intelligent_insights(persona_data),
+        generate_data_driven_recommendations(persona_data),
+        generate_contextual_pain_points(persona_data),
+        generate_targeted_goals(persona_data)
+    )
+
+async def _generate_persona_image_or_default(persona_data: PersonaData) -> str:
+    """Persona image, falling back to a default headshot if generation fails"""
+    try:
+        with tracing.span("persona.image"):
+            return await generate_persona_image(persona_data)
+    except Exception as e:
+        logging.error(f"Image generation failed: {str(e)}")
+        # Use default image if generation fails
+        gender = persona_data.demographics.gender if persona_data.demographics else 'Unknown'
+        if gender and gender.lower() == 'female':
+            return "https://images.unsplash.com/photo-1531123897727-8f129e1688ce?w=400&h=400&fit=crop&crop=face"
+        return "https://images.unsplash.com/photo-1507003211169-0a1dd7228f2d?w=400&h=400&fit=crop&crop=face"
+
+def _build_generated_persona(persona_data: PersonaData, insights: tuple, persona_image_url: Optional[str]) -> GeneratedPersona:
+    ai_insights, recommendations, pain_points, goals = insights
     communication_style = _generate_communication_style(persona_data)
-    
+
     # Generate platform-specific insights based on actual uploaded data
     platform_insights = generate_platform_analysis(persona_data)
     social_behavior = generate_social_behavior_analysis(persona_data)
-    
-    generated_persona = GeneratedPersona(
+
+    return GeneratedPersona(
         name=persona_data.name or f"Persona {persona_data.id[:8]}",
         persona_data=persona_data,
         ai_insights=ai_insights,
@@ -1529,27 +1298,207 @@ Make insights specific to the demographic profile provided.
         platform_insights=platform_insights,
         social_behavior=social_behavior
     )
-    
+
+def _idempotency_key(idempotency_key: Optional[str]) -> Optional[str]:
+    if idempotency_key is not None and not 0 < len(idempotency_key) <= idempotency.MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1-{idempotency.MAX_KEY_LENGTH} characters")
+    return idempotency_key
+
+@api_router.post("/personas/{persona_id}/generate", response_model=GeneratedPersona)
+async def generate_persona(persona_id: str, request: dict = None, idempotency_key: Optional[str] = Header(None)):
+    """
+    Generate the final AI-powered persona with image. Send an Idempotency-Key
+    header to make retries safe: a repeat of the request returns the first
+    generated persona instead of generating (and storing) another one.
+    """
+    async def compute():
+        return await _generate_persona(persona_id, request), True
+
+    return await idempotency.run(
+        db, "generate", _idempotency_key(idempotency_key),
+        idempotency.fingerprint(persona_id, request), compute,
+    )
+
+async def _generate_persona(persona_id: str, request: Optional[dict]) -> Response:
+    persona = await find_persona_document(persona_id, fresh=True)
+    if not persona:
+        raise HTTPException(status_code=404, detail="Persona not found")
+
+    persona_data = persona_codec.decode(persona)
+    tracing.set_attributes(persona_id=persona_id, starting_method=persona_data.starting_method.value)
+
+    with llm_accounting.persona_context(persona_id, persona_data.starting_method.value):
+        # Generate persona image first
+        persona_image_url = await _generate_persona_image_or_default(persona_data)
+
+        # Tokenizing the ranked data is CPU-bound; keep it off the event loop
+        prompt, _ = await asyncio.to_thread(_build_generation_prompt, persona, persona_data, request)
+        if prompt:
+            insights = await generate_openai_persona_insights(prompt)
+        else:
+            insights = _rule_based_insights(persona_data)
+
+    generated_persona = _build_generated_persona(persona_data, insights, persona_image_url)
+
     # Save generated persona
-    await db.generated_personas.insert_one(generated_persona.dict())
-    return generated_persona
+    await db.generated_personas.insert_one(
+        await persona_snapshots.store(db, generated_persona_codec.encode(generated_persona))
+    )
+    return model_json_response(generated_persona)
+
+def _sse_event(event: str, data: Any) -> str:
+    """Format one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+async def _generate_persona_events(persona: dict, persona_data: PersonaData, request: Optional[dict],
+                                   flight: idempotency.Flight):
+    """Event stream for /personas/{id}/generate/stream, as the owner of its idempotency flight"""
+    try:
+        with llm_accounting.persona_context(persona_data.id, persona_data.starting_method.value):
+            async for event in _generate_persona_event_stream(persona, persona_data, request, flight):
+                yield event
+    finally:
+        # Client disconnected mid-stream: let a retry generate again
+        await flight.abandon()
+
+async def _replayed_persona_events(flight: idempotency.Flight):
+    """Event stream for a repeated /generate/stream request: the first result as a single saved event"""
+    stored = flight.stored
+    waiting = None if stored else asyncio.ensure_future(flight.wait())
+    try:
+        # SSE comments keep the connection (and the client's idle timeout) alive
+        # while the first request is still generating
+        while waiting is not None and not (await asyncio.wait({waiting}, timeout=15))[0]:
+            yield ": waiting\n\n"
+        if waiting is not None and waiting.cancelled():
+            # The first request's client disconnected; its claim is released
+            yield _sse_event("error", {"detail": "Persona generation was interrupted, please retry"})
+            return
+        stored = stored or waiting.result()
+    except idempotency.IdempotencyKeyReused:
+        yield _sse_event("error", {"detail": "Idempotency-Key was already used for a different request"})
+    except Exception as e:
+        yield _sse_event("error", {"detail": f"Persona generation failed: {getattr(e, 'detail', str(e))}"})
+    else:
+        yield _sse_event("saved", json.loads(stored["body"]))
+    finally:
+        if waiting is not None:
+            waiting.cancel()
+
+async def _generate_persona_event_stream(persona: dict, persona_data: PersonaData, request: Optional[dict],
+                                         flight: idempotency.Flight):
+    # The image renders concurrently with the chat completion
+    image_task = asyncio.create_task(_generate_persona_image_or_default(persona_data))
+    image_sent = False
+    try:
+        prompt, prompt_report = await asyncio.to_thread(_build_generation_prompt, persona, persona_data, request)
+        yield _sse_event("prompt_built", {"mode": "openai" if prompt else "rule_based", **(prompt_report or {})})
+
+        if prompt:
+            parser = json_stream.JSONStreamParser(max_depth=2)
+            try:
+                async for delta in stream_openai_persona_insights(prompt):
+                    yield _sse_event("token", {"delta": delta})
+                    for path, value in parser.feed(delta):
+                        yield _sse_event("insights_partial", {"path": list(path), "value": value})
+                    if not image_sent and image_task.done():
+                        image_sent = True
+                        yield _sse_event("image_ready", {"persona_image_url": image_task.result()})
+                insights = _parse_persona_insights(parser.text)
+            except Exception as e:
+                logging.error(f"OpenAI persona streaming failed: {str(e)}")
+                insights = _get_fallback_insights()
+        else:
+            insights = _rule_based_insights(persona_data)
+
+        ai_insights, recommendations, pain_points, goals = insights
+        yield _sse_event("insights", {
+            "ai_insights": ai_insights,
+            "recommendations": recommendations,
+            "pain_points": pain_points,
+            "goals": goals
+        })
+
+        persona_image_url = await image_task
+        if not image_sent:
+            yield _sse_event("image_ready", {"persona_image_url": persona_image_url})
+
+        generated_persona = _build_generated_persona(persona_data, insights, persona_image_url)
+        await db.generated_personas.insert_one(
+            await persona_snapshots.store(db, generated_persona_codec.encode(generated_persona))
+        )
+        # Stored like a /generate response, so a retry on either route replays it
+        await flight.complete(model_json_response(generated_persona), True)
+        yield _sse_event("saved", generated_persona)
+    except Exception as e:
+        logging.error(f"Streaming persona generation failed: {str(e)}")
+        await flight.fail(e)
+        yield _sse_event("error", {"detail": f"Persona generation failed: {str(e)}"})
+    finally:
+        if not image_task.done():
+            image_task.cancel()
+
+@api_router.post("/personas/{persona_id}/generate/stream")
+async def generate_persona_stream(persona_id: str, request: dict = None,
+                                  idempotency_key: Optional[str] = Header(None)):
+    """
+    Streaming variant of /personas/{persona_id}/generate, as Server-Sent Events:
+    prompt_built, token (chat completion deltas), insights_partial (each
+    top-level section or list item as soon as its JSON is complete), insights,
+    image_ready, saved (the stored GeneratedPersona) and error.
+
+    Idempotency-Key works as on /generate, and the two routes share keys: a
+    repeat of the request streams a single saved event with the first
+    generated persona (Idempotent-Replayed: true).
+    """
+    persona = await find_persona_document(persona_id, fresh=True)
+    if not persona:
+        raise HTTPException(status_code=404, detail="Persona not found")
+
+    persona_data = persona_codec.decode(persona)
+    tracing.set_attributes(persona_id=persona_id, starting_method=persona_data.starting_method.value)
+
+    # Disable proxy buffering (nginx) so events reach the client as they are sent
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    flight = await idempotency.begin(
+        db, "generate", _idempotency_key(idempotency_key), idempotency.fingerprint(persona_id, request)
+    )
+    if not flight.owner:
+        headers[idempotency.REPLAYED_HEADER] = "true"
+        return StreamingResponse(_replayed_persona_events(flight), media_type="text/event-stream", headers=headers)
+
+    return StreamingResponse(
+        _generate_persona_events(persona, persona_data, request, flight),
+        media_type="text/event-stream",
+        headers=headers,
+        # Runs even when the client left before the stream started, so the claim is never left behind
+        background=BackgroundTask(flight.abandon),
+    )
 
 @api_router.get("/personas", response_model=List[PersonaData])
 async def list_personas():
     """List all personas"""
-    personas = await db.personas.find().to_list(100)
-    return [PersonaData(**persona) for persona in personas]
+    personas = await list_db.personas.find().to_list(100)
+    return model_list_json_response(persona_codec, personas)
 
 @api_router.get("/generated-personas", response_model=List[GeneratedPersona])
-async def list_generated_personas():
-    """List all generated personas"""
-    personas = await db.generated_personas.find().to_list(100)
-    return [GeneratedPersona(**persona) for persona in personas]
+async def list_generated_personas(persona_id: Optional[str] = None, include_raw_data: bool = False):
+    """
+    List all generated personas, or those generated from `persona_id`.
+    The raw upload payloads in persona_data are only included on request.
+    """
+    query = {}
+    if persona_id:
+        query = {"$or": [{"persona_id": persona_id}, {"persona_data.id": persona_id}]}
+    personas = await list_db.generated_personas.find(query).to_list(100)
+    personas = await persona_snapshots.hydrate(list_db, personas, include_raw_data=include_raw_data)
+    return model_list_json_response(generated_persona_codec, personas)
 
 @api_router.delete("/personas/{persona_id}")
 async def delete_persona(persona_id: str):
     """Delete a persona"""
     result = await db.personas.delete_one({"id": persona_id})
+    document_cache.personas.invalidate(persona_id)
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Persona not found")
     return {"message": "Persona deleted successfully"}
@@ -1557,10 +1506,15 @@ async def delete_persona(persona_id: str):
 
 @api_router.delete("/generated-personas/{generated_persona_id}")
 async def delete_generated_persona(generated_persona_id: str):
-    """Delete a generated persona"""
-    result = await db.generated_personas.delete_one({"id": generated_persona_id})
-    if result.deleted_count == 0:
+    """Delete a generated persona, and its persona snapshot once nothing else references it"""
+    deleted = await db.generated_personas.find_one_and_delete(
+        {"id": generated_persona_id}, projection={"persona_snapshot": True}
+    )
+    document_cache.generated_personas.invalidate(generated_persona_id)
+    if deleted is None:
         raise HTTPException(status_code=404, detail="Generated persona not found")
+    if deleted.get("persona_snapshot"):
+        await persona_snapshots.release(db, deleted["persona_snapshot"])
     return {"message": "Generated persona deleted successfully"}
 
 
@@ -1569,6 +1523,71 @@ async def delete_generated_persona(generated_persona_id: str):
 async def root():
     return {"message": "BCM VentasAI Persona Generator API", "version": "1.0.0"}
 
+# Startup work tracked by /health/ready; set by the startup tasks at the bottom of this module
+_startup_state = {"indexes": False}
+READY_MONGO_PING_TIMEOUT = float(os.environ.get("READY_MONGO_PING_TIMEOUT", 2))
+
+@api_router.get("/health/live")
+async def health_live():
+    """Liveness: the process is up and serving requests"""
+    return {"status": "alive"}
+
+@api_router.get("/health/ready")
+async def health_ready():
+    """
+    Readiness: Mongo answers a ping, indexes are ensured, parser libraries
+    are imported and the OpenAI client is constructed. 503 until all pass.
+    Without OPENAI_API_KEY the OpenAI check passes as not_configured, since
+    generation then falls back to the rule-based path.
+    """
+    checks = {}
+    try:
+        await asyncio.wait_for(db.command("ping"), READY_MONGO_PING_TIMEOUT)
+        checks["mongo"] = "ok"
+    except Exception as e:
+        checks["mongo"] = f"error: {e.__class__.__name__}"
+    checks["indexes"] = "ok" if _startup_state["indexes"] else "pending"
+    if not WARM_UP_IMPORTS:
+        checks["parsers"] = "skipped"
+    else:
+        checks["parsers"] = "ok" if file_parsers.is_warmed_up() else "pending"
+    if not os.environ.get("OPENAI_API_KEY"):
+        checks["openai_client"] = "not_configured"
+    else:
+        checks["openai_client"] = "ok" if openai_scheduler.client_constructed() else "pending"
+
+    ready = all(status in ("ok", "skipped", "not_configured") for status in checks.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "not_ready", "checks": checks}
+    )
+
+@api_router.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics: request latency per route, stage latency and fallback counters"""
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
+@api_router.get("/openai/scheduler")
+async def get_openai_scheduler_stats():
+    """OpenAI call scheduler state: in-flight and queued calls, retries, rate limits and queue wait per priority"""
+    return openai_scheduler.scheduler.metrics()
+
+@api_router.get("/llm-calls/summary")
+async def get_llm_call_summary(days: int = 30):
+    """OpenAI calls, tokens, cost and latency per day, model and persona starting_method"""
+    return {"days": days, "summary": await llm_accounting.summarize(db, days)}
+
+@api_router.get("/personas/{persona_id}/llm-calls")
+async def get_persona_llm_calls(persona_id: str, limit: int = 100):
+    """OpenAI calls made while generating a persona, newest first"""
+    calls = await llm_accounting.calls_for_persona(db, persona_id, limit)
+    return {
+        "persona_id": persona_id,
+        "calls": calls,
+        "total_cost_usd": round(sum(call.get("cost_usd") or 0 for call in calls), 6)
+    }
+
 @api_router.post("/export/google-slides")
 async def export_to_google_slides(request: dict):
     """Export persona to Google Slides"""
@@ -1581,28 +1600,34 @@ async def export_to_google_slides(request: dict):
         
         # Get persona data
         if generated_persona_id:
-            generated_persona_doc = await db.generated_personas.find_one({"id": generated_persona_id})
+            generated_persona_doc = await find_generated_persona_document(generated_persona_id)
             if not generated_persona_doc:
                 raise HTTPException(status_code=404, detail="Generated persona not found")
             
             # Convert to JSON-serializable format
-            generated_persona = GeneratedPersona(**generated_persona_doc)
-            persona_data = generated_persona.dict()
+            generated_persona = generated_persona_codec.decode(generated_persona_doc)
+            persona_data = generated_persona.model_dump(mode="json")
         else:
-            persona_doc = await db.personas.find_one({"id": persona_id})
+            persona_doc = await find_persona_document(persona_id)
             if not persona_doc:
                 raise HTTPException(status_code=404, detail="Persona not found")
             
             # Convert to JSON-serializable format
-            persona = PersonaData(**persona_doc)
-            persona_data = {"persona_data": persona.dict()}
+            persona = persona_codec.decode(persona_doc)
+            persona_data = {"persona_data": persona.model_dump(mode="json")}
         
+        # Complete presentations.batchUpdate body, so the client makes one Slides call per deck
+        slides, etag = slides_export.get_batch_update(persona_data)
         return {
             "success": True,
             "persona_data": persona_data,
+            "slides": slides,
+            "slides_etag": etag,
             "message": "Persona data prepared for Google Slides export"
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error preparing Google Slides export: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Export preparation failed: {str(e)}")
@@ -1619,21 +1644,21 @@ async def get_pdf_export_data(request: dict):
         
         # Get persona data
         if generated_persona_id:
-            generated_persona_doc = await db.generated_personas.find_one({"id": generated_persona_id})
+            generated_persona_doc = await find_generated_persona_document(generated_persona_id)
             if not generated_persona_doc:
                 raise HTTPException(status_code=404, detail="Generated persona not found")
             
             # Convert to JSON-serializable format
-            generated_persona = GeneratedPersona(**generated_persona_doc)
-            persona_data = generated_persona.dict()
+            generated_persona = generated_persona_codec.decode(generated_persona_doc)
+            persona_data = generated_persona.model_dump()
         else:
-            persona_doc = await db.personas.find_one({"id": persona_id})
+            persona_doc = await find_persona_document(persona_id)
             if not persona_doc:
                 raise HTTPException(status_code=404, detail="Persona not found")
             
             # Convert to JSON-serializable format
-            persona = PersonaData(**persona_doc)
-            persona_data = {"persona_data": persona.dict()}
+            persona = persona_codec.decode(persona_doc)
+            persona_data = {"persona_data": persona.model_dump()}
         
         return {
             "success": True,
@@ -1644,17 +1669,143 @@ async def get_pdf_export_data(request: dict):
         logger.error(f"Error preparing PDF export data: {str(e)}")
         raise HTTPException(status_code=500, detail=f"PDF data preparation failed: {str(e)}")
 
+@api_router.get("/generated-personas/{generated_persona_id}/pdf")
+async def export_generated_persona_pdf(generated_persona_id: str, if_none_match: Optional[str] = Header(None)):
+    """
+    The generated persona rendered as a PDF on the server (see pdf_export.py).
+    The ETag identifies the rendered content; a matching If-None-Match gets 304.
+    """
+    generated_persona_doc = await find_generated_persona_document(generated_persona_id)
+    if not generated_persona_doc:
+        raise HTTPException(status_code=404, detail="Generated persona not found")
+    generated_persona = generated_persona_codec.decode(generated_persona_doc).model_dump(mode="json")
+
+    etag = f'"{pdf_export.content_hash(pdf_export.render_input(generated_persona))}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    try:
+        pdf, rendered_etag = await pdf_export.get_pdf(db, generated_persona)
+    except Exception as e:
+        logger.error(f"PDF rendering failed for {generated_persona_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"PDF rendering failed: {str(e)}")
+    if rendered_etag is None:
+        # Rendered without its image: don't let the client revalidate it as complete
+        headers = {"Cache-Control": "no-store"}
+
+    filename = bulk_export.safe_name(generated_persona["name"])
+    headers["Content-Disposition"] = f'attachment; filename="{filename}.pdf"'
+    return Response(content=pdf, media_type="application/pdf", headers=headers)
+
+@api_router.get("/generated-personas/{generated_persona_id}/slides")
+async def export_generated_persona_slides(generated_persona_id: str, if_none_match: Optional[str] = Header(None)):
+    """
+    Google Slides presentations.batchUpdate body ({"title", "requests"}) for
+    the generated persona (see slides_export.py). The ETag identifies the
+    content; a matching If-None-Match gets 304.
+    """
+    generated_persona_doc = await find_generated_persona_document(generated_persona_id)
+    if not generated_persona_doc:
+        raise HTTPException(status_code=404, detail="Generated persona not found")
+    generated_persona = generated_persona_codec.decode(generated_persona_doc).model_dump(mode="json")
+
+    slides, etag = slides_export.get_batch_update(generated_persona)
+    headers = {"ETag": f'"{etag}"', "Cache-Control": "private, no-cache"}
+    if if_none_match and headers["ETag"] in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return ORJSONResponse(slides, headers=headers)
+
+# Generated personas fetched, rendered and written to the archive per batch
+BULK_EXPORT_BATCH_SIZE = int(os.environ.get("BULK_EXPORT_BATCH_SIZE", 8))
+
+async def _bulk_export_files(document: dict, formats: List[str]) -> List[tuple]:
+    """[(archive name, bytes, compress)] for one generated persona document"""
+    generated_persona = generated_persona_codec.decode(document)
+    folder = f"{bulk_export.safe_name(generated_persona.name)}-{generated_persona.id[:8]}"
+    files = []
+    if "json" in formats:
+        files.append((f"{folder}/persona.json", generated_persona.model_dump_json(indent=2).encode("utf-8"), True))
+    if "csv" in formats:
+        files.append((f"{folder}/persona.csv", bulk_export.persona_csv(generated_persona.model_dump(mode="json")), True))
+    if "pdf" in formats:
+        pdf, _ = await pdf_export.get_pdf(db, generated_persona.model_dump(mode="json"))
+        # Already compressed
+        files.append((f"{folder}/persona.pdf", pdf, False))
+    return files
+
+async def _bulk_export_stream(first_batch: List[dict], cursor, request: BulkExportRequest):
+    archive = bulk_export.ZipStream()
+    manifest = [["generated_persona_id", "name", "status", "files"]]
+    exported = set()
+    batch = first_batch
+    try:
+        while batch:
+            batch = await persona_snapshots.hydrate(
+                db, batch, include_raw_data=request.include_raw_data, keep_missing=True
+            )
+            # Render the whole batch concurrently (PDFs in the render pool), then write it in order
+            results = iter(await asyncio.gather(
+                *(_bulk_export_files(document, request.formats)
+                  for document in batch if not document.get(persona_snapshots.MISSING)),
+                return_exceptions=True,
+            ))
+            for document in batch:
+                exported.add(document["id"])
+                if document.get(persona_snapshots.MISSING):
+                    manifest.append([document["id"], document.get("name", ""), "snapshot missing", ""])
+                    continue
+                files = next(results)
+                if isinstance(files, Exception):
+                    logging.error(f"Bulk export of {document['id']} failed: {str(files)}")
+                    manifest.append([document["id"], document.get("name", ""), f"error: {str(files)}", ""])
+                    continue
+                for name, data, compress in files:
+                    yield archive.add(name, data, compress=compress)
+                manifest.append([document["id"], document.get("name", ""), "exported", " ".join(name for name, _, _ in files)])
+            batch = await cursor.to_list(BULK_EXPORT_BATCH_SIZE)
+
+        for generated_persona_id in request.generated_persona_ids:
+            if generated_persona_id not in exported:
+                manifest.append([generated_persona_id, "", "not found", ""])
+        yield archive.add("manifest.csv", bulk_export.csv_bytes(manifest))
+        yield archive.close()
+    finally:
+        await cursor.close()
+
+@api_router.post("/export/bulk")
+async def export_bulk(request: BulkExportRequest):
+    """
+    Export many generated personas as one ZIP (JSON, CSV and/or PDF per
+    persona, plus manifest.csv). The personas are read with one $in query
+    and the archive is streamed as it is written, batch by batch, so memory
+    stays bounded however many personas are exported.
+    """
+    ids = list(dict.fromkeys(request.generated_persona_ids))
+    cursor = db.generated_personas.find({"id": {"$in": ids}}).batch_size(BULK_EXPORT_BATCH_SIZE)
+    first_batch = await cursor.to_list(BULK_EXPORT_BATCH_SIZE)
+    if not first_batch:
+        await cursor.close()
+        raise HTTPException(status_code=404, detail="None of the generated personas were found")
+
+    filename = f"personas-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.zip"
+    return StreamingResponse(
+        _bulk_export_stream(first_batch, cursor, request),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "X-Accel-Buffering": "no"},
+    )
+
 @api_router.post("/status", response_model=StatusCheck)
 async def create_status_check(input: StatusCheckCreate):
-    status_dict = input.dict()
+    status_dict = input.model_dump()
     status_obj = StatusCheck(**status_dict)
-    _ = await db.status_checks.insert_one(status_obj.dict())
+    _ = await db.status_checks.insert_one(status_check_codec.encode(status_obj))
     return status_obj
 
 @api_router.get("/status", response_model=List[StatusCheck])
 async def get_status_checks():
-    status_checks = await db.status_checks.find().to_list(1000)
-    return [StatusCheck(**status_check) for status_check in status_checks]
+    status_checks = await list_db.status_checks.find().to_list(1000)
+    return status_check_codec.decode_many(status_checks)
 
 
 # Data Sources Integration Endpoints
@@ -1663,56 +1814,98 @@ async def get_data_sources_status():
     """Get status of all data source integrations"""
     return data_sources.get_data_source_status()
 
+# Persona fields the data source orchestrator reads, and the enrichment kept
+# on the persona document
+ENRICHMENT_INPUT_PROJECTION = {"_id": False, "attributes": True, "demographics": True, "media_consumption": True}
+ENRICHMENT_TTL_SECONDS = float(os.environ.get("ENRICHMENT_TTL_SECONDS", 24 * 3600))
+
+def _enrichment_input_hash(persona: dict) -> str:
+    """Hash of the persona fields enrichment is computed from"""
+    inputs = {field: persona.get(field) for field, included in ENRICHMENT_INPUT_PROJECTION.items() if included}
+    return hashlib.sha256(json.dumps(jsonable_encoder(inputs), sort_keys=True).encode("utf-8")).hexdigest()
+
+def _enrichment_is_fresh(persona: dict) -> bool:
+    """Stored enrichment is younger than ENRICHMENT_TTL_SECONDS and was computed from the current inputs"""
+    enriched_at = persona.get("data_enrichment_at")
+    if not persona.get("data_enrichment") or not isinstance(enriched_at, datetime):
+        return False
+    if persona.get("data_enrichment_input") != _enrichment_input_hash(persona):
+        return False
+    return (datetime.utcnow() - enriched_at).total_seconds() < ENRICHMENT_TTL_SECONDS
+
+async def _store_enrichment(persona_id: str, enriched_data: dict, input_hash: str, projection: dict) -> Optional[dict]:
+    """
+    Save enrichment and return the updated persona (in `projection`) in the
+    same round trip. updated_at is left alone: enrichment is derived data,
+    not an edit, and must not fail an open wizard's expected_updated_at check.
+    """
+    persona = await db.personas.find_one_and_update(
+        {"id": persona_id},
+        {"$set": {
+            "data_enrichment": enriched_data,
+            "data_enrichment_at": mongo_codec.bson_datetime(datetime.utcnow()),
+            "data_enrichment_input": input_hash,
+        }},
+        projection=projection,
+        return_document=ReturnDocument.AFTER,
+    )
+    document_cache.personas.invalidate(persona_id)
+    return persona
+
 @api_router.post("/personas/{persona_id}/enrich")
 async def enrich_persona_with_data_sources(persona_id: str):
     """Enrich persona with data from SEMRush, SparkToro, and Buzzabout.ai"""
     try:
-        # Get the persona data
-        persona = await db.personas.find_one({"id": persona_id})
-        if not persona:
+        # Only the fields the data sources read
+        persona = await db.personas.find_one({"id": persona_id}, ENRICHMENT_INPUT_PROJECTION)
+        if persona is None:
             raise HTTPException(status_code=404, detail="Persona not found")
         
         # Get enriched data from data sources
         enriched_data = await data_sources.enrich_persona_data(persona)
         
-        # Update persona with enriched data
-        update_data = {
-            "data_enrichment": enriched_data,
-            "updated_at": datetime.utcnow()
-        }
-        
-        await db.personas.update_one(
-            {"id": persona_id},
-            {"$set": update_data}
+        # Update persona with enriched data and return it; the enrichment
+        # blob is not part of PersonaData, so it is not sent back
+        updated_persona = await _store_enrichment(
+            persona_id, enriched_data, _enrichment_input_hash(persona),
+            {"_id": False, "data_enrichment": False, "data_enrichment_at": False, "data_enrichment_input": False}
         )
+        if updated_persona is None:
+            raise HTTPException(status_code=404, detail="Persona not found")
+        return model_json_response(persona_codec.decode(updated_persona))
         
-        # Return updated persona
-        updated_persona = await db.personas.find_one({"id": persona_id})
-        return PersonaData(**updated_persona)
-        
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to enrich persona: {str(e)}")
 
 @api_router.get("/personas/{persona_id}/insights")
 async def get_persona_insights(persona_id: str):
-    """Get detailed insights for a persona including data source enrichment"""
+    """
+    Get detailed insights for a persona including data source enrichment.
+    Enrichment younger than ENRICHMENT_TTL_SECONDS, computed from the
+    persona's current attributes, demographics and media consumption, is
+    served as stored; otherwise the persona is enriched again and the
+    result saved.
+    """
     try:
-        persona = await db.personas.find_one({"id": persona_id})
-        if not persona:
+        persona = await db.personas.find_one(
+            {"id": persona_id},
+            {**ENRICHMENT_INPUT_PROJECTION, "data_enrichment": True, "data_enrichment_at": True,
+             "data_enrichment_input": True},
+        )
+        if persona is None:
             raise HTTPException(status_code=404, detail="Persona not found")
         
-        # Check if persona has enriched data
-        enriched_data = persona.get("data_enrichment")
-        if not enriched_data:
-            # Enrich the persona first
+        if _enrichment_is_fresh(persona):
+            enriched_data = persona["data_enrichment"]
+        else:
             enriched_data = await data_sources.enrich_persona_data(persona)
-            await db.personas.update_one(
-                {"id": persona_id},
-                {"$set": {
-                    "data_enrichment": enriched_data,
-                    "updated_at": datetime.utcnow()
-                }}
+            stored = await _store_enrichment(
+                persona_id, enriched_data, _enrichment_input_hash(persona), {"_id": False, "data_enrichment": True}
             )
+            if stored is None:
+                raise HTTPException(status_code=404, detail="Persona not found")
         
         # Structure insights for frontend consumption
         insights = {
@@ -1726,6 +1919,8 @@ async def get_persona_insights(persona_id: str):
         
         return insights
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get persona insights: {str(e)}")
 
@@ -1808,47 +2003,9 @@ Provide actionable insights for marketing teams.
         if data_sources.get('resonate', {}).get('data'):
             resonate_data = data_sources['resonate']['data']
             
-            # Extract demographics
+            # Extract demographics (defaults plus actual data)
             if 'demographics' in resonate_data:
-                demo_data = resonate_data['demographics']
-                
-                # Set defaults and extract actual data
-                demographics.age_range = AgeRange.millennial
-                demographics.gender = 'Female'
-                demographics.location = 'Urban'
-                demographics.occupation = 'Professional'
-                demographics.income_range = '$50,000 - $99,999'
-                demographics.education = "Bachelor's Degree"
-                
-                # Extract from actual data
-                for key, value in demo_data.items():
-                    if isinstance(value, dict) and 'top_values' in value:
-                        top_values = list(value['top_values'].keys())
-                        if top_values:
-                            if 'age' in key.lower():
-                                age_value = top_values[0]
-                                if '18-24' in age_value:
-                                    demographics.age_range = AgeRange.gen_z
-                                elif '25-40' in age_value or '25-34' in age_value:
-                                    demographics.age_range = AgeRange.millennial
-                                elif '41-56' in age_value or '35-44' in age_value:
-                                    demographics.age_range = AgeRange.gen_x
-                                elif '57-75' in age_value:
-                                    demographics.age_range = AgeRange.boomer
-                            elif 'gender' in key.lower():
-                                gender_value = top_values[0].lower()
-                                if 'female' in gender_value:
-                                    demographics.gender = 'Female'
-                                elif 'male' in gender_value:
-                                    demographics.gender = 'Male'
-                            elif 'income' in key.lower():
-                                demographics.income_range = top_values[0]
-                            elif 'education' in key.lower():
-                                demographics.education = top_values[0]
-                            elif 'location' in key.lower():
-                                demographics.location = top_values[0]
-                            elif 'occupation' in key.lower():
-                                demographics.occupation = top_values[0]
+                demographics = _extract_demographics_from_resonate(resonate_data)
             
             # Extract media consumption
             if 'media_consumption' in resonate_data:
@@ -1905,7 +2062,7 @@ Provide actionable insights for marketing teams.
         return {
             "success": True,
             "message": "AI persona generated successfully",
-            "persona": generated_persona.dict(),
+            "persona": generated_persona.model_dump(),
             "ai_prompt_used": ai_prompt,
             "data_sources_count": len([s for s in data_sources.values() if s.get('uploaded')]),
             "generation_timestamp": datetime.utcnow().isoformat()
@@ -1932,15 +2089,19 @@ async def integrate_multi_source_data(request: dict):
         
         # Extract data from each source
         combined_insights = {}
-        ai_prompt_sections = []
+        prompt_builder = persona_prompt_builder()
+        prompt_builder.add_text(f"""
+Create a comprehensive customer persona named "{persona_name}" based on the following multi-source data analysis:
+
+""")
         
         # If we have a persona_id, get the existing persona data
         existing_persona_data = None
         if persona_id:
             try:
-                persona_doc = await db.personas.find_one({"id": persona_id})
+                persona_doc = await find_persona_document(persona_id, fresh=True)
                 if persona_doc:
-                    existing_persona_data = PersonaData(**persona_doc)
+                    existing_persona_data = persona_codec.decode(persona_doc)
                     logging.info(f"Found existing persona data for {persona_id}")
             except Exception as e:
                 logging.warning(f"Could not load existing persona data: {str(e)}")
@@ -1983,15 +2144,11 @@ async def integrate_multi_source_data(request: dict):
                 combined_insights['resonate'] = resonate_data
                 
                 # Build Resonate section of AI prompt
-                resonate_prompt = "RESONATE DATA ANALYSIS:\n"
-                if 'demographics' in resonate_data:
-                    resonate_prompt += f"Demographics: {_format_data_for_prompt(resonate_data['demographics'])}\n"
-                if 'media_consumption' in resonate_data:
-                    resonate_prompt += f"Media Consumption: {_format_data_for_prompt(resonate_data['media_consumption'])}\n"
-                if 'brand_affinity' in resonate_data:
-                    resonate_prompt += f"Brand Preferences: {_format_data_for_prompt(resonate_data['brand_affinity'])}\n"
-                
-                ai_prompt_sections.append(resonate_prompt)
+                prompt_builder.add_section("resonate", "RESONATE DATA ANALYSIS:", (
+                    prompt_budget.flatten_items(resonate_data.get('demographics', {}), "Demographics") +
+                    prompt_budget.flatten_items(resonate_data.get('media_consumption', {}), "Media Consumption") +
+                    prompt_budget.flatten_items(resonate_data.get('brand_affinity', {}), "Brand Preferences")
+                ))
                 logging.info("Resonate data processed successfully")
         except Exception as e:
             logging.error(f"Error processing Resonate data: {str(e)}")
@@ -2005,17 +2162,16 @@ async def integrate_multi_source_data(request: dict):
                 combined_insights['sparktoro'] = sparktoro_data
                 
                 # Build SparkToro section with category analysis
-                sparktoro_prompt = "SPARKTORO AUDIENCE RESEARCH:\n"
+                sparktoro_items = []
                 if 'categories' in sparktoro_data:
                     for category_name, category_data in sparktoro_data['categories'].items():
-                        sparktoro_prompt += f"Category '{category_name}': {category_data.get('row_count', 0)} data points\n"
+                        category_label = f"Category '{category_name}' ({category_data.get('row_count', 0)} data points)"
                         if 'top_values' in category_data:
                             for column, values in category_data['top_values'].items():
                                 if isinstance(values, dict):
-                                    top_items = [str(k) for k in list(values.keys())[:3]]
-                                    sparktoro_prompt += f"  {column}: {', '.join(top_items)}\n"
+                                    sparktoro_items.extend(prompt_budget.ranked_items(f"{category_label} {column}", values))
                 
-                ai_prompt_sections.append(sparktoro_prompt)
+                prompt_builder.add_section("sparktoro", "\nSPARKTORO AUDIENCE RESEARCH:", sparktoro_items)
                 logging.info("SparkToro data processed successfully")
         except Exception as e:
             logging.error(f"Error processing SparkToro data: {str(e)}")
@@ -2029,18 +2185,16 @@ async def integrate_multi_source_data(request: dict):
                 combined_insights['semrush'] = semrush_data
                 
                 # Build SEMRush section with keyword analysis
-                semrush_prompt = "SEMRUSH SEARCH BEHAVIOR:\n"
+                semrush_items = []
                 if 'keyword_data' in semrush_data:
                     for sheet_name, sheet_data in semrush_data['keyword_data'].items():
-                        semrush_prompt += f"Sheet '{sheet_name}': {sheet_data.get('row_count', 0)} keywords\n"
+                        sheet_label = f"Sheet '{sheet_name}' ({sheet_data.get('row_count', 0)} keywords)"
                         if 'keywords' in sheet_data:
                             for column, keywords in sheet_data['keywords'].items():
                                 if keywords:
-                                    # Convert all items to strings to avoid join() errors
-                                    keyword_strings = [str(k) for k in keywords[:5]]
-                                    semrush_prompt += f"  {column}: {', '.join(keyword_strings)}\n"
+                                    semrush_items.extend(prompt_budget.ranked_items(f"{sheet_label} {column}", keywords))
                 
-                ai_prompt_sections.append(semrush_prompt)
+                prompt_builder.add_section("semrush", "\nSEMRUSH SEARCH BEHAVIOR:", semrush_items)
                 logging.info("SEMRush data processed successfully")
         except Exception as e:
             logging.error(f"Error processing SEMRush data: {str(e)}")
@@ -2054,45 +2208,35 @@ async def integrate_multi_source_data(request: dict):
                 combined_insights['buzzabout'] = buzzabout_data
                 
                 # Build Buzzabout section with actual crawled content
-                buzzabout_prompt = "BUZZABOUT.AI SOCIAL SENTIMENT:\n"
+                buzzabout_items = []
                 if 'social_sentiment' in buzzabout_data:
                     sentiment_data = buzzabout_data['social_sentiment']
                     
-                    if 'trending_topics' in sentiment_data and sentiment_data['trending_topics']:
-                        # Ensure all topics are strings
-                        topics = [str(topic) for topic in sentiment_data['trending_topics'][:5]]
-                        buzzabout_prompt += f"Trending Topics: {', '.join(topics)}\n"
+                    if sentiment_data.get('trending_topics'):
+                        buzzabout_items.extend(prompt_budget.ranked_items("Trending Topics", sentiment_data['trending_topics']))
                         
                     if 'sentiment_analysis' in sentiment_data:
                         sentiment = sentiment_data['sentiment_analysis']
                         if isinstance(sentiment, dict) and 'positive' in sentiment:
-                            buzzabout_prompt += f"Sentiment Distribution: {sentiment}\n"
+                            buzzabout_items.extend(prompt_budget.ranked_items("Sentiment Distribution", str(sentiment)))
                     
-                    if 'social_mentions' in sentiment_data and sentiment_data['social_mentions']:
-                        # Ensure all mentions are strings  
-                        mentions = [str(mention) for mention in sentiment_data['social_mentions'][:5]]
-                        buzzabout_prompt += f"Social Mentions: {', '.join(mentions)}\n"
+                    if sentiment_data.get('social_mentions'):
+                        buzzabout_items.extend(prompt_budget.ranked_items("Social Mentions", sentiment_data['social_mentions']))
                         
-                    if 'hashtags' in sentiment_data and sentiment_data['hashtags']:
-                        # Ensure all hashtags are strings
-                        hashtags = [str(tag) for tag in sentiment_data['hashtags'][:5]]
-                        buzzabout_prompt += f"Key Hashtags: {', '.join(hashtags)}\n"
+                    if sentiment_data.get('hashtags'):
+                        buzzabout_items.extend(prompt_budget.ranked_items("Key Hashtags", sentiment_data['hashtags']))
                 
                 if 'source_url' in buzzabout_data:
-                    buzzabout_prompt += f"Source URL: {buzzabout_data['source_url']}\n"
+                    buzzabout_items.extend(prompt_budget.ranked_items("Source URL", buzzabout_data['source_url']))
                 
-                ai_prompt_sections.append(buzzabout_prompt)
+                prompt_builder.add_section("buzzabout", "\nBUZZABOUT.AI SOCIAL SENTIMENT:", buzzabout_items)
                 logging.info("Buzzabout data processed successfully")
         except Exception as e:
             logging.error(f"Error processing Buzzabout data: {str(e)}")
             raise e
         
-        # Create comprehensive AI prompt
-        ai_prompt = f"""
-Create a comprehensive customer persona named "{persona_name}" based on the following multi-source data analysis:
-
-{chr(10).join(ai_prompt_sections)}
-
+        # Create comprehensive AI prompt, packing source data into the token budget
+        prompt_builder.add_text("""
 SYNTHESIS REQUIREMENTS:
 1. Demographic Profile: Extract and synthesize age, gender, income, location, education, occupation
 2. Behavioral Patterns: Identify key behaviors, preferences, and decision-making patterns
@@ -2107,7 +2251,10 @@ DELIVERABLE:
 Provide a detailed, actionable persona profile that marketing teams can use for targeting, messaging, and campaign development. Include specific recommendations for content strategy, channel selection, and messaging frameworks.
 
 Focus on creating a cohesive narrative that combines insights from all data sources into a single, comprehensive persona that represents the target audience's complete behavioral and demographic profile.
-"""
+""")
+        prompt_result = prompt_builder.build()
+        ai_prompt = prompt_result.prompt
+        logging.info(f"Integration prompt built: {prompt_result.token_count}/{prompt_result.budget} tokens")
         
         # Prepare demographic insights summary
         demographic_insights = {}
@@ -2142,6 +2289,8 @@ Focus on creating a cohesive narrative that combines insights from all data sour
                 "integration_timestamp": datetime.utcnow().isoformat()
             },
             "ai_prompt": ai_prompt,
+            "prompt_tokens": prompt_result.token_count,
+            "prompt_budget": prompt_result.report(),
             "raw_data": combined_insights
         }
         
@@ -2220,14 +2369,27 @@ async def upload_resonate_file(file: UploadFile = File(...)):
             raise HTTPException(status_code=400, detail="Only ZIP files are supported for data processing")
         
         # Save uploaded file to temporary location
+        content = await file.read()
+        if len(content) > ZIP_MAX_TOTAL_BYTES:
+            raise HTTPException(
+                status_code=413,
+                detail={
+                    "error": "Uploaded archive is too large",
+                    "limit_exceeded": {
+                        "reason": "upload_size",
+                        "actual": len(content),
+                        "limit": ZIP_MAX_TOTAL_BYTES
+                    }
+                }
+            )
+        
         with tempfile.NamedTemporaryFile(delete=False, suffix='.zip') as temp_file:
-            content = await file.read()
             temp_file.write(content)
             temp_file_path = temp_file.name
         
         try:
             # Parse the ZIP file
-            parsing_result = parse_resonate_zip(temp_file_path)
+            parsing_result = metrics.timed(metrics.FILE_PARSE, "zip", parse_resonate_zip, temp_file_path)
             
             if parsing_result['success']:
                 return {
@@ -2236,9 +2398,18 @@ async def upload_resonate_file(file: UploadFile = File(...)):
                     "extracted_files": parsing_result['extracted_files'],
                     "parsed_data": parsing_result['parsed_data']
                 }
+            elif parsing_result.get('limit_exceeded'):
+                # Archive was rejected from its central directory before extraction
+                raise HTTPException(
+                    status_code=parsing_result.get('status_code', 413),
+                    detail={
+                        "error": parsing_result['error'],
+                        "limit_exceeded": parsing_result['limit_exceeded']
+                    }
+                )
             else:
                 raise HTTPException(
-                    status_code=422, 
+                    status_code=parsing_result.get('status_code', 422), 
                     detail=f"Failed to parse file: {parsing_result.get('error', 'Unknown error')}"
                 )
                 
@@ -2272,37 +2443,8 @@ async def create_persona_from_resonate(request: dict):
         brand_preferences = []
         interests = []
         
-        # Extract demographics
-        if 'demographics' in parsed_data:
-            demo_data = parsed_data['demographics']
-            for key, value in demo_data.items():
-                if isinstance(value, dict) and 'top_values' in value:
-                    top_values = list(value['top_values'].keys())
-                    if top_values:
-                        if 'age' in key.lower():
-                            age_value = top_values[0]
-                            if '18-24' in age_value:
-                                demographics.age_range = AgeRange.gen_z
-                            elif '25-40' in age_value or '25-34' in age_value or '35-44' in age_value:
-                                demographics.age_range = AgeRange.millennial
-                            elif '41-56' in age_value or '45-54' in age_value:
-                                demographics.age_range = AgeRange.gen_x
-                            elif '57-75' in age_value or '55-64' in age_value or '65+' in age_value:
-                                demographics.age_range = AgeRange.boomer
-                        elif 'gender' in key.lower():
-                            gender_value = top_values[0].lower()
-                            if 'female' in gender_value:
-                                demographics.gender = 'Female'
-                            elif 'male' in gender_value:
-                                demographics.gender = 'Male'
-                        elif 'income' in key.lower():
-                            demographics.income_range = top_values[0]
-                        elif 'education' in key.lower():
-                            demographics.education = top_values[0]
-                        elif 'location' in key.lower() or 'urban' in key.lower():
-                            demographics.location = top_values[0]
-                        elif 'occupation' in key.lower() or 'job' in key.lower():
-                            demographics.occupation = top_values[0]
+        # Demographics are mapped below, once the persona has been created
+        demo_data = parsed_data.get('demographics', {})
         
         # Extract media consumption and social platforms
         media_consumption = MediaConsumption()
@@ -2314,23 +2456,9 @@ async def create_persona_from_resonate(request: dict):
                     if 'social' in key.lower() or 'platform' in key.lower() or 'media' in key.lower():
                         # Extract social media platforms
                         for platform in platforms:
-                            platform_lower = platform.lower()
-                            if 'facebook' in platform_lower:
-                                social_platforms.append('Facebook')
-                            elif 'instagram' in platform_lower:
-                                social_platforms.append('Instagram')
-                            elif 'linkedin' in platform_lower:
-                                social_platforms.append('LinkedIn')
-                            elif 'twitter' in platform_lower or 'x.com' in platform_lower:
-                                social_platforms.append('Twitter/X')
-                            elif 'tiktok' in platform_lower:
-                                social_platforms.append('TikTok')
-                            elif 'youtube' in platform_lower:
-                                social_platforms.append('YouTube')
-                            elif 'snapchat' in platform_lower:
-                                social_platforms.append('Snapchat')
-                            elif 'pinterest' in platform_lower:
-                                social_platforms.append('Pinterest')
+                            normalized_platform = normalization.normalize_platform(platform)
+                            if normalized_platform:
+                                social_platforms.append(normalized_platform)
                     elif 'content' in key.lower() or 'interest' in key.lower():
                         interests.extend(platforms[:5])  # Top 5 interests
         
@@ -2375,90 +2503,15 @@ async def create_persona_from_resonate(request: dict):
         
         # Map parsed Resonate data to persona structure
         if 'demographics' in parsed_data:
-            demo_data = parsed_data['demographics']
-            demographics = Demographics()
-            
-            # Set initial defaults
-            demographics.age_range = AgeRange.millennial  
-            demographics.gender = 'Female'  
-            demographics.location = 'Urban'  
-            demographics.occupation = 'Professional'  
-            demographics.income_range = '$50,000 - $99,999'  
-            demographics.education = "Bachelor's Degree"  
-            
-            print(f"DEBUG: Processing demographics data keys: {list(demo_data.keys())}")
-            
-            # Extract actual demographic data from parsed data
-            if 'age' in demo_data:
-                age_data = demo_data['age']
-                if isinstance(age_data, dict) and 'top_values' in age_data:
-                    top_ages = list(age_data['top_values'].keys())
-                    if top_ages:
-                        # Map to closest AgeRange enum
-                        age_value = top_ages[0]
-                        if '18-24' in age_value:
-                            demographics.age_range = AgeRange.gen_z
-                        elif '25-40' in age_value or '25-34' in age_value:
-                            demographics.age_range = AgeRange.millennial
-                        elif '41-56' in age_value or '35-44' in age_value:
-                            demographics.age_range = AgeRange.gen_x
-                        elif '57-75' in age_value or '45-54' in age_value or '55-64' in age_value:
-                            demographics.age_range = AgeRange.boomer
-                        elif '76' in age_value or '65' in age_value:
-                            demographics.age_range = AgeRange.silent
-            
-            # Extract gender data
-            if 'gender' in demo_data:
-                gender_data = demo_data['gender']
-                if isinstance(gender_data, dict) and 'top_values' in gender_data:
-                    top_genders = list(gender_data['top_values'].keys())
-                    if top_genders:
-                        gender_value = top_genders[0].lower()
-                        if 'female' in gender_value or 'woman' in gender_value:
-                            demographics.gender = 'Female'
-                        elif 'male' in gender_value or 'man' in gender_value:
-                            demographics.gender = 'Male'
-            
-            # Extract income data
-            if 'income' in demo_data:
-                income_data = demo_data['income']
-                if isinstance(income_data, dict) and 'top_values' in income_data:
-                    top_incomes = list(income_data['top_values'].keys())
-                    if top_incomes:
-                        demographics.income_range = top_incomes[0]
-            
-            # Extract education data
-            if 'education' in demo_data:
-                education_data = demo_data['education']
-                if isinstance(education_data, dict) and 'top_values' in education_data:
-                    top_education = list(education_data['top_values'].keys())
-                    if top_education:
-                        demographics.education = top_education[0]
-            
-            # Extract location data
-            if 'location' in demo_data:
-                location_data = demo_data['location']
-                if isinstance(location_data, dict) and 'top_values' in location_data:
-                    top_locations = list(location_data['top_values'].keys())
-                    if top_locations:
-                        demographics.location = top_locations[0]
-            
-            # Extract occupation data
-            if 'occupation' in demo_data:
-                occupation_data = demo_data['occupation']
-                if isinstance(occupation_data, dict) and 'top_values' in occupation_data:
-                    top_occupations = list(occupation_data['top_values'].keys())
-                    if top_occupations:
-                        demographics.occupation = top_occupations[0]
-            
-            persona_data.demographics = demographics
+            logger.debug("Processing demographics data keys: %s", list(demo_data.keys()))
+            persona_data.demographics = _extract_demographics_from_resonate(parsed_data)
         
         # Map media consumption data from Resonate insights
         if 'media_consumption' in parsed_data:
             media_data = parsed_data['media_consumption']
             media_consumption = MediaConsumption()
             
-            print(f"DEBUG: Processing media consumption data keys: {list(media_data.keys())}")
+            logger.debug("Processing media consumption data keys: %s", list(media_data.keys()))
             
             # Extract gender and demographic info that might be in media consumption data
             demographics = persona_data.demographics
@@ -2482,7 +2535,7 @@ async def create_persona_from_resonate(request: dict):
                                         # Check for gender indicators in the data
                                         if any(male_indicator in insight_text + insight_value for male_indicator in ['male', 'man', 'men', 'father', 'dad', 'husband', 'masculine']):
                                             demographics.gender = 'Male'
-                                            print(f"DEBUG: Updated gender to Male from media insight: {insight_text} = {insight_value}")
+                                            logger.debug("Updated gender to Male from media insight: %s = %s", insight_text, insight_value)
                                         
                                         # Extract social media platforms
                                         if 'social media membership' in insight_text:
@@ -2494,9 +2547,8 @@ async def create_persona_from_resonate(request: dict):
                 # Clean up platform names and remove duplicates
                 cleaned_platforms = []
                 for platform in platforms:
-                    if platform.lower() == 'x (formerly known as twitter)':
-                        cleaned_platforms.append('Twitter/X')
-                    elif platform not in cleaned_platforms:
+                    platform = normalization.normalize_platform(platform) or platform
+                    if platform not in cleaned_platforms:
                         cleaned_platforms.append(platform)
                 
                 media_consumption.social_media_platforms = cleaned_platforms[:6]  # Limit to top 6
@@ -2507,8 +2559,8 @@ async def create_persona_from_resonate(request: dict):
             media_consumption.consumption_time = '2-4 hours'
             media_consumption.news_sources = ['Social Media', 'Digital News']
             
-            print(f"DEBUG: Final gender set to: {demographics.gender}")
-            print(f"DEBUG: Extracted platforms: {media_consumption.social_media_platforms}")
+            logger.debug("Final gender set to: %s", demographics.gender)
+            logger.debug("Extracted platforms: %s", media_consumption.social_media_platforms)
             
             persona_data.media_consumption = media_consumption
             persona_data.demographics = demographics  # Update demographics with any findings from media data
@@ -2539,43 +2591,8 @@ async def create_persona_from_resonate(request: dict):
                     if 'top_values' in location_data:
                         top_locations = list(location_data['top_values'].keys())
                         if top_locations:
-                            raw_location = top_locations[0].lower()
                             # Normalize location for image generation
-                            if 'urban' in raw_location or 'city' in raw_location or 'metropolitan' in raw_location:
-                                demographics.location = 'Urban'
-                            elif 'suburban' in raw_location or 'suburb' in raw_location:
-                                demographics.location = 'Suburban'
-                            elif 'rural' in raw_location or 'country' in raw_location:
-                                demographics.location = 'Rural'
-                            else:
-                                # Default based on common location patterns
-                                if any(city in raw_location for city in ['new york', 'chicago', 'los angeles', 'san francisco', 'boston', 'seattle']):
-                                    demographics.location = 'Urban'
-                                else:
-                                    demographics.location = 'Suburban'
-            
-            # Map occupation data with normalization for image generation
-            if 'occupation' in demo_data:
-                occupation_info = demo_data['occupation']
-                if isinstance(occupation_info, list) and len(occupation_info) > 0:
-                    occupation_data = occupation_info[0].get('data', {})
-                    if 'top_values' in occupation_data:
-                        top_occupations = list(occupation_data['top_values'].keys())
-                        if top_occupations:
-                            raw_occupation = top_occupations[0].lower()
-                            # Normalize occupation for better image generation
-                            if 'manager' in raw_occupation or 'director' in raw_occupation or 'executive' in raw_occupation:
-                                demographics.occupation = 'Executive'
-                            elif 'engineer' in raw_occupation or 'developer' in raw_occupation or 'tech' in raw_occupation:
-                                demographics.occupation = 'Technology Professional'
-                            elif 'marketing' in raw_occupation or 'sales' in raw_occupation:
-                                demographics.occupation = 'Marketing Professional'
-                            elif 'analyst' in raw_occupation or 'finance' in raw_occupation:
-                                demographics.occupation = 'Financial Analyst'
-                            elif 'consultant' in raw_occupation:
-                                demographics.occupation = 'Business Consultant'
-                            else:
-                                demographics.occupation = 'Professional'
+                            demographics.location = normalization.normalize_location(top_locations[0]) or 'Suburban'
             
             # Map occupation data
             if 'occupation' in demo_data:
@@ -2657,7 +2674,7 @@ async def create_persona_from_resonate(request: dict):
         persona_data.current_step = 5  # Go to review step
         
         # Insert into database
-        await db.personas.insert_one(persona_data.dict())
+        await db.personas.insert_one(persona_codec.encode(persona_data))
         
         return {
             "success": True,
@@ -2738,7 +2755,7 @@ async def upload_sparktoro_data(file: UploadFile = File(...)):
             if file.filename.lower().endswith(('.xlsx', '.xls')):
                 try:
                     # Read all sheets from the Excel file
-                    excel_file = pd.ExcelFile(file_path)
+                    excel_file = metrics.timed(metrics.FILE_PARSE, "xlsx", pd.ExcelFile, file_path)
                     sheet_names = excel_file.sheet_names
                     
                     logging.info(f"Found {len(sheet_names)} tabs in SparkToro Excel file: {sheet_names}")
@@ -2754,7 +2771,7 @@ async def upload_sparktoro_data(file: UploadFile = File(...)):
                     # Parse each tab as a category
                     for sheet_name in sheet_names:
                         try:
-                            df = pd.read_excel(file_path, sheet_name=sheet_name)
+                            df = metrics.timed(metrics.FILE_PARSE, "xlsx", pd.read_excel, file_path, sheet_name=sheet_name)
                             
                             # Extract meaningful data from each tab
                             category_data = {
@@ -2800,7 +2817,7 @@ async def upload_sparktoro_data(file: UploadFile = File(...)):
             elif file.filename.lower().endswith('.csv'):
                 try:
                     # Handle CSV files
-                    df = pd.read_csv(file_path)
+                    df = metrics.timed(metrics.FILE_PARSE, "csv", pd.read_csv, file_path)
                     parsed_data = {
                         "source_type": "sparktoro",
                         "file_name": file.filename,
@@ -2867,9 +2884,39 @@ async def direct_generate_persona_from_files(
     persona_name: str = Form(...),
     sparktoro_file: Optional[UploadFile] = File(None),
     semrush_file: Optional[UploadFile] = File(None),
-    buzzabout_url: Optional[str] = Form(None)
+    buzzabout_url: Optional[str] = Form(None),
+    idempotency_key: Optional[str] = Header(None)
 ):
-    """Direct persona generation from uploaded files - bypass complex workflow"""
+    """
+    Direct persona generation from uploaded files - bypass complex workflow.
+    Identical concurrent requests share one generation; with an
+    Idempotency-Key header a successful result is replayed on retry.
+    """
+    key = _idempotency_key(idempotency_key)
+    files = []
+    for upload in (sparktoro_file, semrush_file):
+        if upload:
+            files.append([upload.filename, hashlib.sha256(await upload.read()).hexdigest()])
+            await upload.seek(0)
+        else:
+            files.append(None)
+
+    async def compute():
+        result = await _direct_generate_persona(persona_name, sparktoro_file, semrush_file, buzzabout_url)
+        # An AI failure is reported in the body; let a retry try again
+        return ORJSONResponse(result), result.get("success", False)
+
+    return await idempotency.run(
+        db, "direct-generate", key,
+        idempotency.fingerprint(persona_name, files, buzzabout_url), compute,
+    )
+
+async def _direct_generate_persona(
+    persona_name: str,
+    sparktoro_file: Optional[UploadFile],
+    semrush_file: Optional[UploadFile],
+    buzzabout_url: Optional[str]
+) -> dict:
     try:
         logging.info(f"Direct persona generation for: {persona_name}")
         
@@ -2895,18 +2942,18 @@ async def direct_generate_persona_from_files(
                 
                 # Parse Excel file directly
                 import pandas as pd
-                excel_file = pd.ExcelFile(file_path)
+                excel_file = metrics.timed(metrics.FILE_PARSE, "xlsx", pd.ExcelFile, file_path)
                 
                 sparktoro_summary = {}
-                for sheet_name in excel_file.sheet_names[:10]:  # Process top 10 sheets
+                for sheet_name in excel_file.sheet_names:
                     try:
-                        df = pd.read_excel(file_path, sheet_name=sheet_name)
+                        df = metrics.timed(metrics.FILE_PARSE, "xlsx", pd.read_excel, file_path, sheet_name=sheet_name)
                         if not df.empty:
                             # Extract top values from each column
                             sheet_data = {}
-                            for column in df.columns[:5]:  # Top 5 columns per sheet
+                            for column in df.columns:
                                 if df[column].dtype == 'object':
-                                    top_values = df[column].value_counts().head(5).to_dict()
+                                    top_values = df[column].value_counts().head(DIRECT_EXTRACT_TOP_VALUES).to_dict()
                                     if top_values:
                                         sheet_data[str(column)] = top_values
                             
@@ -2934,14 +2981,14 @@ async def direct_generate_persona_from_files(
                 
                 # Parse CSV file directly
                 import pandas as pd
-                df = pd.read_csv(file_path)
+                df = metrics.timed(metrics.FILE_PARSE, "csv", pd.read_csv, file_path)
                 
                 semrush_summary = {}
                 # Extract keywords from relevant columns
                 keyword_columns = [col for col in df.columns if any(term in col.lower() for term in ['keyword', 'query', 'term'])]
                 
-                for column in keyword_columns[:3]:  # Top 3 keyword columns
-                    keywords = df[column].dropna().head(20).tolist()
+                for column in keyword_columns:
+                    keywords = df[column].dropna().head(DIRECT_EXTRACT_KEYWORDS).tolist()
                     if keywords:
                         semrush_summary[str(column)] = [str(k) for k in keywords]
                 
@@ -2959,7 +3006,8 @@ async def direct_generate_persona_from_files(
                 from bs4 import BeautifulSoup
                 
                 headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
-                response = requests.get(buzzabout_url, headers=headers, timeout=15)
+                with metrics.stage_timer(metrics.CRAWLER_FETCH, "buzzabout"):
+                    response = requests.get(buzzabout_url, headers=headers, timeout=15)
                 
                 if response.status_code == 200:
                     soup = BeautifulSoup(response.content, 'html.parser')
@@ -2973,7 +3021,7 @@ async def direct_generate_persona_from_files(
                         if len(topic) > 3:
                             topic_counts[topic] = topic_counts.get(topic, 0) + 1
                     
-                    trending_topics = sorted(topic_counts.items(), key=lambda x: x[1], reverse=True)[:10]
+                    trending_topics = sorted(topic_counts.items(), key=lambda x: x[1], reverse=True)[:DIRECT_EXTRACT_TOPICS]
                     
                     real_data["buzzabout_insights"] = {
                         "trending_topics": [topic for topic, count in trending_topics],
@@ -2985,29 +3033,38 @@ async def direct_generate_persona_from_files(
             except Exception as e:
                 logging.warning(f"Error processing Buzzabout URL: {str(e)}")
         
-        # Create concise OpenAI prompt (avoid token limits)
-        prompt = f"""
+        # Create OpenAI prompt, packing the highest-signal data into the token budget
+        system_prompt = "You are a marketing analyst. Return only valid JSON."
+        prompt_builder = prompt_budget.PromptBuilder(
+            prompt_budget.prompt_budget_for(max_completion_tokens=1500, system_prompt=system_prompt)
+        )
+        prompt_builder.add_text(f"""
 Create a customer persona for "{persona_name}" based on this real data:
 
-AUDIENCE DATA:"""
+AUDIENCE DATA:""")
 
         if real_data["sparktoro_insights"]:
-            prompt += f"\nSparkToro ({len(real_data['sparktoro_insights'])} categories):"
-            for category, data in list(real_data["sparktoro_insights"].items())[:3]:  # Top 3 categories
-                for column, values in list(data.items())[:2]:  # Top 2 columns per category
-                    top_items = list(values.keys())[:3]  # Top 3 items
-                    prompt += f"\n- {category} {column}: {', '.join(top_items)}"
+            sparktoro_items = []
+            for category, data in real_data["sparktoro_insights"].items():
+                for column, values in data.items():
+                    sparktoro_items.extend(prompt_budget.ranked_items(f"{category} {column}", values))
+            prompt_builder.add_section(
+                "sparktoro", f"\nSparkToro ({len(real_data['sparktoro_insights'])} categories):", sparktoro_items
+            )
 
         if real_data["semrush_insights"]:
-            prompt += f"\nSEMRush Keywords:"
-            for column, keywords in list(real_data["semrush_insights"].items())[:2]:  # Top 2 columns
-                prompt += f"\n- {column}: {', '.join(keywords[:5])}"  # Top 5 keywords
-
-        if real_data["buzzabout_insights"]:
-            if real_data["buzzabout_insights"].get("trending_topics"):
-                prompt += f"\nSocial Trends: {', '.join(real_data['buzzabout_insights']['trending_topics'][:5])}"
+            semrush_items = []
+            for column, keywords in real_data["semrush_insights"].items():
+                semrush_items.extend(prompt_budget.ranked_items(column, keywords))
+            prompt_builder.add_section("semrush", "\nSEMRush Keywords:", semrush_items)
+
+        if real_data["buzzabout_insights"].get("trending_topics"):
+            prompt_builder.add_section(
+                "buzzabout", "\nSocial Trends:",
+                prompt_budget.ranked_items("", real_data["buzzabout_insights"]["trending_topics"])
+            )
 
-        prompt += """
+        prompt_builder.add_text("""
 
 Return JSON only:
 {
@@ -3018,28 +3075,25 @@ Return JSON only:
   "recommendations": [6 recommendations from real data],
   "pain_points": [5 pain points from search patterns],
   "goals": [5 goals from interests/keywords]
-}"""
+}""")
+        prompt_result = prompt_builder.build()
+        prompt = prompt_result.prompt
         
         # Send to OpenAI for analysis
-        logging.info(f"Sending concise prompt to OpenAI ({len(prompt)} characters)")
+        logging.info(f"Sending prompt to OpenAI ({len(prompt)} characters, {prompt_result.token_count} tokens)")
         
         try:
-            import openai
-            from openai import OpenAI
-            import json
-            import os
-            
-            client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-            
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",  # Use faster, cheaper model with higher limits
-                messages=[
-                    {"role": "system", "content": "You are a marketing analyst. Return only valid JSON."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=1500,
-                temperature=0.7
-            )
+            with llm_accounting.persona_context(starting_method="direct_upload"):
+                response = await openai_scheduler.chat_completion(
+                    _estimate_chat_tokens(prompt, system_prompt, 1500),
+                    model="gpt-3.5-turbo",  # Use faster, cheaper model with higher limits
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": prompt}
+                    ],
+                    max_tokens=1500,
+                    temperature=0.7
+                )
             
             response_text = response.choices[0].message.content.strip()
             persona_data = json.loads(response_text)
@@ -3055,7 +3109,9 @@ Return JSON only:
                     "semrush": bool(real_data["semrush_insights"]),
                     "buzzabout": bool(real_data["buzzabout_insights"])
                 },
-                "prompt_size": len(prompt)
+                "prompt_size": len(prompt),
+                "prompt_tokens": prompt_result.token_count,
+                "prompt_budget": prompt_result.report()
             }
             
         except Exception as e:
@@ -3082,6 +3138,7 @@ async def save_sparktoro_to_persona(persona_id: str, request: dict):
             {"id": persona_id},
             {"$set": {"sparktoro_data": parsed_data}}
         )
+        document_cache.personas.invalidate(persona_id)
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Persona not found")
@@ -3123,7 +3180,7 @@ async def upload_semrush_data(file: UploadFile = File(...)):
             try:
                 if file.filename.lower().endswith(('.xlsx', '.xls')):
                     # Read Excel file
-                    excel_file = pd.ExcelFile(file_path)
+                    excel_file = metrics.timed(metrics.FILE_PARSE, "xlsx", pd.ExcelFile, file_path)
                     sheet_names = excel_file.sheet_names
                     
                     logging.info(f"Found {len(sheet_names)} tabs in SEMRush Excel file: {sheet_names}")
@@ -3139,7 +3196,7 @@ async def upload_semrush_data(file: UploadFile = File(...)):
                     # Parse each sheet
                     for sheet_name in sheet_names:
                         try:
-                            df = pd.read_excel(file_path, sheet_name=sheet_name)
+                            df = metrics.timed(metrics.FILE_PARSE, "xlsx", pd.read_excel, file_path, sheet_name=sheet_name)
                             
                             sheet_data = {
                                 "sheet_name": sheet_name,
@@ -3176,7 +3233,7 @@ async def upload_semrush_data(file: UploadFile = File(...)):
                             
                 elif file.filename.lower().endswith('.csv'):
                     # Read CSV file
-                    df = pd.read_csv(file_path)
+                    df = metrics.timed(metrics.FILE_PARSE, "csv", pd.read_csv, file_path)
                     
                     parsed_data = {
                         "source_type": "semrush", 
@@ -3270,7 +3327,8 @@ async def crawl_buzzabout_url(request: dict):
                 'Connection': 'keep-alive',
             }
             
-            response = requests.get(report_url, headers=headers, timeout=30)
+            with metrics.stage_timer(metrics.CRAWLER_FETCH, "buzzabout"):
+                response = requests.get(report_url, headers=headers, timeout=30)
             response.raise_for_status()
             
             # Parse the HTML content
@@ -3599,13 +3657,69 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
+# Startup work that must not delay serving the first request
+_startup_tasks = set()
+
+def _run_after_startup(coro):
+    task = asyncio.create_task(coro)
+    _startup_tasks.add(task)
+    task.add_done_callback(_startup_tasks.discard)
+
+async def ensure_indexes():
+    # Retried until Mongo is reachable; /health/ready waits for it
+    delay = 1.0
+    while True:
+        try:
+            await llm_accounting.ensure_indexes(db)
+            await persona_snapshots.ensure_indexes(db)
+            await pdf_export.ensure_indexes(db)
+            await idempotency.ensure_indexes(db)
+            _startup_state["indexes"] = True
+            return
+        except Exception as e:
+            logging.warning(f"Could not ensure indexes, retrying in {delay:.0f}s: {str(e)}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30.0)
+
+async def warm_up_parsers():
+    try:
+        seconds = await asyncio.to_thread(file_parsers.warm_up)
+        logger.info(f"Parser libraries imported in {seconds:.2f}s")
+    except Exception as e:
+        logging.warning(f"Parser warm-up failed: {str(e)}")
+
+async def warm_up_tokenizer():
+    # The first load may download the BPE file; do it before the first prompt, off the event loop
+    try:
+        seconds = await asyncio.to_thread(prompt_budget.warm_up)
+        logger.info(f"Tokenizer loaded in {seconds:.2f}s")
+    except Exception as e:
+        logging.warning(f"Tokenizer warm-up failed: {str(e)}")
+
+async def construct_openai_client():
+    # Importing openai takes a moment; do it off the event loop
+    try:
+        await asyncio.to_thread(openai_scheduler.get_client)
+    except Exception as e:
+        logging.warning(f"Could not construct OpenAI client: {str(e)}")
+
+@app.on_event("startup")
+async def start_background_startup_tasks():
+    # Index creation waits on Mongo server selection, so it runs in the
+    # background instead of holding up uvicorn's startup
+    _run_after_startup(ensure_indexes())
+    if WARM_UP_IMPORTS:
+        _run_after_startup(warm_up_parsers())
+        _run_after_startup(warm_up_tokenizer())
+    _run_after_startup(construct_openai_client())
+    _run_after_startup(document_cache.watch(db))
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
+    for task in list(_startup_tasks):
+        task.cancel()
+    pdf_export.shutdown()
+    database.close()
+    tracing.shutdown()
@@ -0,0 +1,352 @@
+"""
+Google Slides export of generated personas
+build_batch_update() turns a persona into the complete body of one
+presentations.batchUpdate call: six slides with their text boxes, headshot
+image, layout and BCM styling. Object ids are derived from the content hash,
+so the client creates a presentation, sends this body in a single
+batchUpdate (plus a deleteObject for the presentation's default slide) and
+is done.
+
+The builder is a pure function of slides_input(), with no API calls, so it
+can be checked offline against a stored body:
+
+    python slides_export.py ../tests/fixtures/slides_persona.json \\
+        --check ../tests/fixtures/slides_batch_update.json
+
+Bodies are cached per worker (SLIDES_CACHE_SIZE entries) by generated
+persona id + content hash (and BUILDER_VERSION), which is also the ETag.
+"""
+
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import orjson
+
+import metrics
+
+
+# Bump when the layout changes, so cached bodies and ETags are replaced
+BUILDER_VERSION = "1"
+
+SLIDES_CACHE_SIZE = int(os.environ.get("SLIDES_CACHE_SIZE", 256))
+
+# Default 16:9 page, in points
+PAGE_WIDTH = 720
+PAGE_HEIGHT = 405
+_MARGIN = 36
+_BAND_HEIGHT = 70
+
+_BCM_ORANGE = "#FF9900"
+_BCM_TEAL = "#004F5E"
+_WHITE = "#FFFFFF"
+_GRAY_800 = "#1F2937"
+_GRAY_600 = "#4B5563"
+_FONT = "Arial"
+
+# Bullets per text box and characters per bullet, so text stays on the slide
+_MAX_ITEMS = 6
+_MAX_ITEM_LENGTH = 160
+
+DATA_SOURCES = ["Resonate rAI", "SparkToro", "SEMRush", "Buzzabout.ai"]
+
+
+def slides_input(generated_persona: Dict[str, Any]) -> Dict[str, Any]:
+    """The fields of a GeneratedPersona (as JSON-mode data) that appear on the slides"""
+    persona_data = generated_persona.get("persona_data") or {}
+    attributes = persona_data.get("attributes") or {}
+    return {
+        "id": generated_persona.get("id") or persona_data.get("id"),
+        "name": persona_data.get("name") or generated_persona.get("name"),
+        "persona_image_url": generated_persona.get("persona_image_url"),
+        "demographics": persona_data.get("demographics") or {},
+        "vertical": attributes.get("selectedVertical"),
+        "behaviors": attributes.get("selectedBehaviors") or attributes.get("behaviors") or [],
+        "social_media_platforms": (persona_data.get("media_consumption") or {}).get("social_media_platforms") or [],
+        "communication_style": generated_persona.get("communication_style") or "",
+        "ai_insights": generated_persona.get("ai_insights") or {},
+        "pain_points": generated_persona.get("pain_points") or [],
+        "goals": generated_persona.get("goals") or [],
+        "recommendations": generated_persona.get("recommendations") or [],
+    }
+
+
+def content_hash(data: Dict[str, Any]) -> str:
+    canonical = orjson.dumps([BUILDER_VERSION, data], option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+    return hashlib.sha256(canonical).hexdigest()
+
+
+# --- Builder ---
+
+def _rgb(hex_color: str) -> Dict[str, float]:
+    value = hex_color.lstrip("#")
+    red, green, blue = (int(value[i:i + 2], 16) / 255 for i in (0, 2, 4))
+    return {"red": round(red, 4), "green": round(green, 4), "blue": round(blue, 4)}
+
+
+def _label(key: str) -> str:
+    return key.replace("_", " ").strip().title()
+
+
+def _items(value: Any) -> List[str]:
+    """Display strings for a list, dict or scalar value, capped to fit a text box"""
+    if isinstance(value, dict):
+        items = [f"{_label(str(k))}: {v}" for k, v in value.items() if v not in (None, "", [], {})]
+    elif isinstance(value, list):
+        items = [str(item) for item in value if item not in (None, "", [], {})]
+    elif value not in (None, ""):
+        items = [str(value)]
+    else:
+        items = []
+    items = [item if len(item) <= _MAX_ITEM_LENGTH else item[:_MAX_ITEM_LENGTH - 1] + "…" for item in items]
+    return items[:_MAX_ITEMS]
+
+
+class _Deck:
+    """Accumulates the batchUpdate requests of one presentation"""
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self.requests: List[Dict[str, Any]] = []
+        self._slides = 0
+
+    def _element(self, page_id: str, x: float, y: float, width: float, height: float) -> Dict[str, Any]:
+        return {
+            "pageObjectId": page_id,
+            "size": {"width": {"magnitude": width, "unit": "PT"}, "height": {"magnitude": height, "unit": "PT"}},
+            "transform": {"scaleX": 1, "scaleY": 1, "translateX": x, "translateY": y, "unit": "PT"},
+        }
+
+    def slide(self, background: Optional[str] = None) -> str:
+        self._slides += 1
+        page_id = f"{self.prefix}_s{self._slides}"
+        self.requests.append({"createSlide": {
+            "objectId": page_id,
+            "insertionIndex": self._slides - 1,
+            "slideLayoutReference": {"predefinedLayout": "BLANK"},
+        }})
+        if background:
+            self.requests.append({"updatePageProperties": {
+                "objectId": page_id,
+                "pageProperties": {"pageBackgroundFill": {"solidFill": {"color": {"rgbColor": _rgb(background)}}}},
+                "fields": "pageBackgroundFill.solidFill.color",
+            }})
+        return page_id
+
+    def shape(self, page_id: str, role: str, kind: str, box: tuple, fill: Optional[str] = None,
+              align: Optional[str] = None) -> str:
+        object_id = f"{page_id}_{role}"
+        self.requests.append({"createShape": {
+            "objectId": object_id,
+            "shapeType": kind,
+            "elementProperties": self._element(page_id, *box),
+        }})
+        properties, fields = {}, []
+        if fill:
+            properties["shapeBackgroundFill"] = {"solidFill": {"color": {"rgbColor": _rgb(fill)}}}
+            properties["outline"] = {"propertyState": "NOT_RENDERED"}
+            fields += ["shapeBackgroundFill.solidFill.color", "outline.propertyState"]
+        if align:
+            properties["contentAlignment"] = align
+            fields.append("contentAlignment")
+        if fields:
+            self.requests.append({"updateShapeProperties": {
+                "objectId": object_id, "shapeProperties": properties, "fields": ",".join(fields),
+            }})
+        return object_id
+
+    def text(self, page_id: str, role: str, box: tuple, text: str, size: float, color: str,
+             bold: bool = False, bullets: bool = False, align: Optional[str] = None, centered: bool = False):
+        object_id = self.shape(page_id, role, "TEXT_BOX", box, align=align)
+        self.requests.append({"insertText": {"objectId": object_id, "insertionIndex": 0, "text": text}})
+        self.requests.append({"updateTextStyle": {
+            "objectId": object_id,
+            "textRange": {"type": "ALL"},
+            "style": {
+                "fontFamily": _FONT,
+                "fontSize": {"magnitude": size, "unit": "PT"},
+                "bold": bold,
+                "foregroundColor": {"opaqueColor": {"rgbColor": _rgb(color)}},
+            },
+            "fields": "fontFamily,fontSize,bold,foregroundColor",
+        }})
+        if centered:
+            self.requests.append({"updateParagraphStyle": {
+                "objectId": object_id,
+                "textRange": {"type": "ALL"},
+                "style": {"alignment": "CENTER"},
+                "fields": "alignment",
+            }})
+        if bullets:
+            self.requests.append({"createParagraphBullets": {
+                "objectId": object_id,
+                "textRange": {"type": "ALL"},
+                "bulletPreset": "BULLET_DISC_CIRCLE_SQUARE",
+            }})
+
+    def image(self, page_id: str, role: str, box: tuple, url: str):
+        self.requests.append({"createImage": {
+            "objectId": f"{page_id}_{role}",
+            "url": url,
+            "elementProperties": self._element(page_id, *box),
+        }})
+
+    def content_slide(self, title: str) -> str:
+        """A white slide with the teal title band, orange rule and footer"""
+        page_id = self.slide()
+        self.shape(page_id, "band", "RECTANGLE", (0, 0, PAGE_WIDTH, _BAND_HEIGHT), fill=_BCM_TEAL)
+        self.shape(page_id, "rule", "RECTANGLE", (0, _BAND_HEIGHT, PAGE_WIDTH, 4), fill=_BCM_ORANGE)
+        self.text(page_id, "title", (_MARGIN, 10, PAGE_WIDTH - 2 * _MARGIN, _BAND_HEIGHT - 20), title,
+                  26, _WHITE, bold=True, align="MIDDLE")
+        self.text(page_id, "footer", (_MARGIN, PAGE_HEIGHT - 26, PAGE_WIDTH - 2 * _MARGIN, 18),
+                  "Generated by BCM VentasAI Persona Generator | The AI Performance Marketing Agency", 8, _GRAY_600)
+        return page_id
+
+    def columns(self, page_id: str, sections: List[tuple]):
+        """Side-by-side (heading, items, color) text columns under the title band"""
+        gap = 16
+        top = _BAND_HEIGHT + 20
+        width = (PAGE_WIDTH - 2 * _MARGIN - gap * (len(sections) - 1)) / len(sections)
+        for index, (heading, items, color) in enumerate(sections):
+            x = _MARGIN + index * (width + gap)
+            self.text(page_id, f"h{index + 1}", (x, top, width, 24), heading, 16, color, bold=True)
+            body = "\n".join(items) if items else "Not specified"
+            self.text(page_id, f"b{index + 1}", (x, top + 30, width, PAGE_HEIGHT - top - 70), body, 12, _GRAY_800,
+                      bullets=bool(items))
+
+
+def _usable_image_url(url: Optional[str]) -> bool:
+    # createImage fetches the image itself: it needs a public http(s) URL of at most 2 kB
+    return bool(url) and url.startswith(("https://", "http://")) and len(url.encode("utf-8")) <= 2000
+
+
+def build_batch_update(data: Dict[str, Any], object_prefix: str) -> Dict[str, Any]:
+    """
+    The presentation title and batchUpdate requests for one persona (as
+    returned by slides_input). object_prefix makes every object id unique.
+    """
+    name = data.get("name") or "Marketing Persona"
+    demographics = data.get("demographics") or {}
+    deck = _Deck(object_prefix)
+
+    # 1. Title: name and summary on teal, headshot (or initials) on the right
+    page_id = deck.slide(background=_BCM_TEAL)
+    deck.shape(page_id, "rule", "RECTANGLE", (_MARGIN, 112, 80, 5), fill=_BCM_ORANGE)
+    deck.text(page_id, "title", (_MARGIN, 125, 380, 70), name, 34, _WHITE, bold=True, align="BOTTOM")
+    deck.text(page_id, "subtitle", (_MARGIN, 200, 380, 50), "Data-Driven Consumer Profile\nGenerated by BCM VentasAI",
+              15, _WHITE)
+    summary = " · ".join(str(demographics[key]) for key in ("age_range", "gender", "occupation", "location")
+                         if demographics.get(key))
+    if summary:
+        deck.text(page_id, "summary", (_MARGIN, 260, 380, 40), summary, 12, _BCM_ORANGE, bold=True)
+    image_box = (PAGE_WIDTH - _MARGIN - 230, (PAGE_HEIGHT - 230) / 2, 230, 230)
+    if _usable_image_url(data.get("persona_image_url")):
+        deck.image(page_id, "headshot", image_box, data["persona_image_url"])
+    else:
+        initials = "".join(word[0] for word in name.split()[:2]).upper() or "P"
+        deck.shape(page_id, "avatar", "ELLIPSE", image_box, fill=_WHITE)
+        deck.text(page_id, "initials", image_box, initials, 72, _BCM_TEAL, bold=True, align="MIDDLE", centered=True)
+
+    # 2. Demographics and behavioral attributes
+    page_id = deck.content_slide("Demographics Overview")
+    demographic_items = [f"{_label(key)}: {value}" for key, value in demographics.items() if value]
+    attribute_items = []
+    if data.get("vertical"):
+        attribute_items.append(f"Industry Vertical: {data['vertical']}")
+    attribute_items += _items(data.get("behaviors"))
+    deck.columns(page_id, [
+        ("Demographics", demographic_items[:_MAX_ITEMS], _BCM_TEAL),
+        ("Behavioral Attributes", attribute_items[:_MAX_ITEMS], _BCM_TEAL),
+    ])
+
+    # 3. Goals and pain points
+    page_id = deck.content_slide("Goals & Pain Points")
+    deck.columns(page_id, [
+        ("Goals & Aspirations", _items(data.get("goals")), "#16A34A"),
+        ("Pain Points", _items(data.get("pain_points")), "#DC2626"),
+    ])
+
+    # 4. Media consumption and communication style
+    page_id = deck.content_slide("Media & Communication")
+    deck.columns(page_id, [
+        ("Social Media Platforms", _items(data.get("social_media_platforms")), _BCM_TEAL),
+        ("Communication Style", _items(data.get("communication_style")), _BCM_TEAL),
+    ])
+
+    # 5. AI insights, one bullet per insight
+    page_id = deck.content_slide("Persona Insights")
+    insights = [f"{_label(str(key))}: {'; '.join(_items(value))}"
+                for key, value in (data.get("ai_insights") or {}).items() if _items(value)]
+    deck.columns(page_id, [("Key Insights", _items(insights), _BCM_TEAL)])
+
+    # 6. Recommendations and data sources
+    page_id = deck.content_slide("Marketing Recommendations")
+    deck.columns(page_id, [
+        ("Recommended Strategies", _items(data.get("recommendations")), "#2563EB"),
+        ("Data Sources", DATA_SOURCES, _GRAY_600),
+    ])
+
+    return {"title": f"{name} - BCM VentasAI Analysis", "requests": deck.requests}
+
+
+# --- Cache (serving worker) ---
+
+_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+
+def get_batch_update(generated_persona: Dict[str, Any]) -> tuple:
+    """
+    (batchUpdate body, etag) for a generated persona (JSON-mode dict).
+    The cached body is shared: callers must not modify it.
+    """
+    data = slides_input(generated_persona)
+    etag = content_hash(data)
+    key = f"{data['id']}:{etag}"
+
+    body = _cache.get(key)
+    if body is not None:
+        _cache.move_to_end(key)
+        metrics.SLIDES_CACHE.labels(result="hit").inc()
+        return body, etag
+
+    metrics.SLIDES_CACHE.labels(result="miss").inc()
+    body = build_batch_update(data, object_prefix=f"p{etag[:10]}")
+    if SLIDES_CACHE_SIZE > 0:
+        _cache[key] = body
+        while len(_cache) > SLIDES_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return body, etag
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    import sys
+
+    parser = argparse.ArgumentParser(description="Build the Slides batchUpdate body for a generated persona JSON file")
+    parser.add_argument("persona", help="GeneratedPersona as JSON (e.g. GET /api/generated-personas/{id})")
+    parser.add_argument("--check", metavar="EXPECTED", help="compare with a stored body instead of printing it")
+    args = parser.parse_args()
+
+    with open(args.persona, encoding="utf-8") as f:
+        built, _ = get_batch_update(json.load(f))
+    if not args.check:
+        print(json.dumps(built, indent=2, ensure_ascii=False))
+        sys.exit(0)
+
+    with open(args.check, encoding="utf-8") as f:
+        expected = json.load(f)
+    if built == expected:
+        print(f"OK: {len(built['requests'])} requests match {args.check}")
+        sys.exit(0)
+    if built["title"] != expected.get("title"):
+        print(f"title differs: {built['title']!r} != {expected.get('title')!r}")
+    for index, (got, want) in enumerate(zip(built["requests"], expected.get("requests", []))):
+        if got != want:
+            print(f"request {index} differs:\n  built:    {json.dumps(got)}\n  expected: {json.dumps(want)}")
+            break
+    else:
+        if len(built["requests"]) != len(expected.get("requests", [])):
+            print(f"request count differs: {len(built['requests'])} != {len(expected.get('requests', []))}")
+    sys.exit(1)
@@ -0,0 +1,221 @@
+"""
+Request tracing for the persona API
+OpenTelemetry spans around each persona generation stage (Mongo commands,
+data assembly, prompt building, OpenAI chat/image, Unsplash, crawler fetch,
+file parsing), plus a request ID taken from nginx's X-Request-ID header that
+is attached to every span and log record of the request.
+
+Exporter is chosen with TRACE_EXPORTER: "none" (default; spans still carry
+trace IDs into logs), "console" (stdout) or "file" (one JSON span per line
+in TRACE_FILE). Tests can call configure() with e.g. an InMemorySpanExporter.
+"""
+
+import contextvars
+import logging
+import os
+import re
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+from opentelemetry import propagate, trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter, SimpleSpanProcessor, SpanExporter
+from opentelemetry.trace import SpanKind, Status, StatusCode
+from pymongo import monitoring
+
+
+TRACE_EXPORTER = os.environ.get("TRACE_EXPORTER", "none").lower()
+TRACE_FILE = os.environ.get("TRACE_FILE", "traces.jsonl")
+SERVICE_NAME = os.environ.get("OTEL_SERVICE_NAME", "persona-api")
+
+REQUEST_ID_HEADER = "x-request-id"
+# Accept upstream IDs that are safe to echo back and put in logs
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+request_id: contextvars.ContextVar = contextvars.ContextVar("request_id", default="-")
+
+_provider = TracerProvider(resource=Resource.create({"service.name": SERVICE_NAME}))
+tracer = _provider.get_tracer("persona-api")
+
+
+def _json_line(span) -> str:
+    return span.to_json(indent=None) + "\n"
+
+
+def configure(exporter: Optional[SpanExporter] = None, batch: bool = True):
+    """
+    Add an exporter to the tracer provider; without one, the exporter named
+    by TRACE_EXPORTER is used. Pass batch=False to export each span as it
+    ends (deterministic for tests).
+    """
+    if exporter is None:
+        if TRACE_EXPORTER == "console":
+            exporter = ConsoleSpanExporter(service_name=SERVICE_NAME, formatter=_json_line)
+        elif TRACE_EXPORTER == "file":
+            exporter = ConsoleSpanExporter(service_name=SERVICE_NAME, out=open(TRACE_FILE, "a"), formatter=_json_line)
+        else:
+            return
+    processor = BatchSpanProcessor(exporter) if batch else SimpleSpanProcessor(exporter)
+    _provider.add_span_processor(processor)
+
+
+def shutdown():
+    """Flush pending spans"""
+    _provider.shutdown()
+
+
+def current_request_id() -> str:
+    return request_id.get()
+
+
+@contextmanager
+def span(name: str, **attributes: Any):
+    """
+    Run the enclosed block in a child span of the current one (usable in
+    sync and async code). Exceptions are recorded on the span and re-raised.
+    """
+    attributes = {key: value for key, value in attributes.items() if value is not None}
+    attributes["request_id"] = request_id.get()
+    with tracer.start_as_current_span(name, attributes=attributes) as current:
+        yield current
+
+
+def start_span(name: str, **attributes: Any):
+    """
+    Start a child span of the current one without making it current; the
+    caller must end() it. For work spread across an async generator's
+    yields, where a current span would leak into the consumer's context.
+    """
+    attributes = {key: value for key, value in attributes.items() if value is not None}
+    attributes["request_id"] = request_id.get()
+    return tracer.start_span(name, attributes=attributes)
+
+
+def set_attributes(**attributes: Any):
+    """Annotate the current span"""
+    current = trace.get_current_span()
+    for key, value in attributes.items():
+        if value is not None:
+            current.set_attribute(key, value)
+
+
+class _TraceContextRecordFactory:
+    """Adds request_id, trace_id and span_id to every log record"""
+
+    def __init__(self, factory):
+        self.factory = factory
+
+    def __call__(self, *args, **kwargs):
+        record = self.factory(*args, **kwargs)
+        record.request_id = request_id.get()
+        context = trace.get_current_span().get_span_context()
+        if context.is_valid:
+            record.trace_id = format(context.trace_id, "032x")
+            record.span_id = format(context.span_id, "016x")
+        else:
+            record.trace_id = record.span_id = "-"
+        return record
+
+
+logging.setLogRecordFactory(_TraceContextRecordFactory(logging.getLogRecordFactory()))
+
+
+class MongoCommandTracer(monitoring.CommandListener):
+    """
+    One span per Mongo command. Motor runs commands on its executor with a
+    copy of the caller's context, so spans nest under the request's span.
+    """
+
+    def __init__(self):
+        self._spans: Dict[Any, Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, event):
+        return (event.request_id, event.connection_id)
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        current = tracer.start_span(
+            f"mongo.{event.command_name}",
+            kind=SpanKind.CLIENT,
+            attributes={
+                "db.system": "mongodb",
+                "db.name": event.database_name,
+                "db.operation": event.command_name,
+                "db.mongodb.collection": collection if isinstance(collection, str) else "",
+                "request_id": request_id.get(),
+            },
+        )
+        with self._lock:
+            self._spans[self._key(event)] = current
+
+    def _finish(self, event, error: Optional[str] = None):
+        with self._lock:
+            current = self._spans.pop(self._key(event), None)
+        if current is None:
+            return
+        if error:
+            current.set_status(Status(StatusCode.ERROR, error))
+        current.end()
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event, str(event.failure.get("errmsg", "command failed")))
+
+
+class RequestContextMiddleware:
+    """
+    ASGI middleware that takes the request ID from X-Request-ID (set by
+    nginx, or generated here), opens the request's server span (continuing
+    a W3C traceparent if the caller sent one) and echoes the ID back in the
+    response headers.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope.get("headers", [])}
+        incoming = headers.get(REQUEST_ID_HEADER, "")
+        rid = incoming if _VALID_REQUEST_ID.match(incoming) else uuid.uuid4().hex
+        token = request_id.set(rid)
+
+        method = scope.get("method", "")
+        parent = propagate.extract(headers)
+        with tracer.start_as_current_span(
+            f"{method} {scope.get('path', '')}",
+            context=parent,
+            kind=SpanKind.SERVER,
+            attributes={"http.method": method, "http.target": scope.get("path", ""), "request_id": rid},
+        ) as server_span:
+
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    server_span.set_attribute("http.status_code", message["status"])
+                    if message["status"] >= 500:
+                        server_span.set_status(Status(StatusCode.ERROR))
+                    message = dict(message)
+                    message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", rid.encode("latin-1"))]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = scope.get("route")
+                if route is not None:
+                    # Name by route template so spans group per endpoint
+                    server_span.update_name(f"{method} {route.path}")
+                    server_span.set_attribute("http.route", route.path)
+                request_id.reset(token)
+
+
+configure()
@@ -4,18 +4,43 @@ set -e
 # Start the FastAPI backend
 cd /backend || { echo "Backend directory not found"; exit 1; }
 
-echo "Starting FastAPI backend"
-# Start Uvicorn with proper host binding
-uvicorn server:app --host 0.0.0.0 --port 8001 &
+WEB_CONCURRENCY="${WEB_CONCURRENCY:-1}"
+export WEB_CONCURRENCY
+
+if [ "$WEB_CONCURRENCY" -gt 1 ]; then
+    echo "Starting FastAPI backend with $WEB_CONCURRENCY gunicorn/uvicorn workers"
+    # Workers share metrics through this directory (cleared by gunicorn on start)
+    export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus_multiproc}"
+    mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+    gunicorn -c gunicorn.conf.py server:app &
+else
+    echo "Starting FastAPI backend"
+    # Start Uvicorn with proper host binding
+    uvicorn server:app --host 0.0.0.0 --port 8001 --loop uvloop --http httptools &
+fi
 BACKEND_PID=$!
 
-echo "Waiting for backend to start..."
-sleep 30
+# Poll readiness (Mongo reachable, indexes ensured, parsers warmed up, OpenAI
+# client constructed) instead of sleeping a fixed time
+READY_URL="http://127.0.0.1:8001/api/health/ready"
+READY_TIMEOUT="${READY_TIMEOUT:-120}"
 
-if ! kill -0 $BACKEND_PID 2>/dev/null; then
-    echo "Backend failed to start at initialization, exiting"
-    exit 1
-fi
+echo "Waiting for backend to become ready..."
+START_TIME=$(date +%s)
+until wget -q -O /dev/null "$READY_URL" 2>/dev/null; do
+    if ! kill -0 $BACKEND_PID 2>/dev/null; then
+        echo "Backend failed to start at initialization, exiting"
+        exit 1
+    fi
+    if [ $(( $(date +%s) - START_TIME )) -ge "$READY_TIMEOUT" ]; then
+        echo "Backend not ready after ${READY_TIMEOUT}s, exiting"
+        wget -q -O - "$READY_URL" 2>/dev/null || true
+        kill $BACKEND_PID
+        exit 1
+    fi
+    sleep 0.5
+done
+echo "Backend ready after $(( $(date +%s) - START_TIME ))s"
 
 # Start Nginx
 nginx -g 'daemon off;' &
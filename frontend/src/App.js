@@ -23,7 +23,7 @@ const PersonaTemplateWrapper = () => {
   React.useEffect(() => {
     const fetchGeneratedPersona = async () => {
       try {
-        const response = await axios.get(`${API}/generated-personas`);
+        const response = await axios.get(`${API}/generated-personas`, { params: { persona_id: id } });
         const persona = response.data.find(p => p.persona_data.id === id);
         
         if (persona) {
@@ -58,7 +58,7 @@ const DetailedPersonaWrapper = () => {
   React.useEffect(() => {
     const fetchGeneratedPersona = async () => {
       try {
-        const response = await axios.get(`${API}/generated-personas`);
+        const response = await axios.get(`${API}/generated-personas`, { params: { persona_id: id } });
         const persona = response.data.find(p => p.persona_data.id === id);
         
         if (persona) {
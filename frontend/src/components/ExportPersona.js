@@ -1,8 +1,12 @@
 import React, { useState } from 'react';
+import axios from 'axios';
 import jsPDF from 'jspdf';
 import html2canvas from 'html2canvas';
 import { Document, Page, Text, View, StyleSheet, PDFDownloadLink, Image, Font } from '@react-pdf/renderer';
 
+const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
+const API = `${BACKEND_URL}/api`;
+
 // PDF Styles for React-PDF
 const styles = StyleSheet.create({
   page: {
@@ -258,6 +262,30 @@ const ExportPersona = ({ persona, generatedPersona, className = "" }) => {
 
   const persona_data = generatedPersona?.persona_data || persona;
 
+  // PDF rendered and cached on the server; the browser revalidates it by ETag
+  const exportServerPDF = async () => {
+    setIsExporting(true);
+    try {
+      const response = await axios.get(`${API}/generated-personas/${generatedPersona.id}/pdf`, {
+        responseType: 'blob'
+      });
+      const url = window.URL.createObjectURL(response.data);
+      const link = document.createElement('a');
+      link.href = url;
+      link.download = `${persona_data?.name || 'persona'}.pdf`;
+      document.body.appendChild(link);
+      link.click();
+      link.remove();
+      window.URL.revokeObjectURL(url);
+    } catch (error) {
+      console.error('Error downloading PDF:', error);
+      alert('Error generating PDF. Please try again.');
+    } finally {
+      setIsExporting(false);
+      setShowExportMenu(false);
+    }
+  };
+
   // PDF Export using html2canvas + jsPDF
   const exportToSimplePDF = async () => {
     console.log('Starting PDF export...');
@@ -408,6 +436,15 @@ const ExportPersona = ({ persona, generatedPersona, className = "" }) => {
             {/* PDF Options */}
             <div className="space-y-2 mb-4">
               <h4 className="text-sm font-medium text-gray-700 font-montserrat">PDF Export</h4>
+
+              {generatedPersona?.id && (
+                <button
+                  onClick={exportServerPDF}
+                  className="block w-full text-left px-3 py-2 text-sm text-gray-700 hover:bg-gray-100 rounded-md transition-colors"
+                >
+                  ⚡ Persona Profile PDF
+                </button>
+              )}
               
               <PDFDownloadLink
                 document={<DetailedPersonaPDF persona={persona} generatedPersona={generatedPersona} />}
@@ -101,9 +101,10 @@ const PersonaWizard = () => {
     }
   }, [personaId, navigate]);
 
-  const loadPersona = async () => {
+  const loadPersona = async (fresh = false) => {
     try {
-      const response = await axios.get(`${API}/personas/${personaId}`);
+      // no-cache: skip the server's document cache, which can lag behind another worker's save
+      const response = await axios.get(`${API}/personas/${personaId}`, fresh ? { headers: { 'Cache-Control': 'no-cache' } } : undefined);
       setPersona(response.data);
       setCurrentStep(response.data.current_step || 1);
     } catch (error) {
@@ -122,7 +123,8 @@ const PersonaWizard = () => {
       const updateData = {
         ...updates,
         current_step: stepNumber || currentStep,
-        completed_steps: persona?.completed_steps || []
+        completed_steps: persona?.completed_steps || [],
+        expected_updated_at: persona?.updated_at
       };
 
       // Add current step to completed steps if moving forward
@@ -130,7 +132,7 @@ const PersonaWizard = () => {
         updateData.completed_steps = [...new Set([...updateData.completed_steps, currentStep])];
       }
 
-      const response = await axios.put(`${API}/personas/${personaId}`, updateData);
+      const response = await axios.patch(`${API}/personas/${personaId}`, updateData);
       setPersona(response.data);
       
       if (stepNumber) {
@@ -140,6 +142,12 @@ const PersonaWizard = () => {
       return true;
     } catch (error) {
       console.error("Error updating persona:", error);
+      if (error.response?.status === 409) {
+        // Saved elsewhere since we loaded it: pick up the latest version
+        await loadPersona(true);
+        setErrors({ general: "This persona was changed elsewhere. Review the latest version and save again." });
+        return false;
+      }
       setErrors({ general: "Failed to save changes. Please try again." });
       return false;
     } finally {
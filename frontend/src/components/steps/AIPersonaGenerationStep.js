@@ -1,27 +1,75 @@
-import React, { useState } from 'react';
+import React, { useState, useRef } from 'react';
+
+const newIdempotencyKey = () =>
+  window.crypto?.randomUUID ? window.crypto.randomUUID() : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
 
 const AIPersonaGenerationStep = ({ persona, updatePersona, onNext, onPrev, saving, dataSources, dataIntegration }) => {
   const [isGenerating, setIsGenerating] = useState(false);
   const [generationComplete, setGenerationComplete] = useState(false);
   const [generatedPersona, setGeneratedPersona] = useState(null);
   const [generationError, setGenerationError] = useState(null);
+  const [generationStages, setGenerationStages] = useState({});
+  const [partialInsights, setPartialInsights] = useState({});
+  // One key per intended generation: Try Again after a dropped stream gets
+  // the persona that was already saved instead of generating another
+  const generationKey = useRef(null);
+
+  // Read a Server-Sent Events response body, calling onEvent(event, data) per message
+  const readEventStream = async (response, onEvent, onActivity) => {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      onActivity();
+      buffer += decoder.decode(value, { stream: true });
+
+      let boundary;
+      while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+        const message = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+
+        let event = 'message';
+        let data = '';
+        for (const line of message.split('\n')) {
+          if (line.startsWith('event:')) event = line.slice(6).trim();
+          else if (line.startsWith('data:')) data += line.slice(5).trim();
+        }
+        // Comment-only messages are keep-alives
+        if (!data && event === 'message') continue;
+        onEvent(event, data ? JSON.parse(data) : null);
+      }
+    }
+  };
 
-  const startAIGeneration = async () => {
+  const startAIGeneration = async (fresh = false) => {
+    if (fresh || !generationKey.current) {
+      generationKey.current = newIdempotencyKey();
+    }
     setIsGenerating(true);
     setGenerationError(null);
+    setGenerationStages({});
+    setPartialInsights({});
     
     try {
       // Get backend URL from environment
       const backendUrl = process.env.REACT_APP_BACKEND_URL || 'http://localhost:8001';
       
-      // Send persona ID directly to the existing generate endpoint with longer timeout
+      // Abort if the stream goes quiet for 60 seconds
       const controller = new AbortController();
-      const timeoutId = setTimeout(() => controller.abort(), 60000); // 60 second timeout
+      let timeoutId = setTimeout(() => controller.abort(), 60000);
+      const resetTimeout = () => {
+        clearTimeout(timeoutId);
+        timeoutId = setTimeout(() => controller.abort(), 60000);
+      };
       
-      const response = await fetch(`${backendUrl}/api/personas/${persona.id}/generate`, {
+      const response = await fetch(`${backendUrl}/api/personas/${persona.id}/generate/stream`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
+          'Idempotency-Key': generationKey.current,
         },
         body: JSON.stringify({
           use_multi_source_data: true,
@@ -30,15 +78,48 @@ const AIPersonaGenerationStep = ({ persona, updatePersona, onNext, onPrev, savin
         }),
         signal: controller.signal
       });
-      
-      clearTimeout(timeoutId);
 
       if (!response.ok) {
+        clearTimeout(timeoutId);
         const errorData = await response.json();
         throw new Error(errorData.detail || 'Failed to generate AI persona');
       }
 
-      const result = await response.json();
+      let result = null;
+      let streamError = null;
+      try {
+        await readEventStream(response, (event, data) => {
+          if (event === 'insights_partial') {
+            // Top-level sections (and their list items) arrive as soon as they are complete
+            const [section, key] = data.path;
+            if (data.path.length === 1 || typeof key === 'string') {
+              setPartialInsights(prev => ({
+                ...prev,
+                [section]: data.path.length === 1 ? data.value : { ...(prev[section] || {}), [key]: data.value }
+              }));
+            } else {
+              setPartialInsights(prev => {
+                const items = Array.isArray(prev[section]) ? [...prev[section]] : [];
+                items[key] = data.value;
+                return { ...prev, [section]: items };
+              });
+            }
+          } else if (event === 'saved') {
+            result = data;
+          } else if (event === 'error') {
+            streamError = data.detail;
+          }
+          if (event !== 'token') {
+            setGenerationStages(prev => ({ ...prev, [event]: true }));
+          }
+        }, resetTimeout);
+      } finally {
+        clearTimeout(timeoutId);
+      }
+
+      if (streamError || !result) {
+        throw new Error(streamError || 'Generation stream ended before the persona was saved');
+      }
       
       setGeneratedPersona(result);
       setGenerationComplete(true);
@@ -139,7 +220,7 @@ const AIPersonaGenerationStep = ({ persona, updatePersona, onNext, onPrev, savin
           </div>
 
           <button
-            onClick={startAIGeneration}
+            onClick={() => startAIGeneration(true)}
             className="w-full bcm-btn-primary py-3 text-lg"
           >
             🚀 Generate AI-Powered Persona
@@ -159,13 +240,43 @@ const AIPersonaGenerationStep = ({ persona, updatePersona, onNext, onPrev, savin
           </div>
           
           <div className="space-y-2">
-            <div className="text-sm text-blue-700">• Processing demographic patterns and behavioral insights</div>
-            <div className="text-sm text-blue-700">• Analyzing content preferences and digital engagement</div>
-            <div className="text-sm text-blue-700">• Identifying motivational drivers and pain points</div>
-            <div className="text-sm text-blue-700">• Generating personality traits and communication style</div>
-            <div className="text-sm text-blue-700">• Creating realistic persona imagery</div>
-            <div className="text-sm text-blue-700">• Finalizing comprehensive persona profile</div>
+            {[
+              ['prompt_built', 'Processing demographic patterns and behavioral insights'],
+              ['insights_partial', 'Identifying motivational drivers and pain points'],
+              ['insights', 'Generating personality traits and communication style'],
+              ['image_ready', 'Creating realistic persona imagery'],
+              ['saved', 'Finalizing comprehensive persona profile']
+            ].map(([stage, label]) => (
+              <div key={stage} className={`text-sm ${generationStages[stage] ? 'text-green-700' : 'text-blue-700'}`}>
+                {generationStages[stage] ? '✓' : '•'} {label}
+              </div>
+            ))}
           </div>
+
+          {/* Sections render as soon as the model finishes writing them */}
+          {(partialInsights.ai_insights || partialInsights.recommendations || partialInsights.pain_points || partialInsights.goals) && (
+            <div className="bg-white rounded-lg p-4 mt-4 space-y-3 text-sm text-gray-700">
+              {partialInsights.ai_insights?.personality_traits && (
+                <div><strong>Personality Traits:</strong> {partialInsights.ai_insights.personality_traits.join(', ')}</div>
+              )}
+              {partialInsights.ai_insights?.shopping_behavior && (
+                <div><strong>Shopping Behavior:</strong> {partialInsights.ai_insights.shopping_behavior}</div>
+              )}
+              {partialInsights.ai_insights?.digital_behavior && (
+                <div><strong>Digital Behavior:</strong> {partialInsights.ai_insights.digital_behavior}</div>
+              )}
+              {[['recommendations', 'Recommendations'], ['pain_points', 'Pain Points'], ['goals', 'Goals']].map(([key, label]) => (
+                Array.isArray(partialInsights[key]) && partialInsights[key].length > 0 && (
+                  <div key={key}>
+                    <strong>{label}:</strong>
+                    <ul className="list-disc ml-5">
+                      {partialInsights[key].map((item, index) => <li key={index}>{item}</li>)}
+                    </ul>
+                  </div>
+                )
+              ))}
+            </div>
+          )}
         </div>
       )}
 
@@ -211,7 +322,7 @@ const AIPersonaGenerationStep = ({ persona, updatePersona, onNext, onPrev, savin
           <h3 className="text-red-800 font-semibold mb-2">❌ Generation Error</h3>
           <div className="text-red-700 text-sm mb-4">{generationError}</div>
           <button
-            onClick={startAIGeneration}
+            onClick={() => startAIGeneration()}
             className="bcm-btn-primary"
           >
             Try Again
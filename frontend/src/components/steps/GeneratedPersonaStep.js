@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from "react";
+import React, { useState, useEffect, useRef } from "react";
 import axios from "axios";
 import VisualPersonaTemplate from "../VisualPersonaTemplate";
 import DetailedPersonaView from "../DetailedPersonaView";
@@ -6,23 +6,34 @@ import DetailedPersonaView from "../DetailedPersonaView";
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+const newIdempotencyKey = () =>
+  window.crypto?.randomUUID ? window.crypto.randomUUID() : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+
 const GeneratedPersonaStep = ({ persona, onPrev, personaId }) => {
   const [generatedPersona, setGeneratedPersona] = useState(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [saving, setSaving] = useState(false);
   const [viewMode, setViewMode] = useState('template'); // 'template' or 'detailed'
+  // One key per intended generation: repeats of it (StrictMode's second
+  // effect run, Try Again) get the same persona back instead of a new one
+  const generationKey = useRef(null);
 
   useEffect(() => {
     generatePersona();
   }, []);
 
-  const generatePersona = async () => {
+  const generatePersona = async (fresh = false) => {
+    if (fresh || !generationKey.current) {
+      generationKey.current = newIdempotencyKey();
+    }
     setLoading(true);
     setError(null);
     
     try {
-      const response = await axios.post(`${API}/personas/${personaId}/generate`);
+      const response = await axios.post(`${API}/personas/${personaId}/generate`, null, {
+        headers: { 'Idempotency-Key': generationKey.current }
+      });
       setGeneratedPersona(response.data);
     } catch (err) {
       console.error("Error generating persona:", err);
@@ -33,7 +44,7 @@ const GeneratedPersonaStep = ({ persona, onPrev, personaId }) => {
   };
 
   const regeneratePersona = async () => {
-    await generatePersona();
+    await generatePersona(true);
   };
 
   const savePersona = async () => {
@@ -85,7 +96,7 @@ const GeneratedPersonaStep = ({ persona, onPrev, personaId }) => {
             <button onClick={onPrev} className="bcm-btn-secondary">
               Go Back
             </button>
-            <button onClick={regeneratePersona} className="bcm-btn-primary">
+            <button onClick={() => generatePersona()} className="bcm-btn-primary">
               Try Again
             </button>
           </div>
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Persona list serialization benchmark
+
+Times turning 100 generated-persona Mongo documents (with large embedded
+resonate_data / sparktoro_data) into a JSON response body:
+
+  before  GeneratedPersona(**doc) per document, FastAPI's response_model
+          re-validation and serialization, stdlib JSONResponse
+  orjson  the same, rendered by ORJSONResponse (the new default class)
+  after   model_list_json_response: one validation through the codec's
+          list TypeAdapter, serialized straight to JSON bytes by pydantic-core
+
+and checks that all variants produce the same JSON.
+
+    python scripts/benchmark_serialization.py --personas 100 --rows 40
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "serialization_benchmark")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("WARM_UP_IMPORTS", "0")
+
+from bson import ObjectId  # noqa: E402
+from fastapi.responses import JSONResponse, ORJSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_response_field  # noqa: E402
+
+import server  # noqa: E402
+
+
+def persona_document(index: int, rows: int, rng: random.Random) -> dict:
+    """A generated_personas document shaped like one built from a Resonate upload"""
+    resonate_data = {
+        "demographics": {
+            f"dimension_{d}": {
+                "top_values": {f"value_{v}": rng.randint(1, 999) for v in range(20)},
+                "rows": [
+                    {"insight": f"insight {r}", "value": rng.random(), "composition": "audience composition text"}
+                    for r in range(rows)
+                ],
+            }
+            for d in range(15)
+        }
+    }
+    sparktoro_data = {"rows": [{"rank": r, "source": f"site{r}.example.com", "affinity": rng.random()} for r in range(rows * 5)]}
+    persona_data = server.PersonaData(
+        name=f"Persona {index}",
+        starting_method="resonate_upload",
+        resonate_data=resonate_data,
+        sparktoro_data=sparktoro_data,
+    )
+    generated = server.GeneratedPersona(
+        name=f"Persona {index}",
+        persona_data=persona_data,
+        ai_insights={"personality_traits": ["Data-driven", "Curious"], "shopping_behavior": "Researches first"},
+        recommendations=[f"Recommendation {r}" for r in range(6)],
+        pain_points=[f"Pain point {r}" for r in range(5)],
+        goals=[f"Goal {r}" for r in range(5)],
+    )
+    document = generated.model_dump()
+    document["_id"] = ObjectId()
+    return document
+
+
+def before(documents: List[dict], field) -> bytes:
+    models = [server.GeneratedPersona(**document) for document in documents]
+    content = asyncio.run(serialize_response(field=field, response_content=models))
+    return JSONResponse(content).body
+
+
+def orjson_default(documents: List[dict], field) -> bytes:
+    models = [server.GeneratedPersona(**document) for document in documents]
+    content = asyncio.run(serialize_response(field=field, response_content=models))
+    return ORJSONResponse(content).body
+
+
+def after(documents: List[dict], field) -> bytes:
+    return server.model_list_json_response(server.generated_persona_codec, documents).body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--personas", type=int, default=100, help="documents in the list (default 100)")
+    parser.add_argument("--rows", type=int, default=40, help="rows per embedded data dimension (default 40)")
+    parser.add_argument("--repeat", type=int, default=7, help="timed runs per variant (default 7)")
+    args = parser.parse_args()
+
+    rng = random.Random(1234)
+    documents = [persona_document(index, args.rows, rng) for index in range(args.personas)]
+    field = create_response_field(name="response", type_=List[server.GeneratedPersona], mode="serialization")
+
+    variants = [("before", before), ("orjson", orjson_default), ("after", after)]
+    bodies = {name: fn(documents, field) for name, fn in variants}
+    reference = json.loads(bodies["before"])
+    for name, body in bodies.items():
+        if json.loads(body) != reference:
+            raise SystemExit(f"{name} produced different JSON")
+
+    print(f"{args.personas} personas, {len(bodies['after']) / 1e6:.1f} MB of JSON, median of {args.repeat} runs")
+    baseline = None
+    for name, fn in variants:
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            fn(documents, field)
+            timings.append(time.perf_counter() - started)
+        median = statistics.median(timings)
+        baseline = baseline or median
+        print(f"  {name:7s} {median * 1000:8.1f} ms  ({baseline / median:4.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Backend cold-start benchmark
+
+Reports where `import server` spends its time (python -X importtime, grouped
+by the modules server imports directly) and the time from launching uvicorn
+until the first request is answered, over several runs.
+
+    python scripts/benchmark_startup.py --runs 5
+    python scripts/benchmark_startup.py --top 30 --path /api/metrics
+
+Mongo does not need to be reachable: the Motor client connects lazily and
+index creation runs in the background after startup.
+"""
+
+import argparse
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def backend_env() -> dict:
+    env = dict(os.environ)
+    env.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    env.setdefault("DB_NAME", "startup_benchmark")
+    env.setdefault("LOG_LEVEL", "WARNING")
+    return env
+
+
+def import_profile(python: str) -> list:
+    """[(module, cumulative seconds)] for server and each module it imports directly"""
+    result = subprocess.run(
+        [python, "-X", "importtime", "-c", "import server"],
+        cwd=BACKEND_DIR, env=backend_env(), capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        _, cumulative, indent, module = match.groups()
+        # importtime indents nested imports by two spaces per level; server is
+        # at the top, the modules it imports one level below it
+        depth = len(indent) // 2
+        if depth <= 1:
+            rows.append((module, int(cumulative) / 1e6, depth))
+
+    # Imports triggered by server are listed (at depth 1) before server itself
+    server_index = next(i for i, row in enumerate(rows) if row[0] == "server" and row[2] == 0)
+    start = max((i for i, row in enumerate(rows[:server_index]) if row[2] == 0), default=-1) + 1
+    children = [(module, seconds) for module, seconds, depth in rows[start:server_index] if depth == 1]
+    return [("server", rows[server_index][1])] + sorted(children, key=lambda row: -row[1])
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def time_to_first_request(python: str, path: str, timeout: float) -> float:
+    port = free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [python, "-m", "uvicorn", "server:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=BACKEND_DIR, env=backend_env(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}{path}"
+    try:
+        while time.perf_counter() - started < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with status {process.returncode}")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status < 500:
+                        return time.perf_counter() - started
+            except (urllib.error.URLError, ConnectionError, socket.timeout):
+                time.sleep(0.02)
+        raise TimeoutError(f"No response from {url} within {timeout}s")
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="uvicorn launches to time (default 3)")
+    parser.add_argument("--top", type=int, default=15, help="modules to list in the import profile")
+    parser.add_argument("--path", default="/api/", help="endpoint polled for the first response")
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds to wait for the first response")
+    parser.add_argument("--python", default=sys.executable, help="interpreter to benchmark")
+    args = parser.parse_args()
+
+    profile = import_profile(args.python)
+    print("Import profile (cumulative, modules imported directly by server)")
+    for module, seconds in profile[:args.top + 1]:
+        print(f"  {seconds * 1000:8.1f} ms  {module}")
+
+    print(f"\nTime to first request ({args.path}), {args.runs} runs")
+    timings = []
+    for run in range(args.runs):
+        seconds = time_to_first_request(args.python, args.path, args.timeout)
+        timings.append(seconds)
+        print(f"  run {run + 1}: {seconds:.3f} s")
+    print(f"  median {statistics.median(timings):.3f} s, min {min(timings):.3f} s, max {max(timings):.3f} s")
+
+
+if __name__ == "__main__":
+    main()
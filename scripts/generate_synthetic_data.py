@@ -0,0 +1,439 @@
+#!/usr/bin/env python3
+"""
+Synthetic upload data for load and benchmark testing
+
+Writes Resonate, SparkToro and SEMRush files shaped like the real exports the
+upload routes and file_parsers handle, at sizes the tiny fixtures in tests/
+and test_data/ never reach:
+
+  resonate_insights.csv    Insight / Insight Value / Category / Subcategory1 / Composition (%)
+  resonate_categories.csv  Category / Category Index / Category Share of Total Visits (if available)
+  resonate_domains.csv     Domain Name / Site Rating / Category
+  sparktoro_audience.xlsx  one tab per SparkToro report (Social Accounts, Websites, ...)
+  semrush_keywords.csv     organic keyword export (also semrush_keywords.xlsx with --semrush-xlsx)
+  resonate_bundle.zip      the Resonate CSVs plus report PDFs and chart images
+
+Output is deterministic: the same --seed and sizes give byte-identical
+files (workbook and archive timestamps are pinned), so results can be
+compared between runs and cached by content.
+
+    python scripts/generate_synthetic_data.py --out /tmp/synthetic --rows 100000 --tabs 12
+    python scripts/generate_synthetic_data.py --out /tmp/synthetic --rows 1000000 --only resonate semrush
+    python scripts/generate_synthetic_data.py --out /tmp/synthetic --rows 5000 --pdfs 5 --images 20 --only bundle
+
+Rows are written as they are generated, so --rows 1000000 runs in constant
+memory. Needs openpyxl, Pillow and reportlab from backend/requirements.txt
+for the workbook, images and PDFs.
+"""
+
+import argparse
+import csv
+import io
+import os
+import random
+import re
+import sys
+import time
+import zipfile
+from itertools import accumulate
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+# Pinned into workbooks and archives so output bytes depend only on the inputs
+FIXED_TIMESTAMP = (2024, 1, 1, 0, 0, 0)
+FIXED_ISO_TIMESTAMP = "2024-01-01T00:00:00Z"
+
+MAX_XLSX_ROWS = 1_048_575  # per sheet, below the header
+
+SOURCES = ("resonate", "sparktoro", "semrush", "bundle")
+
+# --- Vocabulary ---
+
+# (Insight, Category, Subcategory1, values); insight names hit each branch of
+# ResonateFileParser._process_resonate_insights
+RESONATE_INSIGHTS = [
+    ("Age", "Demographics", "Age", ["18-24", "25-34", "35-44", "45-54", "55-64", "65+"]),
+    ("Gender", "Demographics", "Gender", ["Female", "Male", "Non-binary"]),
+    ("Household Income", "Demographics", "Income",
+     ["Under $25,000", "$25,000-$49,999", "$50,000-$74,999", "$75,000-$99,999", "$100,000-$149,999", "$150,000+"]),
+    ("Education Level", "Demographics", "Education",
+     ["High School", "Some College", "Bachelor's Degree", "Master's Degree", "Doctorate"]),
+    ("Location Type", "Demographics", "Location", ["Urban", "Suburban", "Rural"]),
+    ("Occupation", "Demographics", "Occupation",
+     ["Marketing Professional", "Software Engineer", "Teacher", "Nurse", "Small Business Owner", "Retail Manager",
+      "Financial Analyst", "Student", "Retired"]),
+    ("Social Media Membership", "Media", "Social Platforms",
+     ["Instagram", "Facebook", "TikTok", "LinkedIn", "YouTube", "Pinterest", "Reddit", "X (Twitter)", "Snapchat"]),
+    ("Streaming Services Used", "Media", "Streaming", ["Netflix", "Hulu", "Disney+", "Max", "Prime Video", "Spotify"]),
+    ("Primary Device", "Media", "Devices", ["Smartphone", "Laptop", "Tablet", "Smart TV", "Desktop"]),
+    ("Preferred Brand", "Brand Affinity", "Brands",
+     ["Apple", "Nike", "Target", "Amazon", "Patagonia", "Starbucks", "Costco", "IKEA", "Sephora"]),
+    ("Shopping Channel", "Brand Affinity", "Shopping",
+     ["Online marketplace", "Brand website", "Big-box store", "Local store", "Social commerce"]),
+    ("Purchase Driver", "Brand Affinity", "Purchase", ["Price", "Quality", "Sustainability", "Convenience", "Reviews"]),
+    ("Personal Values", "Psychographics", "Values",
+     ["Family", "Achievement", "Security", "Adventure", "Community", "Sustainability"]),
+    ("Lifestyle", "Psychographics", "Lifestyle", ["Health-conscious", "Busy professional", "Homebody", "Traveler"]),
+    ("Interests", "Psychographics", "Interests",
+     ["Cooking", "Fitness", "Gaming", "Personal finance", "Home improvement", "Fashion", "Outdoors"]),
+]
+
+WEB_CATEGORIES = [
+    "News & Media", "Shopping", "Finance", "Travel", "Food & Drink", "Health", "Technology", "Sports",
+    "Entertainment", "Home & Garden", "Education", "Automotive", "Beauty", "Parenting", "Real Estate",
+]
+
+DOMAIN_WORDS = [
+    "daily", "smart", "green", "urban", "home", "tech", "style", "budget", "travel", "fresh", "market", "guide",
+    "hub", "review", "life", "deal", "health", "family", "pro", "local",
+]
+TLDS = [".com", ".com", ".com", ".net", ".org", ".co", ".io"]
+
+# SparkToro report tabs: (name, columns, row builder)
+SPARKTORO_TABS = [
+    "Social Accounts", "Websites", "Podcasts", "YouTube Channels", "Subreddits", "Hashtags",
+    "Keywords", "Press Accounts", "Hidden Gems", "Bio Words", "Demographics", "Locations",
+]
+
+SEARCH_TOPICS = [
+    "running shoes", "meal prep", "budget travel", "home workout", "standing desk", "skincare routine",
+    "electric car", "credit card rewards", "vegan recipes", "kids learning apps", "smart thermostat",
+    "coffee maker", "yoga mat", "noise cancelling headphones", "project management software", "pet insurance",
+]
+SEARCH_MODIFIERS = [
+    "best", "cheap", "how to choose", "near me", "reviews", "vs", "for beginners", "2024", "sale", "alternatives",
+    "guide", "ideas", "top 10", "what is", "deals",
+]
+SEARCH_INTENTS = ["Informational", "Commercial", "Transactional", "Navigational"]
+
+
+# --- Helpers ---
+
+def weighted_chooser(rng: random.Random, values: Sequence, skew: float = 1.1) -> Callable[[], object]:
+    """Zipf-like choice: a few values dominate, as in real audience data"""
+    cumulative = list(accumulate(1 / (rank ** skew) for rank in range(1, len(values) + 1)))
+    return lambda: rng.choices(values, cum_weights=cumulative)[0]
+
+
+def domain_name(rng: random.Random) -> str:
+    return f"{rng.choice(DOMAIN_WORDS)}{rng.choice(DOMAIN_WORDS)}{rng.choice(TLDS)}"
+
+
+def write_csv(path: Path, header: List[str], rows: Iterator[list]) -> int:
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+def normalize_xlsx(path: Path):
+    """Rewrite a workbook with pinned zip timestamps and document dates"""
+    with zipfile.ZipFile(path) as source:
+        entries = [(info.filename, source.read(info.filename)) for info in source.infolist()]
+    with zipfile.ZipFile(path, "w") as target:
+        for name, data in entries:
+            if name == "docProps/core.xml":
+                data = re.sub(rb"(<dcterms:(?:created|modified)[^>]*>)[^<]*", rb"\g<1>" + FIXED_ISO_TIMESTAMP.encode(), data)
+            info = zipfile.ZipInfo(name, date_time=FIXED_TIMESTAMP)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            target.writestr(info, data)
+
+
+def write_xlsx(path: Path, sheets: List[Tuple[str, List[str], Iterator[list]]]) -> int:
+    """Write sheets in openpyxl's streaming (write-only) mode; returns the total row count"""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    count = 0
+    for title, header, rows in sheets:
+        sheet = workbook.create_sheet(title=title[:31])
+        sheet.append(header)
+        for row in rows:
+            sheet.append(row)
+            count += 1
+    workbook.save(path)
+    normalize_xlsx(path)
+    return count
+
+
+# --- Resonate ---
+
+def resonate_insight_rows(rng: random.Random, rows: int) -> Iterator[list]:
+    pick_insight = weighted_chooser(rng, RESONATE_INSIGHTS, skew=0.6)
+    choosers = {insight[0]: weighted_chooser(rng, insight[3]) for insight in RESONATE_INSIGHTS}
+    for _ in range(rows):
+        insight, category, subcategory, _values = pick_insight()
+        yield [insight, choosers[insight](), category, subcategory, round(rng.uniform(0.5, 95), 1)]
+
+
+def resonate_category_rows(rng: random.Random, rows: int) -> Iterator[list]:
+    pick = weighted_chooser(rng, WEB_CATEGORIES)
+    for index in range(rows):
+        category = pick()
+        # Past the named categories, rows are sub-categories of them
+        if index >= len(WEB_CATEGORIES):
+            category = f"{category} > Segment {index // len(WEB_CATEGORIES)}"
+        yield [category, rng.randint(40, 400), f"{rng.uniform(0.01, 12):.2f}%"]
+
+
+def resonate_domain_rows(rng: random.Random, rows: int) -> Iterator[list]:
+    pick_category = weighted_chooser(rng, WEB_CATEGORIES)
+    for _ in range(rows):
+        yield [domain_name(rng), round(rng.uniform(1, 10), 1), pick_category()]
+
+
+def generate_resonate(out: Path, rng: random.Random, rows: int) -> List[Path]:
+    files = [
+        (out / "resonate_insights.csv", ["Insight", "Insight Value", "Category", "Subcategory1", "Composition (%)"],
+         resonate_insight_rows(rng, rows)),
+        (out / "resonate_categories.csv",
+         ["Category", "Category Index", "Category Share of Total Visits (if available)"],
+         resonate_category_rows(rng, max(1, rows // 10))),
+        (out / "resonate_domains.csv", ["Domain Name", "Site Rating", "Category"],
+         resonate_domain_rows(rng, max(1, rows // 10))),
+    ]
+    for path, header, rows_iter in files:
+        write_csv(path, header, rows_iter)
+    return [path for path, _, _ in files]
+
+
+# --- SparkToro ---
+
+def sparktoro_tab(rng: random.Random, name: str, rows: int) -> Tuple[List[str], Iterator[list]]:
+    """Header and rows of one SparkToro report tab"""
+    base = name.split(" (")[0]
+    pick_category = weighted_chooser(rng, WEB_CATEGORIES)
+
+    def affinity_rows(make_name: Callable[[int], str]) -> Iterator[list]:
+        for index in range(rows):
+            yield [make_name(index), round(rng.uniform(0.1, 60), 2), round(rng.uniform(1, 99), 1), pick_category()]
+
+    if base == "Social Accounts" or base == "Press Accounts":
+        header = ["Account", "Audience Affinity", "% of Audience", "Category"]
+        return header, affinity_rows(lambda i: f"@{rng.choice(DOMAIN_WORDS)}{rng.choice(DOMAIN_WORDS)}{i}")
+    if base == "Websites" or base == "Hidden Gems":
+        header = ["Domain", "Audience Affinity", "% of Audience", "Category"]
+        return header, affinity_rows(lambda i: domain_name(rng))
+    if base == "Podcasts" or base == "YouTube Channels":
+        header = ["Title", "Audience Affinity", "% of Audience", "Category"]
+        return header, affinity_rows(lambda i: f"The {rng.choice(DOMAIN_WORDS).title()} {rng.choice(DOMAIN_WORDS).title()} Show")
+    if base == "Subreddits":
+        header = ["Subreddit", "Audience Affinity", "% of Audience", "Category"]
+        return header, affinity_rows(lambda i: f"r/{rng.choice(DOMAIN_WORDS)}{rng.choice(DOMAIN_WORDS)}")
+    if base == "Demographics":
+        pick_age = weighted_chooser(rng, RESONATE_INSIGHTS[0][3])
+        pick_gender = weighted_chooser(rng, RESONATE_INSIGHTS[1][3])
+        header = ["Age Range", "Gender", "% of Audience"]
+        return header, ([pick_age(), pick_gender(), round(rng.uniform(0.5, 40), 1)] for _ in range(rows))
+    if base == "Locations":
+        pick_city = weighted_chooser(rng, ["New York", "Los Angeles", "Chicago", "Austin", "Seattle", "Denver",
+                                           "Atlanta", "Portland", "Miami", "Boston"])
+        header = ["Location", "Country", "% of Audience"]
+        return header, ([pick_city(), "United States", round(rng.uniform(0.1, 15), 2)] for _ in range(rows))
+    # Hashtags, Keywords, Bio Words
+    pick_word = weighted_chooser(rng, DOMAIN_WORDS + [topic.split()[0] for topic in SEARCH_TOPICS])
+    prefix = "#" if base == "Hashtags" else ""
+    header = ["Term", "Audience Affinity", "Frequency"]
+    return header, ([f"{prefix}{pick_word()}", round(rng.uniform(0.1, 30), 2), rng.randint(1, 5000)] for _ in range(rows))
+
+
+def generate_sparktoro(out: Path, rng: random.Random, rows: int, tabs: int) -> List[Path]:
+    rows_per_tab = min(MAX_XLSX_ROWS, max(1, rows // tabs))
+    names = [SPARKTORO_TABS[i % len(SPARKTORO_TABS)] + (f" ({i // len(SPARKTORO_TABS) + 1})" if i >= len(SPARKTORO_TABS) else "")
+             for i in range(tabs)]
+    sheets = [(name, *sparktoro_tab(rng, name, rows_per_tab)) for name in names]
+    path = out / "sparktoro_audience.xlsx"
+    write_xlsx(path, sheets)
+    return [path]
+
+
+# --- SEMRush ---
+
+SEMRUSH_HEADER = [
+    "Keyword", "Position", "Previous position", "Search Volume", "Keyword Difficulty", "CPC", "URL",
+    "Traffic", "Traffic (%)", "Traffic Cost", "Competition", "Number of Results", "Trends", "Keyword Intents",
+]
+
+
+def semrush_rows(rng: random.Random, rows: int) -> Iterator[list]:
+    pick_topic = weighted_chooser(rng, SEARCH_TOPICS, skew=0.8)
+    pick_modifier = weighted_chooser(rng, SEARCH_MODIFIERS, skew=0.7)
+    for index in range(rows):
+        topic = pick_topic()
+        modifier = pick_modifier()
+        keyword = f"{modifier} {topic}" if index % 3 else f"{topic} {modifier}"
+        if index >= len(SEARCH_TOPICS) * len(SEARCH_MODIFIERS):
+            keyword = f"{keyword} {rng.choice(DOMAIN_WORDS)}"
+        volume = int(rng.paretovariate(1.2) * 50)
+        position = rng.randint(1, 100)
+        traffic = max(0, int(volume * max(0.0, 0.3 - position / 300)))
+        cpc = round(rng.uniform(0.1, 12), 2)
+        trends = ",".join(f"{rng.uniform(0, 1):.2f}" for _ in range(12))
+        yield [
+            keyword, position, min(100, position + rng.randint(-5, 5)) or 1, volume, rng.randint(0, 100), cpc,
+            f"https://www.example.com/{topic.replace(' ', '-')}", traffic, round(rng.uniform(0, 2), 2),
+            round(traffic * cpc, 2), round(rng.random(), 2), rng.randint(10_000, 900_000_000), trends,
+            rng.choice(SEARCH_INTENTS),
+        ]
+
+
+def generate_semrush(out: Path, rng: random.Random, rows: int, xlsx: bool) -> List[Path]:
+    path = out / "semrush_keywords.csv"
+    # Same rows in both files: the workbook replays the generator from the same seed
+    state = rng.getstate()
+    write_csv(path, SEMRUSH_HEADER, semrush_rows(rng, rows))
+    files = [path]
+    if xlsx:
+        replay = random.Random()
+        replay.setstate(state)
+        path = out / "semrush_keywords.xlsx"
+        write_xlsx(path, [("Organic Positions", SEMRUSH_HEADER, semrush_rows(replay, min(rows, MAX_XLSX_ROWS)))])
+        files.append(path)
+    return files
+
+
+# --- Report PDFs and chart images ---
+
+def chart_image(rng: random.Random, width: int = 800, height: int = 500, image_format: str = "PNG") -> bytes:
+    """A bar chart of audience composition, like the screenshots in Resonate exports"""
+    from PIL import Image, ImageDraw
+
+    image = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(image)
+    insight = rng.choice(RESONATE_INSIGHTS)
+    values = insight[3]
+    draw.text((20, 15), f"{insight[0]} - Audience Composition (%)", fill=(31, 41, 55))
+    bar_area = width - 200
+    bar_height = max(8, (height - 80) // len(values) - 10)
+    for index, value in enumerate(values):
+        top = 50 + index * (bar_height + 10)
+        share = rng.uniform(0.05, 1)
+        draw.text((20, top + bar_height // 2 - 5), value[:22], fill=(75, 85, 99))
+        draw.rectangle([180, top, 180 + int(bar_area * share), top + bar_height], fill=(0, 79, 94))
+        draw.text((185 + int(bar_area * share), top + bar_height // 2 - 5), f"{share * 100:.0f}%", fill=(255, 153, 0))
+    output = io.BytesIO()
+    image.save(output, format=image_format, **({"quality": 85} if image_format == "JPEG" else {"optimize": False}))
+    return output.getvalue()
+
+
+def report_pdf(rng: random.Random, index: int, pages: int) -> bytes:
+    """A multi-page audience report with prose and a composition table per page"""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+
+    output = io.BytesIO()
+    # invariant: no creation date or random document id, so output is reproducible
+    pdf = canvas.Canvas(output, pagesize=letter, invariant=1)
+    width, height = letter
+    for page in range(pages):
+        insight = RESONATE_INSIGHTS[(index + page) % len(RESONATE_INSIGHTS)]
+        pdf.setFont("Helvetica-Bold", 16)
+        pdf.drawString(54, height - 72, f"Resonate Audience Report {index + 1} - {insight[1]}: {insight[0]}")
+        pdf.setFont("Helvetica", 10)
+        y = height - 100
+        for _ in range(8):
+            sentence = (f"This audience over-indexes on {rng.choice(insight[3]).lower()} with an index of "
+                        f"{rng.randint(105, 260)} versus the US online population, and {rng.randint(20, 80)}% "
+                        f"report {rng.choice(['weekly', 'daily', 'monthly'])} engagement with {rng.choice(WEB_CATEGORIES).lower()}.")
+            pdf.drawString(54, y, sentence[:110])
+            y -= 14
+        y -= 10
+        pdf.setFont("Helvetica-Bold", 10)
+        pdf.drawString(54, y, "Insight Value")
+        pdf.drawString(300, y, "Composition (%)")
+        pdf.drawString(420, y, "Index")
+        pdf.setFont("Helvetica", 10)
+        for value in insight[3]:
+            y -= 14
+            pdf.drawString(54, y, value)
+            pdf.drawString(300, y, f"{rng.uniform(1, 60):.1f}")
+            pdf.drawString(420, y, str(rng.randint(60, 240)))
+        pdf.showPage()
+    pdf.save()
+    return output.getvalue()
+
+
+def generate_bundle(out: Path, rng: random.Random, rows: int, pdfs: int, pdf_pages: int, images: int) -> List[Path]:
+    """A Resonate export ZIP: the Resonate CSVs, report PDFs and chart images"""
+    staging = out / "resonate_bundle"
+    staging.mkdir(exist_ok=True)
+    csv_files = generate_resonate(staging, rng, rows)
+    path = out / "resonate_bundle.zip"
+    with zipfile.ZipFile(path, "w") as archive:
+        def add(name: str, data: bytes, compress: bool = True):
+            info = zipfile.ZipInfo(name, date_time=FIXED_TIMESTAMP)
+            info.compress_type = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+            archive.writestr(info, data)
+
+        for csv_path in csv_files:
+            add(f"data/{csv_path.name}", csv_path.read_bytes())
+            csv_path.unlink()
+        for index in range(pdfs):
+            add(f"reports/audience_report_{index + 1:02d}.pdf", report_pdf(rng, index, pdf_pages))
+        for index in range(images):
+            image_format = "JPEG" if index % 2 else "PNG"
+            extension = "jpg" if image_format == "JPEG" else "png"
+            # Already compressed
+            add(f"charts/chart_{index + 1:03d}.{extension}", chart_image(rng, image_format=image_format), compress=False)
+    staging.rmdir()
+    return [path]
+
+
+# --- Main ---
+
+def human_size(size: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1], formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", default="synthetic_data", help="output directory (created if missing)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--rows", type=int, default=1000,
+                        help="rows in resonate_insights.csv and semrush_keywords.csv, spread over the SparkToro "
+                             "tabs; the category/domain CSVs get rows/10 (default 1000)")
+    parser.add_argument("--tabs", type=int, default=8, help="SparkToro workbook tabs, 1-50 (default 8)")
+    parser.add_argument("--pdfs", type=int, default=2, help="report PDFs in the ZIP bundle (default 2)")
+    parser.add_argument("--pdf-pages", type=int, default=4, help="pages per report PDF (default 4)")
+    parser.add_argument("--images", type=int, default=4, help="chart images in the ZIP bundle (default 4)")
+    parser.add_argument("--semrush-xlsx", action="store_true", help="also write the SEMRush export as a workbook")
+    parser.add_argument("--only", nargs="+", choices=SOURCES, default=list(SOURCES), help="datasets to generate")
+    args = parser.parse_args()
+
+    if args.rows < 1:
+        parser.error("--rows must be at least 1")
+    if not 1 <= args.tabs <= 50:
+        parser.error("--tabs must be between 1 and 50")
+
+    out = Path(args.out)
+    out.mkdir(parents=True, exist_ok=True)
+    generators: Dict[str, Callable[[random.Random], List[Path]]] = {
+        "resonate": lambda rng: generate_resonate(out, rng, args.rows),
+        "sparktoro": lambda rng: generate_sparktoro(out, rng, args.rows, args.tabs),
+        "semrush": lambda rng: generate_semrush(out, rng, args.rows, args.semrush_xlsx),
+        "bundle": lambda rng: generate_bundle(out, rng, args.rows, args.pdfs, args.pdf_pages, args.images),
+    }
+
+    print(f"seed={args.seed} rows={args.rows} tabs={args.tabs} pdfs={args.pdfs} images={args.images} -> {out}")
+    for source in SOURCES:
+        if source not in args.only:
+            continue
+        # One generator per dataset, so each file is the same whichever others are generated
+        rng = random.Random(f"{args.seed}:{source}")
+        started = time.perf_counter()
+        paths = generators[source](rng)
+        elapsed = time.perf_counter() - started
+        for path in paths:
+            print(f"  {path.name:<28} {human_size(os.path.getsize(path)):>10}")
+        print(f"  {source} done in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""
+Incremental JSON parser used for streamed persona insights (json_stream.py)
+Whatever the chunking, the parser must report the same values, each exactly
+once and equal to what json.loads gives for the whole document.
+"""
+
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from json_stream import JSONStreamParser  # noqa: E402
+
+
+DOCUMENT = json.dumps({
+    "ai_insights": {
+        "personality_traits": ["curious", "budget-conscious"],
+        "shopping_behavior": "Compares prices \"everywhere\", {even} [online]",
+        "score": -1.5e3,
+        "verified": True,
+        "notes": None,
+    },
+    "recommendations": ["Use short video", "Lead with value \\ savings", "Café partnerships ☕"],
+    "pain_points": [],
+    "goals": [{"goal": "save", "priority": 1}, 42, False],
+    "communication_style": "Friendly",
+}, indent=2, ensure_ascii=False)
+
+
+def _expected(document, max_depth=2):
+    """(path, value) for every member / element up to max_depth, from the parsed document"""
+    found = []
+
+    def walk(value, path):
+        items = value.items() if isinstance(value, dict) else enumerate(value) if isinstance(value, list) else ()
+        for key, child in items:
+            child_path = path + (key,)
+            walk(child, child_path)
+            if len(child_path) <= max_depth:
+                found.append((child_path, child))
+
+    walk(json.loads(document), ())
+    return sorted(found, key=repr)
+
+
+def _feed(chunks, max_depth=2):
+    parser = JSONStreamParser(max_depth=max_depth)
+    completed = []
+    for chunk in chunks:
+        completed += parser.feed(chunk)
+    return parser, completed
+
+
+def test_whole_document():
+    parser, completed = _feed([DOCUMENT])
+
+    assert sorted(completed, key=repr) == _expected(DOCUMENT)
+    assert parser.done
+    assert parser.text == DOCUMENT
+
+
+def test_split_at_every_boundary():
+    expected = _expected(DOCUMENT)
+    for split in range(len(DOCUMENT) + 1):
+        _, completed = _feed([DOCUMENT[:split], DOCUMENT[split:]])
+        assert sorted(completed, key=repr) == expected, f"split at {split}"
+
+
+def test_one_character_at_a_time():
+    parser, completed = _feed(list(DOCUMENT))
+
+    assert sorted(completed, key=repr) == _expected(DOCUMENT)
+    assert parser.done
+
+
+def test_values_arrive_as_soon_as_complete():
+    parser = JSONStreamParser()
+    prefix = '{"recommendations": ["first", "sec'
+
+    assert parser.feed(prefix) == [(("recommendations", 0), "first")]
+    assert parser.feed('ond"') == [(("recommendations", 1), "second")]
+    assert parser.feed("]") == [(("recommendations",), ["first", "second"])]
+
+
+def test_scalar_completes_on_delimiter():
+    parser = JSONStreamParser()
+
+    assert parser.feed('{"score": 12') == []
+    assert parser.feed("3,") == [(("score",), 123)]
+
+
+@pytest.mark.parametrize("max_depth", [1, 2, 3])
+def test_max_depth(max_depth):
+    _, completed = _feed([DOCUMENT], max_depth=max_depth)
+
+    assert sorted(completed, key=repr) == _expected(DOCUMENT, max_depth)
+    assert all(len(path) <= max_depth for path, _ in completed)
+
+
+def test_fenced_output_is_skipped():
+    fenced = "Here you go:\n```json\n" + DOCUMENT + "\n```"
+
+    parser, completed = _feed([fenced[:20], fenced[20:]])
+
+    assert sorted(completed, key=repr) == _expected(DOCUMENT)
+    assert parser.done
+
+
+def test_text_after_the_document_is_ignored():
+    parser, completed = _feed(['{"a": 1}', ' {"b": 2}'])
+
+    assert completed == [(("a",), 1)]
+    assert parser.done
+
+
+def test_truncated_document_reports_completed_values_only():
+    cut = DOCUMENT.index('"goals"')
+    parser, completed = _feed([DOCUMENT[:cut]])
+
+    assert not parser.done
+    paths = {path for path, _ in completed}
+    assert ("ai_insights",) in paths
+    assert ("recommendations",) in paths
+    assert not any(path[0] == "goals" for path in paths)
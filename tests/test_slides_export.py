@@ -0,0 +1,31 @@
+"""
+Google Slides batchUpdate builder against its golden fixture
+A layout change must bump slides_export.BUILDER_VERSION and regenerate
+tests/fixtures/slides_batch_update.json (see GOOGLE_SETUP.md).
+"""
+
+import json
+import sys
+from pathlib import Path
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import slides_export  # noqa: E402
+
+
+def _load(name):
+    with open(FIXTURES / name, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_batch_update_matches_fixture():
+    body, _ = slides_export.get_batch_update(_load("slides_persona.json"))
+    assert body == _load("slides_batch_update.json")
+
+
+def test_object_ids_are_unique():
+    body, _ = slides_export.get_batch_update(_load("slides_persona.json"))
+    created = [next(iter(request.values()))["objectId"] for request in body["requests"]
+               if next(iter(request)) in ("createSlide", "createShape", "createImage")]
+    assert len(created) == len(set(created))
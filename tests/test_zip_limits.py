@@ -0,0 +1,153 @@
+"""
+Resonate ZIP safety limits (file_parsers.inspect_zip / safe_extract)
+Each archive is crafted in tmp_path; nothing here needs pandas or the other
+heavy parsers, since the limits are checked before any file is parsed.
+"""
+
+import os
+import sys
+import zipfile
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from external_integrations import file_parsers  # noqa: E402
+from external_integrations.file_parsers import ResonateFileParser, ZipLimitExceeded  # noqa: E402
+
+
+def _zip(path, members, compression=zipfile.ZIP_DEFLATED):
+    with zipfile.ZipFile(path, "w", compression) as archive:
+        for name, data in members:
+            archive.writestr(name, data)
+    return str(path)
+
+
+def _inspect(parser, path):
+    with zipfile.ZipFile(path) as archive:
+        return parser.inspect_zip(archive)
+
+
+def test_high_compression_ratio_is_rejected(tmp_path):
+    # 4 MB of zeros deflates to a few KB, far past the 100:1 limit
+    path = _zip(tmp_path / "bomb.zip", [("data.csv", b"\0" * (4 * 1024 * 1024))])
+
+    with pytest.raises(ZipLimitExceeded) as error:
+        _inspect(ResonateFileParser(), path)
+
+    assert error.value.reason == "compression_ratio"
+    assert error.value.status_code == 422
+    assert error.value.member == "data.csv"
+    assert error.value.actual > file_parsers.ZIP_MAX_COMPRESSION_RATIO
+
+
+def test_small_members_are_not_ratio_checked(tmp_path):
+    path = _zip(tmp_path / "small.zip", [("data.csv", b"a," * 1000)])
+
+    members = _inspect(ResonateFileParser(), path)
+
+    assert [info.filename for info in members] == ["data.csv"]
+
+
+def test_member_count_limit(tmp_path):
+    path = _zip(tmp_path / "many.zip", [(f"f{i}.txt", b"x") for i in range(4)])
+
+    with pytest.raises(ZipLimitExceeded) as error:
+        _inspect(ResonateFileParser(max_members=3), path)
+
+    assert error.value.reason == "member_count"
+    assert error.value.status_code == 413
+    assert (error.value.actual, error.value.limit) == (4, 3)
+
+
+def test_directories_do_not_count_as_members(tmp_path):
+    path = tmp_path / "dirs.zip"
+    with zipfile.ZipFile(path, "w") as archive:
+        for i in range(3):
+            archive.writestr(f"d{i}/", b"")
+        archive.writestr("d0/f.txt", b"x")
+
+    assert len(_inspect(ResonateFileParser(max_members=1), str(path))) == 1
+
+
+def test_member_size_limit(tmp_path):
+    path = _zip(tmp_path / "big.zip", [("big.txt", os.urandom(2048))], compression=zipfile.ZIP_STORED)
+
+    with pytest.raises(ZipLimitExceeded) as error:
+        _inspect(ResonateFileParser(max_member_bytes=1024), path)
+
+    assert error.value.reason == "member_size"
+    assert error.value.member == "big.txt"
+
+
+def test_total_size_limit(tmp_path):
+    path = _zip(tmp_path / "total.zip", [(f"f{i}.txt", os.urandom(600)) for i in range(3)])
+
+    with pytest.raises(ZipLimitExceeded) as error:
+        _inspect(ResonateFileParser(max_total_bytes=1024), path)
+
+    assert error.value.reason == "total_size"
+    assert error.value.actual > 1024
+
+
+def test_extraction_stops_at_total_size(tmp_path):
+    # The central directory passes (limits checked with a generous parser),
+    # the extraction itself is bounded by the stricter one
+    path = _zip(tmp_path / "total.zip", [(f"f{i}.txt", os.urandom(600)) for i in range(3)])
+    target = tmp_path / "out"
+    target.mkdir()
+
+    with zipfile.ZipFile(path) as archive:
+        members = ResonateFileParser().inspect_zip(archive)
+        with pytest.raises(ZipLimitExceeded) as error:
+            ResonateFileParser(max_total_bytes=1024).safe_extract(archive, members, str(target))
+
+    assert error.value.reason == "total_size"
+
+
+@pytest.mark.parametrize("name", [
+    "../evil.txt",
+    "../../evil.txt",
+    "nested/../../evil.txt",
+    "/abs/evil.txt",
+    "..\\evil.txt",
+    "C:/evil.txt",
+])
+def test_path_traversal_stays_inside_target(tmp_path, name):
+    path = _zip(tmp_path / "traversal.zip", [(name, b"owned")])
+    target = tmp_path / "out" / "inner"
+    target.mkdir(parents=True)
+
+    with zipfile.ZipFile(path) as archive:
+        parser = ResonateFileParser()
+        parser.safe_extract(archive, parser.inspect_zip(archive), str(target))
+
+    written = [p for p in (tmp_path / "out").rglob("*") if p.is_file()]
+    assert written, "the member should still be extracted, under the target"
+    for file in written:
+        assert target.resolve() in file.resolve().parents
+        assert file.read_bytes() == b"owned"
+    assert not (tmp_path / "evil.txt").exists()
+    assert not (tmp_path / "out" / "evil.txt").exists()
+
+
+def test_extract_and_parse_reports_the_limit(tmp_path):
+    path = _zip(tmp_path / "bomb.zip", [("data.csv", b"\0" * (4 * 1024 * 1024))])
+
+    result = ResonateFileParser().extract_and_parse_zip(path)
+
+    assert result["success"] is False
+    assert result["status_code"] == 422
+    assert result["limit_exceeded"]["reason"] == "compression_ratio"
+    assert result["extracted_files"] == []
+
+
+def test_invalid_archive(tmp_path):
+    path = tmp_path / "broken.zip"
+    path.write_bytes(b"not a zip")
+
+    result = ResonateFileParser().extract_and_parse_zip(str(path))
+
+    assert result["success"] is False
+    assert result["status_code"] == 422